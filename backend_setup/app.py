@@ -1,32 +1,61 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, current_app, g, Response, stream_with_context, send_file, abort
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 from flask_migrate import Migrate
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, get_jwt
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, get_jwt, verify_jwt_in_request
+from functools import wraps
 import os
 from datetime import datetime, timedelta
 import re
-import logging
-from logging.handlers import RotatingFileHandler
+import time
+from logging_config import SAMPLED, setup_logging
+from passwords import HasherBusy, create_password_hasher
+from rate_limit import create_rate_limiter, parse_limit
+from media_store import MEDIA_NAME_RE, MediaError, MediaStore, MediaTooLarge, MultipartFileStream, avatar_svg
+from fieldsets import Field, Fieldset, InvalidFields
+from json_provider import create_json_provider
+from compression import create_compressor
+from notifications import create_notification_broker
+from werkzeug.middleware.proxy_fix import ProxyFix
+from sqlalchemy.exc import IntegrityError
+from pagination import DEFAULT_LIMIT, MAX_LIMIT, InvalidCursor, encode_cursor, keyset_paginate, parse_keyset_args
+from ranking import InvalidWindow, hot_score, parse_window
+from search_index import SearchIndex
+from token_blocklist import create_blocklist
+from view_counter import ViewCounter
+from response_cache import ResponseCache
+from knowledge_graph import KnowledgeGraph, GraphStore
+import resource_io
+from db_metrics import PoolMetrics, RequestQueryStats, configure_pool_options
+import click
 
 
 # 数据库实例
 db = SQLAlchemy()
 
+# MySQL 重复键错误码
+MYSQL_DUPLICATE_ENTRY = 1062
 
-# 黑名单令牌存储（简单实现，实际应用中建议使用Redis）
-blacklisted_tokens = set()
+# 图片上传按 Content-Length 提前拒绝时，为 multipart 边界和字段头预留的字节数
+MEDIA_MULTIPART_OVERHEAD = 64 * 1024
 
 
-# 检查令牌是否在黑名单中
-def is_token_blacklisted(jti):
-    return jti in blacklisted_tokens
+# 检查令牌是否在黑名单中（黑名单存储由 JWT_BLOCKLIST_BACKEND 配置，见 token_blocklist.py）
+def is_token_blacklisted(jti, expires_at=None):
+    return current_app.extensions['token_blocklist'].contains(jti, expires_at)
 
 
-# 将令牌加入黑名单
-def blacklist_token(jti):
-    blacklisted_tokens.add(jti)
+# 将令牌加入黑名单，保留到令牌过期为止
+def blacklist_token(jti, expires_at):
+    current_app.extensions['token_blocklist'].add(jti, expires_at)
+
+
+# 已吊销令牌模型（数据库黑名单存储使用）
+class RevokedToken(db.Model):
+    __tablename__ = 'revoked_tokens'
+    
+    jti = db.Column(db.String(36), primary_key=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
 
 
 # 用户模型
@@ -36,16 +65,22 @@ class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128))
+    password_hash = db.Column(db.String(255))
     is_admin = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     avatar = db.Column(db.String(255))  # 头像URL
     
+    # 管理后台按注册时间倒序分页，并可按管理员标记筛选；用户名前缀筛选使用 username 的唯一索引
+    __table_args__ = (
+        db.Index('ix_users_created_at_id', 'created_at', 'id'),
+        db.Index('ix_users_is_admin_created_at_id', 'is_admin', 'created_at', 'id'),
+    )
+    
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = current_app.extensions['password_hasher'].hash(password)
         
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return current_app.extensions['password_hasher'].verify(self.password_hash, password)
     
     def to_dict(self):
         return {
@@ -56,6 +91,103 @@ class User(db.Model):
             'created_at': self.created_at.isoformat(),
             'avatar': self.avatar
         }
+    
+    # 列表中展示作者时只需要的公开信息（不含邮箱）
+    def to_summary_dict(self):
+        return {
+            'id': self.id,
+            'username': self.username,
+            'avatar': self.avatar
+        }
+
+
+# 标签模型（标签名唯一）
+class Tag(db.Model):
+    __tablename__ = 'tags'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), unique=True, nullable=False)
+
+
+# 资源-标签关联表：主键覆盖 资源→标签 方向，附加索引覆盖 标签→资源 方向
+resource_tags = db.Table(
+    'resource_tags',
+    db.Column('resource_id', db.Integer, db.ForeignKey('cultural_resources.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_resource_tags_tag_id_resource_id', 'tag_id', 'resource_id')
+)
+
+
+# 逗号分隔的 tags 展示字段长度上限，与 CulturalResource.tags 列一致
+TAGS_MAX_LENGTH = 255
+
+
+# 规范化标签名：去除空白、去重并保持原有顺序；超出 tags 字段长度的标签整个舍弃，展示字段与关联表保持一致
+def normalize_tag_names(names):
+    if isinstance(names, str):
+        names = names.split(',')
+    elif names is not None and not isinstance(names, (list, tuple)):
+        names = [names]
+    result = []
+    length = 0
+    for name in names or []:
+        name = str(name).strip()[:50]
+        if not name or name in result:
+            continue
+        length += len(name) + (1 if result else 0)
+        if length > TAGS_MAX_LENGTH:
+            break
+        result.append(name)
+    return result
+
+
+# 按标签名获取标签对象，不存在的标签自动创建（一次查询取回已有标签）
+def get_or_create_tags(names):
+    existing = {tag.name: tag for tag in Tag.query.filter(Tag.name.in_(names)).all()} if names else {}
+    tags = []
+    for name in names:
+        tag = existing.get(name)
+        if tag is None:
+            tag = Tag(name=name)
+            db.session.add(tag)
+            existing[name] = tag
+        tags.append(tag)
+    return tags
+
+
+# 标签筛选子查询：match_all 为 True 时要求同时包含所有标签（AND），否则包含任一标签（OR）
+def resource_ids_with_tags(names, match_all=True):
+    subquery = db.select(resource_tags.c.resource_id) \
+        .join(Tag, Tag.id == resource_tags.c.tag_id) \
+        .where(Tag.name.in_(names))
+    if match_all:
+        subquery = subquery.group_by(resource_tags.c.resource_id) \
+            .having(db.func.count(resource_tags.c.tag_id) == len(names))
+    return subquery
+
+
+# 批量建立资源-标签关联：parsed 为 [(资源id, 标签名列表)]，tag_ids 为 {标签名: 标签id} 缓存，
+# 缺失的标签批量创建，已存在的关联跳过，返回新增关联数
+def link_tags_bulk(parsed, tag_ids):
+    missing = {name for _, names in parsed for name in names if name not in tag_ids}
+    if missing:
+        db.session.execute(db.insert(Tag), [{'name': name} for name in missing])
+        tag_ids.update(db.session.query(Tag.name, Tag.id).filter(Tag.name.in_(missing)).all())
+    
+    resource_ids = [resource_id for resource_id, _ in parsed]
+    existing_links = set(db.session.execute(
+        db.select(resource_tags.c.resource_id, resource_tags.c.tag_id)
+        .where(resource_tags.c.resource_id.in_(resource_ids))
+    ).all()) if resource_ids else set()
+    links = [
+        {'resource_id': resource_id, 'tag_id': tag_ids[name]}
+        for resource_id, names in parsed
+        for name in names
+        if (resource_id, tag_ids[name]) not in existing_links
+    ]
+    if links:
+        db.session.execute(resource_tags.insert(), links)
+    return len(links)
 
 
 # 文化资源模型
@@ -69,9 +201,29 @@ class CulturalResource(db.Model):
     image_url = db.Column(db.String(255))  # 图片URL
     created_date = db.Column(db.DateTime, default=datetime.utcnow)
     author_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    tags = db.Column(db.String(255))  # 标签
+    tags = db.Column(db.String(255))  # 标签（逗号分隔，仅用于展示；筛选走 resource_tags 关联表）
+    content_hash = db.Column(db.String(64), index=True)  # 标题+描述的内容指纹，用于批量导入去重
+    # 列表摘要查询时由 SQL 截取的描述片段，不加载完整描述
+    description_snippet = db.query_expression()
     
     author = db.relationship('User', backref=db.backref('resources', lazy=True))
+    tag_items = db.relationship('Tag', secondary=resource_tags, lazy=True,
+                                backref=db.backref('resources', lazy='dynamic'))
+    
+    # 游标分页按 (created_date, id) 倒序扫描，分类筛选时使用带分类前缀的索引
+    __table_args__ = (
+        db.Index('ix_cultural_resources_created_date_id', 'created_date', 'id'),
+        db.Index('ix_cultural_resources_category_created_date_id', 'category', 'created_date', 'id'),
+    )
+    
+    def refresh_content_hash(self):
+        self.content_hash = resource_io.content_hash(self.title, self.description)
+    
+    def set_tags(self, names):
+        # 同时维护展示用的逗号字符串和关联表
+        names = normalize_tag_names(names)
+        self.tags = ','.join(names)
+        self.tag_items = get_or_create_tags(names)
     
     def to_dict(self):
         return {
@@ -96,8 +248,13 @@ class Post(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     author_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     likes_count = db.Column(db.Integer, default=0)
+    comments_count = db.Column(db.Integer, default=0)  # 评论数，随评论增删在同一事务内维护
     views = db.Column(db.Integer, default=0)  # 添加浏览量字段
     category = db.Column(db.String(100), default='文化讨论')  # 添加分类字段
+    # 热度分（见 ranking.hot_score），随点赞、评论、浏览量变化增量更新，sort=hot 直接按索引读取
+    hot_score = db.Column(db.Float, default=0.0, server_default='0', nullable=False)
+    # 列表摘要查询时由 SQL 截取的正文片段，不加载完整正文
+    content_snippet = db.query_expression()
     
     # 添加一个动态属性来获取实际的点赞数
     @property
@@ -110,14 +267,25 @@ class Post(db.Model):
 
     author = db.relationship('User', backref=db.backref('posts', lazy=True))
     
+    # 游标分页按 (created_at, id) 倒序扫描；热门与最佳排序分别按 (hot_score, id)、(likes_count, id) 倒序扫描
+    __table_args__ = (
+        db.Index('ix_posts_created_at_id', 'created_at', 'id'),
+        db.Index('ix_posts_hot_score_id', 'hot_score', 'id'),
+        db.Index('ix_posts_likes_count_id', 'likes_count', 'id'),
+    )
+    
+    # 按当前的点赞、评论、浏览数计算热度分；新建帖子时同时确定发布时间
+    def refresh_hot_score(self):
+        if self.created_at is None:
+            self.created_at = datetime.utcnow()
+        self.hot_score = hot_score(self.likes_count, self.comments_count, self.views, self.created_at)
+    
     def to_dict(self):
         try:
-            # 计算评论数量
-            comments_count = Comment.query.filter_by(post_id=self.id).count()
             # 获取分类值，安全处理可能缺失的列
             category_value = getattr(self, 'category', '文化讨论') or '文化讨论'
-            # 获取浏览量，安全处理可能缺失的列
-            views_value = getattr(self, 'views', 0) or 0
+            # 获取浏览量，安全处理可能缺失的列，并加上本进程尚未写回的增量
+            views_value = (getattr(self, 'views', 0) or 0) + pending_views(self.id)
             return {
                 'id': self.id,
                 'title': self.title,
@@ -125,12 +293,12 @@ class Post(db.Model):
                 'created_at': self.created_at.isoformat(),
                 'author': self.author.to_dict() if self.author else {'id': self.author_id, 'username': '未知用户', 'email': '', 'is_admin': False, 'created_at': ''},
                 'likes_count': self.likes_count,
-                'comments_count': comments_count,
+                'comments_count': self.comments_count or 0,
                 'views': views_value,
                 'category': category_value
             }
         except Exception as e:
-            app.logger.error(f'帖子 {self.id} 转换为字典时出错: {str(e)}')
+            current_app.logger.error('帖子 %s 转换为字典时出错: %s', self.id, e)
             # 返回一个安全的字典，不包含可能出错的author信息
             return {
                 'id': self.id,
@@ -139,12 +307,158 @@ class Post(db.Model):
                 'created_at': self.created_at.isoformat() if self.created_at else '',
                 'author': {'id': self.author_id, 'username': '未知用户', 'email': '', 'is_admin': False, 'created_at': ''},
                 'likes_count': getattr(self, 'likes_count', 0),
-                'comments_count': 0,
+                'comments_count': getattr(self, 'comments_count', 0) or 0,
                 'views': getattr(self, 'views', 0) or 0,
                 'category': getattr(self, 'category', '文化讨论') or '文化讨论'
             }
 
 
+# 本进程缓冲中尚未写回数据库的浏览量增量
+def pending_views(post_id):
+    view_counter = current_app.extensions.get('view_counter')
+    return view_counter.pending(post_id) if view_counter else 0
+
+
+# 把缓冲的浏览量增量批量写回：一条 UPDATE posts SET views = views + n 语句按帖子批量执行
+def flush_post_views(deltas):
+    table = Post.__table__
+    db.session.execute(
+        table.update()
+        .where(table.c.id == db.bindparam('target_id'))
+        .values(views=db.func.coalesce(table.c.views, 0) + db.bindparam('delta')),
+        [{'target_id': post_id, 'delta': delta} for post_id, delta in deltas.items()]
+    )
+    refresh_hot_scores(deltas)
+    db.session.commit()
+
+
+# 重算指定帖子的热度分：一次查询读取计数，一条 UPDATE 语句批量写回；应在更新计数的同一事务内调用
+def refresh_hot_scores(post_ids):
+    post_ids = list(post_ids)
+    if not post_ids:
+        return
+    table = Post.__table__
+    rows = db.session.execute(
+        db.select(table.c.id, table.c.likes_count, table.c.comments_count, table.c.views, table.c.created_at)
+        .where(table.c.id.in_(post_ids))
+    ).all()
+    if not rows:
+        return
+    db.session.execute(
+        table.update()
+        .where(table.c.id == db.bindparam('target_id'))
+        .values(hot_score=db.bindparam('score')),
+        [{'target_id': row.id, 'score': hot_score(row.likes_count, row.comments_count, row.views, row.created_at)}
+         for row in rows]
+    )
+
+
+# 批量序列化帖子列表：评论数直接读取 comments_count 列，不再访问 comments 表
+# 调用方应通过 joinedload(Post.author) 预先加载作者，整页查询次数与 per_page 无关
+def posts_to_dicts(posts):
+    return [post.to_dict() for post in posts]
+
+
+# 帖子列表的排序方式及对应的排序列（均有 (排序列, id) 复合索引，每页只扫描 per_page 行）
+POST_SORT_COLUMNS = {
+    'latest': Post.created_at,
+    'hot': Post.hot_score,
+    'top': Post.likes_count
+}
+
+
+# 列表摘要的片段长度（字符数）
+SNIPPET_LENGTH = 150
+
+
+# 由 SQL 截取 SNIPPET_LENGTH + 1 个字符，多出的一个字符用于判断是否需要省略号
+def snippet_expression(column):
+    return db.func.substr(column, 1, SNIPPET_LENGTH + 1)
+
+
+def make_snippet(text):
+    if not text:
+        return ''
+    return text[:SNIPPET_LENGTH] + '…' if len(text) > SNIPPET_LENGTH else text
+
+
+def author_field(model, summary):
+    if summary:
+        return Field(
+            lambda obj: obj.author.to_summary_dict() if obj.author else None,
+            columns=('author_id',),
+            relationship=(model.author, (User.id, User.username, User.avatar))
+        )
+    return Field(
+        lambda obj: obj.author.to_dict() if obj.author else None,
+        columns=('author_id',),
+        relationship=(model.author, ())
+    )
+
+
+def resource_fieldset(summary):
+    fields = {
+        'id': Field(lambda r: r.id, columns=('id',)),
+        'title': Field(lambda r: r.title, columns=('title',)),
+        'description': Field(lambda r: r.description, columns=('description',)),
+        'snippet': Field(
+            lambda r: make_snippet(r.description_snippet),
+            expression=(CulturalResource.description_snippet, snippet_expression(CulturalResource.description))
+        ),
+        'category': Field(lambda r: r.category, columns=('category',)),
+        'image_url': Field(lambda r: r.image_url, columns=('image_url',)),
+        'created_date': Field(lambda r: r.created_date, columns=('created_date',)),
+        'author': author_field(CulturalResource, summary),
+        'tags': Field(lambda r: r.tags.split(',') if r.tags else [], columns=('tags',))
+    }
+    # 摘要视图默认不输出完整描述，完整视图默认不输出片段；两者都可通过 fields 显式指定
+    del fields['description' if summary else 'snippet']
+    return Fieldset(CulturalResource, fields, always=('id', 'created_date'))
+
+
+def post_fieldset(summary):
+    fields = {
+        'id': Field(lambda p: p.id, columns=('id',)),
+        'title': Field(lambda p: p.title, columns=('title',)),
+        'content': Field(lambda p: p.content, columns=('content',)),
+        'snippet': Field(
+            lambda p: make_snippet(p.content_snippet),
+            expression=(Post.content_snippet, snippet_expression(Post.content))
+        ),
+        'created_at': Field(lambda p: p.created_at, columns=('created_at',)),
+        'author': author_field(Post, summary),
+        'likes_count': Field(lambda p: p.likes_count, columns=('likes_count',)),
+        'comments_count': Field(lambda p: p.comments_count or 0, columns=('comments_count',)),
+        'views': Field(lambda p: (p.views or 0) + pending_views(p.id), columns=('views',)),
+        'category': Field(lambda p: p.category or '文化讨论', columns=('category',))
+    }
+    del fields['content' if summary else 'snippet']
+    return Fieldset(Post, fields, always=('id', 'created_at'))
+
+
+# 列表接口的字段集：?view=summary 使用摘要视图（正文片段、作者公开信息），?fields=a,b 只输出指定字段
+LIST_FIELDSETS = {}
+
+
+def get_list_fieldset(kind, view):
+    key = (kind, view)
+    if key not in LIST_FIELDSETS:
+        factory = resource_fieldset if kind == 'resource' else post_fieldset
+        LIST_FIELDSETS[key] = factory(view == 'summary')
+    return LIST_FIELDSETS[key]
+
+
+# 解析列表接口的视图与字段参数；默认完整视图且未指定字段时返回 None，沿用 to_dict 的输出
+def parse_list_fields(kind, args):
+    view = args.get('view', 'full')
+    if view not in ('full', 'summary'):
+        raise InvalidFields('view 参数只能为 full 或 summary')
+    if view == 'full' and not args.get('fields'):
+        return None
+    fieldset = get_list_fieldset(kind, view)
+    return fieldset, fieldset.parse(args.get('fields'))
+
+
 # 评论模型
 class Comment(db.Model):
     __tablename__ = 'comments'
@@ -154,20 +468,122 @@ class Comment(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     author_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     post_id = db.Column(db.Integer, db.ForeignKey('posts.id'), nullable=False)
+    # 楼中楼回复：parent_id 指向被回复的评论，顶层评论为空；删除评论时由数据库级联删除其回复
+    parent_id = db.Column(db.Integer, db.ForeignKey('comments.id', ondelete='CASCADE'))
+    # 物化路径：从顶层评论到本评论的 id 序列（每段补零到固定宽度，以 / 结尾），
+    # 按前缀匹配即可一次取得整棵子树，按路径排序即为楼层的深度优先顺序
+    path = db.Column(db.String(255), index=True)
+    depth = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    replies_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)  # 直接回复数，随回复增删在同一事务内维护
     
     author = db.relationship('User', backref=db.backref('comments', lazy=True))
     post = db.relationship('Post', backref=db.backref('comments', lazy=True))
     
+    # 按帖子加载评论时按 (created_at, id) 正序游标分页；
+    # 顶层评论（parent_id 为空）与某条评论的回复都按 (post_id, parent_id, created_at, id) 扫描
+    __table_args__ = (
+        db.Index('ix_comments_post_id_created_at_id', 'post_id', 'created_at', 'id'),
+        db.Index('ix_comments_post_id_parent_id_created_at_id', 'post_id', 'parent_id', 'created_at', 'id'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
             'content': self.content,
             'created_at': self.created_at.isoformat(),
             'author': self.author.to_dict(),
-            'post_id': self.post_id
+            'post_id': self.post_id,
+            'parent_id': self.parent_id,
+            'depth': self.depth or 0,
+            'replies_count': self.replies_count or 0
         }
 
 
+# 回复的最大层数（顶层评论为第0层），超过后不能再回复
+MAX_COMMENT_DEPTH = 8
+# 楼层树每次加载的默认/最大层数与每条评论默认/最大展开的回复数
+DEFAULT_THREAD_DEPTH = 2
+DEFAULT_THREAD_REPLIES = 3
+MAX_THREAD_REPLIES = 20
+
+
+def comment_path_segment(comment_id):
+    return f'{comment_id:010d}/'
+
+
+def comment_children(post_id, parent_ids, per_parent):
+    """
+    一次查询取得多条评论各自最早的 per_parent 条回复：
+    用 ROW_NUMBER() 按 parent_id 分区编号，只返回编号不超过 per_parent 的行，并预加载作者。
+    """
+    row_number = db.func.row_number().over(
+        partition_by=Comment.parent_id,
+        order_by=(Comment.created_at, Comment.id)
+    ).label('row_number')
+    ranked = db.select(Comment.id, row_number) \
+        .where(Comment.post_id == post_id, Comment.parent_id.in_(parent_ids)) \
+        .subquery()
+    return Comment.query.options(db.joinedload(Comment.author)) \
+        .join(ranked, ranked.c.id == Comment.id) \
+        .filter(ranked.c.row_number <= per_parent) \
+        .order_by(Comment.created_at, Comment.id) \
+        .all()
+
+
+def load_comment_thread(post_id, parent_id=None, cursor=None, limit=DEFAULT_LIMIT,
+                        depth=DEFAULT_THREAD_DEPTH, replies=DEFAULT_THREAD_REPLIES):
+    """
+    加载一页楼层树：parent_id 为空时按时间正序取顶层评论，否则取该评论的回复；
+    再逐层展开 depth 层回复，每条评论最多展开 replies 条。
+    查询次数固定为 1 + depth，与评论总数无关。
+    未全部展开的评论带 has_more_replies 与 replies_cursor，客户端据此请求“加载更多回复”。
+    返回 (评论树列表, KeysetPage)。
+    """
+    query = Comment.query.options(db.joinedload(Comment.author)).filter(
+        Comment.post_id == post_id,
+        Comment.parent_id.is_(None) if parent_id is None else Comment.parent_id == parent_id
+    )
+    page_result = keyset_paginate(query, Comment.created_at, Comment.id, cursor=cursor, limit=limit, descending=False)
+    
+    nodes = {}
+    last_reply = {}
+    
+    def add_node(comment):
+        node = comment.to_dict()
+        node['author_id'] = comment.author_id
+        node['replies'] = []
+        nodes[comment.id] = node
+        return node
+    
+    roots = [add_node(comment) for comment in page_result.items]
+    level = page_result.items
+    for _ in range(depth):
+        parent_ids = [comment.id for comment in level if comment.replies_count]
+        if not parent_ids:
+            break
+        level = comment_children(post_id, parent_ids, replies)
+        for child in level:
+            nodes[child.parent_id]['replies'].append(add_node(child))
+            last_reply[child.parent_id] = child
+    
+    for comment_id, node in nodes.items():
+        node['has_more_replies'] = node['replies_count'] > len(node['replies'])
+        node['replies_cursor'] = None
+        if node['has_more_replies'] and comment_id in last_reply:
+            last = last_reply[comment_id]
+            node['replies_cursor'] = encode_cursor(last.created_at, last.id)
+    return roots, page_result
+
+
+# 解析楼层树的分页与展开参数：cursor、limit、depth（展开层数）、replies（每条评论展开的回复数）
+def parse_thread_args(args):
+    cursor = args.get('cursor') or None
+    limit = max(1, min(args.get('limit', DEFAULT_LIMIT, type=int) or DEFAULT_LIMIT, MAX_LIMIT))
+    depth = max(0, min(args.get('depth', DEFAULT_THREAD_DEPTH, type=int), MAX_COMMENT_DEPTH))
+    replies = max(1, min(args.get('replies', DEFAULT_THREAD_REPLIES, type=int) or DEFAULT_THREAD_REPLIES, MAX_THREAD_REPLIES))
+    return cursor, limit, depth, replies
+
+
 # 点赞记录模型
 class Like(db.Model):
     __tablename__ = 'likes'
@@ -181,6 +597,524 @@ class Like(db.Model):
     __table_args__ = (db.UniqueConstraint('user_id', 'post_id', name='unique_user_post_like'),)
 
 
+# 通知模型：帖子被点赞、被评论或评论被回复时写入接收者的收件箱，read_at 为空表示未读
+class Notification(db.Model):
+    __tablename__ = 'notifications'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # 接收者
+    actor_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # 触发者
+    type = db.Column(db.String(20), nullable=False)  # like / comment / reply
+    post_id = db.Column(db.Integer, db.ForeignKey('posts.id', ondelete='CASCADE'), nullable=False)
+    comment_id = db.Column(db.Integer, db.ForeignKey('comments.id', ondelete='CASCADE'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    read_at = db.Column(db.DateTime)
+    
+    actor = db.relationship('User', foreign_keys=[actor_id])
+    post = db.relationship('Post')
+    
+    # 收件箱按 (user_id, id) 游标分页与断线补发，未读数按 (user_id, read_at) 统计；
+    # 点赞时按 (actor_id, post_id) 检查是否已通知过
+    __table_args__ = (
+        db.Index('ix_notifications_user_id_id', 'user_id', 'id'),
+        db.Index('ix_notifications_user_id_read_at', 'user_id', 'read_at'),
+        db.Index('ix_notifications_actor_id_post_id', 'actor_id', 'post_id'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'type': self.type,
+            'actor': self.actor.to_summary_dict() if self.actor else None,
+            'post_id': self.post_id,
+            'post_title': self.post.title if self.post else None,
+            'comment_id': self.comment_id,
+            'created_at': self.created_at.isoformat(),
+            'read': self.read_at is not None
+        }
+
+
+# 收件箱查询：预加载触发者与帖子标题，不读取帖子正文
+def notification_query(user_id):
+    return Notification.query.options(
+        db.joinedload(Notification.actor).load_only(User.id, User.username, User.avatar),
+        db.joinedload(Notification.post).load_only(Post.id, Post.title)
+    ).filter(Notification.user_id == user_id)
+
+
+# 为接收者创建通知（与触发它的点赞/评论在同一事务内写入）；自己触发的不通知
+def add_notification(user_id, actor_id, type, post_id, comment_id=None, pending=None):
+    if not user_id or user_id == actor_id:
+        return None
+    notification = Notification(user_id=user_id, actor_id=actor_id, type=type, post_id=post_id, comment_id=comment_id)
+    db.session.add(notification)
+    if pending is not None:
+        pending.append(notification)
+    return notification
+
+
+# 事务提交后把新通知推送给在线的接收者；推送失败不影响已持久化的通知，客户端重连后从收件箱补齐
+def publish_notifications(notifications):
+    broker = current_app.extensions.get('notification_broker')
+    if not broker or not notifications:
+        return
+    for notification in notifications:
+        try:
+            broker.publish(notification.user_id, notification.to_dict())
+        except Exception as e:
+            current_app.logger.error('推送通知 %s 时出错: %s', notification.id, e)
+
+
+# 文化活动模型：participants_count 为报名人数计数器，只通过条件 UPDATE 原子增减；capacity 为空表示不限名额
+class Activity(db.Model):
+    __tablename__ = 'activities'
+
+    id = db.Column(db.Integer, primary_key=True)
+    title = db.Column(db.String(200), nullable=False)
+    description = db.Column(db.Text)
+    image_url = db.Column(db.String(255))
+    start_date = db.Column(db.DateTime, nullable=False)
+    end_date = db.Column(db.DateTime, nullable=False)
+    location = db.Column(db.String(200), nullable=False)
+    capacity = db.Column(db.Integer)
+    participants_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # 列表按 (start_date, id) 排序与游标分页，日期范围筛选走同一索引；按地点筛选走 (location, start_date)
+    __table_args__ = (
+        db.Index('ix_activities_start_date_id', 'start_date', 'id'),
+        db.Index('ix_activities_location_start_date', 'location', 'start_date'),
+    )
+
+    def to_dict(self, is_joined=False):
+        return {
+            'id': self.id,
+            'title': self.title,
+            'description': self.description,
+            'imageUrl': self.image_url,
+            'startDate': self.start_date.date().isoformat(),
+            'endDate': self.end_date.date().isoformat(),
+            'location': self.location,
+            'capacity': self.capacity,
+            'participants': self.participants_count or 0,
+            'isJoined': is_joined
+        }
+
+
+# 活动报名记录：(user_id, activity_id) 唯一，同一用户重复报名不会重复计数
+class ActivityRegistration(db.Model):
+    __tablename__ = 'activity_registrations'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    activity_id = db.Column(db.Integer, db.ForeignKey('activities.id', ondelete='CASCADE'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint('user_id', 'activity_id', name='unique_user_activity_registration'),)
+
+
+# 一次查询取出当前用户在给定活动中已报名的活动ID集合，用于填充一页活动的 isJoined
+def joined_activity_ids(user_id, activity_ids):
+    if not activity_ids:
+        return set()
+    return set(db.session.scalars(
+        db.select(ActivityRegistration.activity_id).where(
+            ActivityRegistration.user_id == user_id,
+            ActivityRegistration.activity_id.in_(activity_ids)
+        )
+    ))
+
+
+# 原子地调整活动报名人数并返回最新值；增加时在同一条 UPDATE 中检查名额，名额已满或活动不存在时返回 None
+def update_participants_count(activity_id, delta):
+    table = Activity.__table__
+    statement = table.update().where(table.c.id == activity_id)
+    if delta > 0:
+        statement = statement.where(db.or_(
+            table.c.capacity.is_(None),
+            table.c.participants_count + delta <= table.c.capacity
+        ))
+    else:
+        # 确保报名人数不会变成负数
+        statement = statement.where(table.c.participants_count + delta >= 0)
+    statement = statement.values(participants_count=table.c.participants_count + delta)
+
+    if db.session.get_bind().dialect.update_returning:
+        return db.session.execute(statement.returning(table.c.participants_count)).scalar()
+    if db.session.execute(statement).rowcount == 0:
+        return None
+    return db.session.execute(db.select(table.c.participants_count).where(table.c.id == activity_id)).scalar()
+
+
+# 读取活动当前的报名人数，活动不存在时返回 None
+def participants_of(activity_id):
+    return db.session.execute(db.select(Activity.participants_count).where(Activity.id == activity_id)).scalar()
+
+
+# 解析活动列表的日期筛选参数（YYYY-MM-DD），返回 datetime；格式错误时抛出 ValueError
+def parse_activity_date(value):
+    return datetime.strptime(value, '%Y-%m-%d') if value else None
+
+
+# 把请求体中的ID（整数或数字字符串）转换为正整数，格式不正确时抛出 ValueError
+def parse_id(value):
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(value)
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(value)
+    if value <= 0:
+        raise ValueError(value)
+    return value
+
+
+# 请求过于频繁时的响应
+def too_many_requests(retry_after):
+    return jsonify({'error': '请求过于频繁，请稍后再试', 'retry_after': retry_after}), 429, {'Retry-After': str(retry_after)}
+
+
+# 登录成功后按当前参数在后台重新计算密码哈希；仅当哈希未被其他请求修改时写回
+def upgrade_password_hash(user, password):
+    hasher = current_app.extensions['password_hasher']
+    if not hasher.needs_rehash(user.password_hash):
+        return
+    app = current_app._get_current_object()
+    user_id, old_hash = user.id, user.password_hash
+    
+    def store(new_hash):
+        with app.app_context():
+            try:
+                db.session.execute(
+                    db.update(User)
+                    .where(User.id == user_id, User.password_hash == old_hash)
+                    .values(password_hash=new_hash)
+                )
+                db.session.commit()
+                app.logger.info('用户 %s 的密码哈希已升级为 %s', user_id, hasher.prefix)
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error('升级用户 %s 的密码哈希时出错: %s', user_id, e)
+    
+    hasher.rehash_async(password, store)
+
+
+# 当前请求的用户：权限判断直接使用令牌中已签名的 username/is_admin 声明，
+# 只有处理函数确实需要 ORM 对象时才通过 load() 查询 users 表，且每个请求最多查询一次
+class CurrentUser:
+    def __init__(self, identity, claims):
+        self.id = identity
+        self.username = claims.get('username')
+        self.is_admin = bool(claims.get('is_admin'))
+        self._user = None
+    
+    def load(self):
+        if self._user is None:
+            self._user = db.session.get(User, self.id)
+        return self._user
+
+
+# 获取当前请求的用户（需在 jwt_required 保护的路由中调用）
+def get_current_user():
+    if 'current_user' not in g:
+        g.current_user = CurrentUser(get_jwt_identity(), get_jwt())
+    return g.current_user
+
+
+# 管理后台用户导出的字段
+USER_EXPORT_FIELDS = ['id', 'username', 'email', 'is_admin', 'avatar', 'registration_date']
+
+
+# 根据请求参数构造管理后台的用户查询：username 前缀、is_admin、注册时间范围（registered_from/registered_to，
+# 取值为 YYYY-MM-DD 或 ISO 格式时间，仅有日期的结束时间包含当天全天），参数格式错误时抛出 ValueError
+def filter_users_query(query, args):
+    username = args.get('username', '').strip()
+    if username:
+        query = query.filter(User.username.startswith(username, autoescape=True))
+    
+    is_admin = args.get('is_admin', '').lower()
+    if is_admin in ('1', 'true', 'yes'):
+        query = query.filter(User.is_admin.is_(True))
+    elif is_admin in ('0', 'false', 'no'):
+        query = query.filter(User.is_admin.is_(False))
+    elif is_admin:
+        raise ValueError('is_admin 参数无效')
+    
+    registered_from = args.get('registered_from')
+    if registered_from:
+        query = query.filter(User.created_at >= datetime.fromisoformat(registered_from))
+    registered_to = args.get('registered_to')
+    if registered_to:
+        if len(registered_to) == 10:
+            query = query.filter(User.created_at < datetime.fromisoformat(registered_to) + timedelta(days=1))
+        else:
+            query = query.filter(User.created_at <= datetime.fromisoformat(registered_to))
+    return query
+
+
+def user_admin_dict(user):
+    user_data = user.to_dict()
+    # 仅在管理员视图中添加敏感信息
+    user_data['registration_date'] = user.created_at.isoformat() if user.created_at else None
+    return user_data
+
+
+# 流式导出用户：只查询所需列，服务端游标逐批读取
+def iter_user_export_rows(args, batch_size=1000):
+    query = filter_users_query(
+        db.session.query(User.id, User.username, User.email, User.is_admin, User.avatar, User.created_at), args
+    ).order_by(User.created_at.desc(), User.id.desc())
+    rows = db.session.execute(query.statement.execution_options(yield_per=batch_size))
+    for user_id, username, email, is_admin, avatar, created_at in rows:
+        yield {
+            'id': user_id,
+            'username': username,
+            'email': email,
+            'is_admin': bool(is_admin),
+            'avatar': avatar,
+            'registration_date': created_at.isoformat() if created_at else None
+        }
+
+
+# 管理员权限装饰器：基于令牌声明判断，不查询数据库
+def admin_required(fn):
+    @wraps(fn)
+    @jwt_required()
+    def wrapper(*args, **kwargs):
+        current_user = get_current_user()
+        if not current_user.is_admin:
+            current_app.logger.warning('用户 %s 尝试访问管理员功能', current_user.id)
+            return jsonify({'error': '需要管理员权限'}), 403
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+# 按方言生成“插入或忽略”语句：只忽略唯一约束冲突，外键等其他错误照常抛出；须通过 execute_insert_ignore 执行
+def insert_ignore(table):
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        # SQLite 的冲突子句不作用于外键约束
+        return table.insert().prefix_with('OR IGNORE')
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        return insert(table).on_conflict_do_nothing()
+    # MySQL 的 INSERT IGNORE 会把外键错误也降级为警告，改为普通插入，由 execute_insert_ignore 只捕获重复键错误
+    return table.insert()
+
+
+# 执行 insert_ignore 语句并返回插入行数，唯一约束冲突时返回0
+def execute_insert_ignore(statement):
+    if db.session.get_bind().dialect.name not in ('mysql', 'mariadb'):
+        return db.session.execute(statement).rowcount
+    try:
+        # 在保存点内插入，重复键错误只回滚这一条语句
+        with db.session.begin_nested():
+            return db.session.execute(statement).rowcount
+    except IntegrityError as e:
+        if e.orig is not None and e.orig.args and e.orig.args[0] == MYSQL_DUPLICATE_ENTRY:
+            return 0
+        raise
+
+
+# 原子地调整帖子点赞数并返回最新值；方言支持 UPDATE ... RETURNING 时只需一次往返
+def update_likes_count(post_id, delta):
+    table = Post.__table__
+    likes = db.func.coalesce(table.c.likes_count, 0)
+    if delta > 0:
+        new_value = likes + delta
+    elif delta < 0:
+        # 确保点赞数不会变成负数
+        new_value = db.case((likes + delta > 0, likes + delta), else_=0)
+    else:
+        return db.session.execute(db.select(table.c.likes_count).where(table.c.id == post_id)).scalar() or 0
+    
+    statement = table.update().where(table.c.id == post_id).values(likes_count=new_value)
+    if db.session.get_bind().dialect.update_returning:
+        return db.session.execute(statement.returning(table.c.likes_count)).scalar() or 0
+    db.session.execute(statement)
+    return db.session.execute(db.select(table.c.likes_count).where(table.c.id == post_id)).scalar() or 0
+
+
+# 文化资源变更后失效派生数据：列表缓存统一带 resources 标签，详情缓存带 resource:<id> 标签，
+# 知识图谱标记为过期，下次访问时重建
+def invalidate_resource_cache(resource_id=None):
+    tags = ['resources']
+    if resource_id is not None:
+        tags.append(f'resource:{resource_id}')
+    current_app.extensions['response_cache'].invalidate(*tags)
+    current_app.extensions['knowledge_graph'].invalidate()
+
+
+# 用户的用户名、头像或角色变化后失效所有内嵌作者信息的资源缓存（列表与全部详情，详情统一带 resource-details 标签），
+# 作者名同时出现在知识图谱节点中
+def invalidate_author_cache():
+    current_app.extensions['response_cache'].invalidate('resources', 'resource-details')
+    current_app.extensions['knowledge_graph'].invalidate()
+
+
+# 从数据库构建知识图谱：资源、资源标签和作者各一次查询
+def build_knowledge_graph():
+    resources = db.session.execute(
+        db.select(CulturalResource.id, CulturalResource.title, CulturalResource.category, CulturalResource.author_id)
+    ).all()
+    tag_links = db.session.execute(
+        db.select(resource_tags.c.resource_id, Tag.name).join(Tag, Tag.id == resource_tags.c.tag_id)
+    ).all()
+    author_ids = {author_id for _, _, _, author_id in resources if author_id is not None}
+    authors = dict(db.session.execute(
+        db.select(User.id, User.username).where(User.id.in_(author_ids))
+    ).all()) if author_ids else {}
+    return KnowledgeGraph.build(resources, tag_links, authors)
+
+
+# 批量导入文化资源：按批校验、去重并在一个事务内批量写入，同时维护标签关联和搜索索引。
+# 已有资源的标题与内容指纹在开始时一次查询载入内存，用于与库内及文件内的记录去重。
+def import_resources(records, author_id, batch_size=1000, skip=0, on_batch=None):
+    # 新增内容指纹列之前的资源没有指纹，先补齐，否则导入时无法与其按内容去重
+    backfill_content_hashes(batch_size)
+    seen_titles = set()
+    seen_hashes = set()
+    for title, digest in db.session.execute(db.select(CulturalResource.title, CulturalResource.content_hash)):
+        seen_titles.add(title)
+        if digest:
+            seen_hashes.add(digest)
+    tag_ids = dict(db.session.query(Tag.name, Tag.id).all())
+    
+    def write_batch(batch, stats):
+        rows = []
+        for record in batch:
+            if not record or not record.get('title') or not record.get('description'):
+                stats.invalid += 1
+                continue
+            title = str(record['title']).strip()[:200]
+            description = str(record['description'])
+            digest = resource_io.content_hash(title, description)
+            if title in seen_titles or digest in seen_hashes:
+                stats.duplicates += 1
+                continue
+            seen_titles.add(title)
+            seen_hashes.add(digest)
+            rows.append({
+                'title': title,
+                'description': description,
+                'category': str(record.get('category') or '未分类').strip()[:100],
+                'image_url': str(record['image_url'])[:255] if record.get('image_url') else None,
+                'tags': ','.join(normalize_tag_names(record.get('tags'))),
+                'content_hash': digest,
+                'author_id': author_id
+            })
+        if not rows:
+            return
+        
+        try:
+            db.session.execute(db.insert(CulturalResource), rows)
+            # 通过内容指纹一次取回本批新记录的主键
+            ids = dict(db.session.execute(
+                db.select(CulturalResource.content_hash, CulturalResource.id)
+                .where(CulturalResource.content_hash.in_([row['content_hash'] for row in rows]))
+            ).all())
+            link_tags_bulk([(ids[row['content_hash']], normalize_tag_names(row['tags'])) for row in rows], tag_ids)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        stats.imported += len(rows)
+        
+        try:
+            current_app.extensions['search_index'].upsert_many(
+                ('resource', ids[row['content_hash']], row['title'], row['description'],
+                 normalize_tag_names(row['tags']))
+                for row in rows
+            )
+        except Exception as e:
+            current_app.logger.error('批量更新搜索索引时出错: %s', e)
+    
+    try:
+        return resource_io.run_import(records, write_batch, batch_size=batch_size, skip=skip, on_batch=on_batch)
+    finally:
+        invalidate_resource_cache()
+
+
+# 为 content_hash 为空的资源分批计算并写入内容指纹，返回补齐的数量；可重复执行
+def backfill_content_hashes(batch_size=1000):
+    table = CulturalResource.__table__
+    updated = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            db.select(table.c.id, table.c.title, table.c.description)
+            .where(table.c.content_hash.is_(None), table.c.id > last_id)
+            .order_by(table.c.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        db.session.execute(
+            table.update().where(table.c.id == db.bindparam('target_id')).values(content_hash=db.bindparam('digest')),
+            [{'target_id': row_id, 'digest': resource_io.content_hash(title, description)} for row_id, title, description in rows]
+        )
+        db.session.commit()
+        updated += len(rows)
+        last_id = rows[-1][0]
+    return updated
+
+
+# 流式导出文化资源：服务端游标逐批读取，不把整表载入内存
+def iter_resource_export_rows(batch_size=1000):
+    rows = db.session.execute(
+        db.select(
+            CulturalResource.title, CulturalResource.description, CulturalResource.category,
+            CulturalResource.image_url, CulturalResource.tags, CulturalResource.created_date, User.username
+        )
+        .outerjoin(User, User.id == CulturalResource.author_id)
+        .order_by(CulturalResource.id)
+        .execution_options(yield_per=batch_size)
+    )
+    for title, description, category, image_url, tags, created_date, username in rows:
+        yield {
+            'title': title,
+            'description': description,
+            'category': category,
+            'image_url': image_url,
+            'tags': normalize_tag_names(tags),
+            'created_date': created_date.isoformat() if created_date else None,
+            'author': username
+        }
+
+
+# 全文搜索索引的增量维护：索引失败只记录日志，不影响主流程
+def index_document(doc):
+    try:
+        search_index = current_app.extensions['search_index']
+        if isinstance(doc, CulturalResource):
+            search_index.upsert('resource', doc.id, doc.title, doc.description, normalize_tag_names(doc.tags))
+        else:
+            search_index.upsert('post', doc.id, doc.title, doc.content)
+    except Exception as e:
+        current_app.logger.error('更新搜索索引时出错: %s', e)
+
+
+def remove_from_index(doc_type, doc_id):
+    try:
+        current_app.extensions['search_index'].delete(doc_type, doc_id)
+    except Exception as e:
+        current_app.logger.error('删除搜索索引时出错: %s', e)
+
+
+# 逐批读取资源和帖子，生成全量重建索引所需的文档
+def iter_search_documents(batch_size=1000):
+    resources = db.session.execute(
+        db.select(CulturalResource.id, CulturalResource.title, CulturalResource.description, CulturalResource.tags)
+        .execution_options(yield_per=batch_size)
+    )
+    for resource_id, title, description, tags in resources:
+        yield 'resource', resource_id, title, description, normalize_tag_names(tags)
+    posts = db.session.execute(
+        db.select(Post.id, Post.title, Post.content).execution_options(yield_per=batch_size)
+    )
+    for post_id, title, content in posts:
+        yield 'post', post_id, title, content, None
+
+
 # 初始化应用
 def create_app(config_name=None):
     app = Flask(__name__)
@@ -191,6 +1125,12 @@ def create_app(config_name=None):
     
     from config import config as config_obj
     app.config.from_object(config_obj[config_name])
+    setup_logging(app)
+    # JSON 编码（中文不转义、日期时间直接序列化）与响应压缩
+    app.json = create_json_provider(app)
+    compressor = create_compressor(app.config)
+    if compressor:
+        compressor.init_app(app)
     
     # 配置CORS，允许跨域请求
     CORS(app, supports_credentials=True, origins=["http://localhost:5173", "http://127.0.0.1:5173", "http://localhost:3000", "http://localhost:5174"], resources={
@@ -205,9 +1145,57 @@ def create_app(config_name=None):
     })
     
     # 初始化扩展
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = configure_pool_options(app.config)
     db.init_app(app)
     migrate = Migrate(app, db)
+    # 连接池与每请求SQL统计
+    pool_metrics = PoolMetrics()
+    query_stats = RequestQueryStats(app.logger)
+    with app.app_context():
+        pool_metrics.attach(db.engine)
+        query_stats.attach(db.engine)
+    query_stats.init_app(app)
+    app.extensions['pool_metrics'] = pool_metrics
+    app.extensions['query_stats'] = query_stats
     jwt = JWTManager(app)
+    app.extensions['search_index'] = SearchIndex(app.config['SEARCH_INDEX_PATH'])
+    app.extensions['token_blocklist'] = create_blocklist(app.config, db, RevokedToken)
+    app.extensions['password_hasher'] = create_password_hasher(app.config)
+    media_store = MediaStore(
+        app.config['MEDIA_ROOT'],
+        thumbnail_sizes=app.config['MEDIA_THUMBNAIL_SIZES'],
+        max_bytes=app.config['MEDIA_MAX_UPLOAD_MB'] * 1024 * 1024,
+        logger=app.logger
+    )
+    app.extensions['media_store'] = media_store
+    rate_limiter = create_rate_limiter(app.config)
+    app.extensions['rate_limiter'] = rate_limiter
+    login_ip_limit = parse_limit(app.config['LOGIN_RATE_LIMIT_PER_IP'])
+    login_username_limit = parse_limit(app.config['LOGIN_RATE_LIMIT_PER_USERNAME'])
+    register_ip_limit = parse_limit(app.config['REGISTER_RATE_LIMIT_PER_IP'])
+    if app.config.get('PROXY_FIX_X_FOR'):
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
+    response_cache = ResponseCache(
+        max_entries=app.config['RESPONSE_CACHE_MAX_ENTRIES'],
+        default_ttl=app.config['RESPONSE_CACHE_TTL'],
+        redis_url=app.config['RESPONSE_CACHE_REDIS_URL'],
+        enabled=app.config['RESPONSE_CACHE_ENABLED']
+    )
+    app.extensions['response_cache'] = response_cache
+    app.extensions['knowledge_graph'] = GraphStore(app.config['KNOWLEDGE_GRAPH_PATH'], build_knowledge_graph)
+    notification_broker = create_notification_broker(app.config, logger=app.logger)
+    app.extensions['notification_broker'] = notification_broker
+    
+    # 浏览量在内存中缓冲，由后台线程在独立的应用上下文中定期写回
+    def flush_views_in_context(deltas):
+        with app.app_context():
+            flush_post_views(deltas)
+    
+    app.extensions['view_counter'] = ViewCounter(
+        flush_views_in_context,
+        interval=app.config['VIEW_COUNT_FLUSH_INTERVAL'],
+        logger=app.logger
+    )
     
     # JWT额外声明处理
     @jwt.additional_claims_loader
@@ -237,7 +1225,161 @@ def create_app(config_name=None):
     @jwt.token_in_blocklist_loader
     def check_if_token_revoked(jwt_header, jwt_payload):
         jti = jwt_payload['jti']
-        return is_token_blacklisted(jti)
+        return is_token_blacklisted(jti, jwt_payload.get('exp'))
+    
+    # 维护命令：按 comments 表批量重算所有帖子的评论数，用于迁移后回填或数据校正
+    @app.cli.command('recount-comments')
+    def recount_comments():
+        result = db.session.execute(
+            db.update(Post)
+            .values(comments_count=db.select(db.func.count(Comment.id))
+                    .where(Comment.post_id == Post.id)
+                    .scalar_subquery())
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        print(f'已重新统计 {result.rowcount} 个帖子的评论数')
+
+    # 维护命令：按报名记录重新统计所有活动的报名人数
+    @app.cli.command('recount-activity-participants')
+    def recount_activity_participants():
+        result = db.session.execute(
+            db.update(Activity)
+            .values(participants_count=db.select(db.func.count(ActivityRegistration.id))
+                    .where(ActivityRegistration.activity_id == Activity.id)
+                    .scalar_subquery())
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        print(f'已重新统计 {result.rowcount} 个活动的报名人数')
+
+    # 维护命令：分批重算所有帖子的热度分，用于新增 hot_score 列后回填或调整 ranking 中的权重后重算
+    @app.cli.command('rebuild-hot-scores')
+    def rebuild_hot_scores():
+        batch_size = 1000
+        last_id = 0
+        updated = 0
+        while True:
+            post_ids = db.session.scalars(
+                db.select(Post.id).where(Post.id > last_id).order_by(Post.id).limit(batch_size)
+            ).all()
+            if not post_ids:
+                break
+            refresh_hot_scores(post_ids)
+            db.session.commit()
+            updated += len(post_ids)
+            last_id = post_ids[-1]
+        print(f'已重新计算 {updated} 个帖子的热度分')
+    
+    # 迁移命令：为新增楼层字段之前的评论（均为顶层评论）回填物化路径，可重复执行
+    @app.cli.command('backfill-comment-paths')
+    def backfill_comment_paths():
+        batch_size = 1000
+        updated = 0
+        while True:
+            comment_ids = db.session.scalars(
+                db.select(Comment.id).where(Comment.path.is_(None)).order_by(Comment.id).limit(batch_size)
+            ).all()
+            if not comment_ids:
+                break
+            db.session.execute(
+                db.update(Comment.__table__)
+                .where(Comment.__table__.c.id == db.bindparam('target_id'))
+                .values(path=db.bindparam('path')),
+                [{'target_id': comment_id, 'path': comment_path_segment(comment_id)} for comment_id in comment_ids]
+            )
+            db.session.commit()
+            updated += len(comment_ids)
+        print(f'已回填 {updated} 条评论的路径')
+    
+    # 迁移命令：为新增 content_hash 列之前的资源补齐内容指纹（批量导入时也会自动执行），可重复执行
+    @app.cli.command('backfill-content-hashes')
+    def backfill_content_hashes_command():
+        updated = backfill_content_hashes()
+        print(f'已为 {updated} 个资源补齐内容指纹')
+    
+    # 迁移命令：创建标签表并从逗号分隔的 tags 字段回填关联表，可重复执行
+    @app.cli.command('backfill-tags')
+    def backfill_tags():
+        db.create_all()
+        tag_ids = dict(db.session.query(Tag.name, Tag.id).all())
+        batch_size = 1000
+        last_id = 0
+        linked = 0
+        while True:
+            rows = db.session.query(CulturalResource.id, CulturalResource.tags) \
+                .filter(CulturalResource.id > last_id) \
+                .order_by(CulturalResource.id) \
+                .limit(batch_size).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            
+            parsed = [(resource_id, normalize_tag_names(tags)) for resource_id, tags in rows]
+            linked += link_tags_bulk(parsed, tag_ids)
+            db.session.commit()
+        
+        app.extensions['response_cache'].clear()
+        print(f'标签回填完成，新增 {linked} 条资源标签关联')
+    
+    # 批量导入命令：流式读取 JSONL/CSV 文件，按批写入，每批提交后保存断点，中断后重新执行可续传
+    @app.cli.command('import-resources')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'fmt', type=click.Choice(['auto', 'jsonl', 'csv']), default='auto', help='文件格式')
+    @click.option('--author', default='admin', help='导入资源的作者用户名')
+    @click.option('--batch-size', default=1000, help='每批写入的记录数')
+    @click.option('--restart', is_flag=True, help='忽略已有断点，从头导入')
+    def import_resources_command(path, fmt, author, batch_size, restart):
+        author_user = User.query.filter_by(username=author).first()
+        if not author_user:
+            print(f'作者用户不存在: {author}')
+            return
+        
+        fmt = resource_io.detect_format(path) if fmt == 'auto' else fmt
+        checkpoint = resource_io.Checkpoint(path + '.checkpoint', path)
+        if restart:
+            checkpoint.clear()
+        skip = checkpoint.load()
+        if skip:
+            print(f'从断点继续，跳过前 {skip} 条记录')
+        
+        def on_batch(stats):
+            checkpoint.save(stats.processed)
+            progress = stats.to_dict()
+            print(f"已处理 {progress['processed']} 条，导入 {progress['imported']} 条，"
+                  f"重复 {progress['duplicates']} 条，无效 {progress['invalid']} 条，{progress['rate']} 条/秒")
+        
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            stats = import_resources(
+                resource_io.iter_records(f, fmt), author_user.id,
+                batch_size=batch_size, skip=skip, on_batch=on_batch
+            )
+        checkpoint.clear()
+        print(f'导入完成: {stats.to_dict()}')
+    
+    # 批量导出命令：流式写出所有文化资源
+    @app.cli.command('export-resources')
+    @click.argument('path', type=click.Path(dir_okay=False, writable=True))
+    @click.option('--format', 'fmt', type=click.Choice(['auto', 'jsonl', 'csv']), default='auto', help='文件格式')
+    def export_resources_command(path, fmt):
+        fmt = resource_io.detect_format(path) if fmt == 'auto' else fmt
+        encoder = resource_io.export_csv if fmt == 'csv' else resource_io.export_jsonl
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            for chunk in encoder(iter_resource_export_rows()):
+                f.write(chunk)
+        print(f'导出完成: {path}')
+    
+    # 维护命令：从数据库全量重建全文搜索索引
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index():
+        count = app.extensions['search_index'].rebuild(iter_search_documents())
+        print(f'搜索索引重建完成，共索引 {count} 个文档')
+    
+    # 维护命令：从数据库重建知识图谱邻接表
+    @app.cli.command('rebuild-knowledge-graph')
+    def rebuild_knowledge_graph():
+        graph = app.extensions['knowledge_graph'].rebuild()
+        print(f'知识图谱重建完成，共 {len(graph.nodes)} 个节点')
     
     # 添加JWT刷新时间配置
     app.config['JWT_REFRESH_DELTA'] = timedelta(minutes=15)
@@ -255,13 +1397,13 @@ def create_app(config_name=None):
     # 错误处理
     @app.errorhandler(404)
     def not_found(error):
-        app.logger.error(f'资源未找到: {request.url}')
+        app.logger.error('资源未找到: %s', request.url)
         return jsonify({'error': '资源未找到'}), 404
 
     @app.errorhandler(500)
     def internal_error(error):
         db.session.rollback()
-        app.logger.error(f'服务器内部错误: {str(error)}')
+        app.logger.error('服务器内部错误: %s', error)
         return jsonify({'error': '服务器内部错误'}), 500
     
     # API路由 - 用户认证
@@ -270,13 +1412,21 @@ def create_app(config_name=None):
         data = request.get_json()
         
         # 验证输入数据
-        if not data or not data.get('username') or not data.get('email') or not data.get('password'):
+        if not isinstance(data, dict) or not data.get('username') or not data.get('email') or not data.get('password'):
             app.logger.warning('注册时缺少必要参数')
             return jsonify({'error': '缺少必要参数'}), 400
         
         username = data['username']
         email = data['email']
         password = data['password']
+        if not all(isinstance(value, str) for value in (username, email, password)):
+            return jsonify({'error': '用户名、邮箱和密码必须为字符串'}), 400
+        
+        # 限流在查询数据库和计算密码哈希之前执行
+        allowed, retry_after = rate_limiter.hit(f'register:ip:{request.remote_addr}', *register_ip_limit)
+        if not allowed:
+            app.logger.warning('注册请求过于频繁: %s', request.remote_addr)
+            return too_many_requests(retry_after)
         
         # 验证邮箱格式
         if not re.match(r'^[^@]+@[^@]+\.[^@]+$', email):
@@ -285,24 +1435,28 @@ def create_app(config_name=None):
         # 检查用户名或邮箱是否已存在
         existing_user = User.query.filter((User.username == username) | (User.email == email)).first()
         if existing_user:
-            app.logger.info(f'尝试使用已存在的用户名或邮箱注册: {username}')
+            app.logger.info('尝试使用已存在的用户名或邮箱注册: %s', username)
             return jsonify({'error': '用户名或邮箱已被注册'}), 409
         
         # 创建新用户
         user = User(username=username, email=email)
-        user.set_password(password)
+        try:
+            user.set_password(password)
+        except HasherBusy:
+            app.logger.warning('密码哈希任务繁忙，注册请求被拒绝: %s', username)
+            return jsonify({'error': '服务器繁忙，请稍后重试'}), 503, {'Retry-After': '1'}
         user.is_admin = False  # 默认非管理员
         
         db.session.add(user)
         db.session.flush()  # 获取用户ID，但暂不提交事务
         
-        # 生成默认头像URL，基于用户名首字母和用户ID
+        # 生成默认头像URL，基于用户名首字母和用户ID，由本服务确定性地生成
         initial = username[0].upper() if username else 'U'
-        user.avatar = f'https://picsum.photos/seed/{initial}{user.id}/100'
+        user.avatar = f'/api/media/avatars/{initial}{user.id}.svg'
         
         db.session.commit()  # 提交所有更改
         
-        app.logger.info(f'新用户注册成功: {username}')
+        app.logger.info('新用户注册成功: %s', username)
         
         return jsonify({
             'success': True,
@@ -315,24 +1469,48 @@ def create_app(config_name=None):
     def login():
         data = request.get_json()
         
-        if not data or not data.get('username') or not data.get('password'):
+        if not isinstance(data, dict) or not data.get('username') or not data.get('password'):
             return jsonify({'error': '缺少用户名或密码'}), 400
         
         username_or_email = data['username']
         password = data['password']
+        # 先校验类型再构造限流键，非字符串参数返回400而不是在 strip()/哈希校验时出错
+        if not isinstance(username_or_email, str) or not isinstance(password, str):
+            return jsonify({'error': '用户名和密码必须为字符串'}), 400
+        
+        # 限流在查询数据库和校验密码之前执行：按IP统计所有登录请求，按用户名统计失败次数
+        username_key = f'login:user:{username_or_email.strip().lower()}'
+        allowed, retry_after = rate_limiter.hit(f'login:ip:{request.remote_addr}', *login_ip_limit)
+        if allowed:
+            allowed, retry_after = rate_limiter.peek(username_key, *login_username_limit)
+        if not allowed:
+            app.logger.warning('登录请求过于频繁: %s，IP: %s', username_or_email, request.remote_addr)
+            return too_many_requests(retry_after)
         
         # 查找用户（支持用户名或邮箱登录）
         user = User.query.filter(
             (User.username == username_or_email) | (User.email == username_or_email)
         ).first()
         
-        if not user or not user.check_password(password):
-            app.logger.warning(f'登录失败，用户名或密码错误: {username_or_email}')
+        try:
+            password_ok = user is not None and user.check_password(password)
+        except HasherBusy:
+            app.logger.warning('密码校验任务繁忙，登录请求被拒绝: %s', username_or_email)
+            return jsonify({'error': '服务器繁忙，请稍后重试'}), 503, {'Retry-After': '1'}
+        
+        if not password_ok:
+            rate_limiter.hit(username_key, *login_username_limit)
+            app.logger.warning('登录失败，用户名或密码错误: %s', username_or_email)
             return jsonify({'error': '用户名或密码错误'}), 401
         
+        rate_limiter.reset(username_key, login_username_limit[1])
+        
+        # 哈希参数已调整时，在后台升级该用户的密码哈希
+        upgrade_password_hash(user, password)
+        
         # 登录成功，生成JWT令牌
         access_token = create_access_token(identity=user.id)
-        app.logger.info(f'用户登录成功: {user.username}')
+        app.logger.info('用户登录成功: %s', user.username)
         
         return jsonify({
             'success': True,
@@ -345,33 +1523,37 @@ def create_app(config_name=None):
     @app.route('/api/logout', methods=['POST'])
     @jwt_required()
     def logout():
-        jti = get_jwt()['jti']
-        blacklist_token(jti)
-        app.logger.info(f'用户登出: {get_jwt_identity()}')
+        token = get_jwt()
+        blacklist_token(token['jti'], token['exp'])
+        app.logger.info('用户登出: %s', get_jwt_identity())
         return jsonify({'success': True, 'message': '登出成功'}), 200
 
 
     @app.route('/api/profile/<int:user_id>', methods=['GET', 'PUT'])
     @jwt_required()
     def profile(user_id):
-        current_user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        current_user = get_current_user()
+        current_user_id = current_user.id
+        # 访问自己的资料时复用当前请求已加载（或按需加载）的用户对象
+        user = current_user.load() if user_id == current_user_id else db.session.get(User, user_id)
         if not user:
             return jsonify({'error': '用户不存在'}), 404
 
         # 检查权限：只能修改自己的资料，或管理员可以修改任意用户资料
-        current_user = User.query.get(current_user_id)
         if current_user_id != user_id and not current_user.is_admin:
-            app.logger.warning(f'用户 {current_user_id} 尝试访问无权限的用户资料 {user_id}')
+            app.logger.warning('用户 %s 尝试访问无权限的用户资料 %s', current_user_id, user_id)
             return jsonify({'error': '无权访问此资源'}), 403
 
         if request.method == 'GET':
-            app.logger.info(f'用户 {current_user_id} 访问用户 {user_id} 的资料')
+            app.logger.info('用户 %s 访问用户 %s 的资料', current_user_id, user_id)
             return jsonify({'user': user.to_dict()})
 
         elif request.method == 'PUT':
             data = request.get_json()
 
+            # 资源列表/详情缓存内嵌作者信息（知识图谱节点含作者名），记录修改前的序列化结果用于判断是否需要失效
+            author_before = user.to_dict()
+
             # 检查用户名是否被其他用户占用
             if 'username' in data:
                 username = data['username']
@@ -386,7 +1568,11 @@ def create_app(config_name=None):
 
             db.session.commit()
 
-            app.logger.info(f'用户 {current_user_id} 更新了用户 {user_id} 的资料')
+            # 提交后再失效，避免其他请求在提交前按旧数据重建缓存
+            if user.to_dict() != author_before:
+                invalidate_author_cache()
+
+            app.logger.info('用户 %s 更新了用户 %s 的资料', current_user_id, user_id)
 
             return jsonify({
                 'success': True,
@@ -397,30 +1583,67 @@ def create_app(config_name=None):
 
     # API路由 - 文化资源
     @app.route('/api/resources', methods=['GET', 'POST'])
+    @response_cache.cached(tags=['resources'])
     def resources():
         if request.method == 'GET':
             # 获取文化资源列表
             page = request.args.get('page', 1, type=int)
             per_page = request.args.get('per_page', 10, type=int)
             category = request.args.get('category')
-            tag = request.args.get('tag')
+            # 支持 ?tag=a&tag=b 或 ?tag=a,b；tag_mode=any 表示任一标签匹配，默认需全部匹配
+            tag_names = normalize_tag_names(','.join(request.args.getlist('tag')))
+            match_all = request.args.get('tag_mode', 'all') != 'any'
+            # 稀疏字段：?view=summary 或 ?fields=id,title,snippet，只查询需要的列
+            try:
+                list_fields = parse_list_fields('resource', request.args)
+            except InvalidFields as e:
+                return jsonify({'error': str(e)}), 400
             
-            query = CulturalResource.query
+            if list_fields:
+                fieldset, field_names = list_fields
+                query = CulturalResource.query.options(*fieldset.query_options(field_names))
+                serialize = lambda res: fieldset.serialize(res, field_names)
+            else:
+                query = CulturalResource.query.options(db.joinedload(CulturalResource.author))
+                serialize = lambda res: res.to_dict()
             
             if category:
                 query = query.filter(CulturalResource.category == category)
             
-            if tag:
-                query = query.filter(CulturalResource.tags.like(f'%{tag}%'))
+            if tag_names:
+                query = query.filter(CulturalResource.id.in_(resource_ids_with_tags(tag_names, match_all)))
+            
+            # 游标分页模式：?cursor=<游标>&limit=N，默认不统计总数
+            keyset_args = parse_keyset_args(request.args)
+            if keyset_args:
+                cursor, limit, with_total = keyset_args
+                try:
+                    page_result = keyset_paginate(
+                        query, CulturalResource.created_date, CulturalResource.id,
+                        cursor=cursor, limit=limit
+                    )
+                except InvalidCursor:
+                    return jsonify({'error': '无效的游标'}), 400
+                
+                app.logger.info('用户请求文化资源列表，游标分页，每页数量: %s', limit, extra=SAMPLED)
+                
+                response = {
+                    'resources': [serialize(res) for res in page_result.items],
+                    'next_cursor': page_result.next_cursor,
+                    'has_more': page_result.has_more
+                }
+                if with_total:
+                    response['total'] = query.order_by(None).count()
+                return jsonify(response)
             
             resources = query.paginate(
                 page=page, per_page=per_page, error_out=False
             )
             
-            app.logger.info(f'用户请求文化资源列表，页码: {page}, 每页数量: {per_page}')
+            app.logger.info('用户请求文化资源列表，页码: %s, 每页数量: %s', page, per_page, extra=SAMPLED)
             
             return jsonify({
-                'resources': [res.to_dict() for res in resources.items],
+                'resources': [serialize(res) for res in resources.items],
                 'total': resources.total,
                 'pages': resources.pages,
                 'current_page': page
@@ -429,8 +1652,9 @@ def create_app(config_name=None):
         elif request.method == 'POST':
             # 需要登录才能创建资源
             try:
+                verify_jwt_in_request()
                 current_user_id = get_jwt_identity()
-            except:
+            except Exception:
                 return jsonify({'error': '需要登录'}), 401
             
             data = request.get_json()
@@ -443,14 +1667,17 @@ def create_app(config_name=None):
                 description=data['description'],
                 category=data.get('category', '未分类'),
                 image_url=data.get('image_url'),
-                author_id=current_user_id,
-                tags=','.join(data.get('tags', []))
+                author_id=current_user_id
             )
+            resource.set_tags(data.get('tags', []))
+            resource.refresh_content_hash()
             
             db.session.add(resource)
             db.session.commit()
+            invalidate_resource_cache()
+            index_document(resource)
             
-            app.logger.info(f'用户 {current_user_id} 创建了新的文化资源: {resource.title}')
+            app.logger.info('用户 %s 创建了新的文化资源: %s', current_user_id, resource.title)
             
             return jsonify({
                 'success': True,
@@ -461,21 +1688,21 @@ def create_app(config_name=None):
 
     @app.route('/api/resources/<int:resource_id>', methods=['GET', 'PUT', 'DELETE'])
     @jwt_required()
+    @response_cache.cached(tags=lambda resource_id: [f'resource:{resource_id}', 'resource-details'])
     def resource_detail(resource_id):
         resource = CulturalResource.query.get(resource_id)
         if not resource:
             return jsonify({'error': '资源不存在'}), 404
                 
         current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
         
         if request.method == 'GET':
-            app.logger.info(f'用户 {current_user_id} 访问了资源: {resource_id}')
+            app.logger.info('用户 %s 访问了资源: %s', current_user_id, resource_id, extra=SAMPLED)
             return jsonify({'resource': resource.to_dict()})
         
         # 检查权限：只能修改/删除自己创建的资源，或管理员可以修改任意资源
-        if resource.author_id != current_user_id and not current_user.is_admin:
-            app.logger.warning(f'用户 {current_user_id} 尝试访问无权限的资源: {resource_id}')
+        if resource.author_id != current_user_id and not get_current_user().is_admin:
+            app.logger.warning('用户 %s 尝试访问无权限的资源: %s', current_user_id, resource_id)
             return jsonify({'error': '无权访问此资源'}), 403
         
         elif request.method == 'PUT':
@@ -490,11 +1717,14 @@ def create_app(config_name=None):
             if 'image_url' in data:
                 resource.image_url = data['image_url']
             if 'tags' in data:
-                resource.tags = ','.join(data['tags'])
+                resource.set_tags(data['tags'])
+            resource.refresh_content_hash()
             
             db.session.commit()
+            invalidate_resource_cache(resource_id)
+            index_document(resource)
             
-            app.logger.info(f'用户 {current_user_id} 更新了资源: {resource_id}')
+            app.logger.info('用户 %s 更新了资源: %s', current_user_id, resource_id)
             
             return jsonify({
                 'success': True,
@@ -503,11 +1733,13 @@ def create_app(config_name=None):
             })
         
         elif request.method == 'DELETE':
-            app.logger.info(f'用户 {current_user_id} 删除了资源: {resource_id}')
+            app.logger.info('用户 %s 删除了资源: %s', current_user_id, resource_id)
             db.session.delete(resource)
             db.session.commit()
+            invalidate_resource_cache(resource_id)
+            remove_from_index('resource', resource_id)
             
-            app.logger.info(f'用户 {current_user_id} 删除了资源: {resource_id}')
+            app.logger.info('用户 %s 删除了资源: %s', current_user_id, resource_id)
             
             return jsonify({
                 'success': True,
@@ -515,30 +1747,184 @@ def create_app(config_name=None):
             })
 
 
+    # API路由 - 全文搜索
+    @app.route('/api/search', methods=['GET'])
+    def search():
+        keyword = (request.args.get('q') or '').strip()
+        if not keyword:
+            return jsonify({'error': '缺少搜索关键词'}), 400
+        
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', 10, type=int), 1), 50)
+        
+        # 帖子仅对登录用户可见，未登录时只检索文化资源
+        verify_jwt_in_request(optional=True)
+        allowed_types = ['resource', 'post'] if get_jwt_identity() is not None else ['resource']
+        doc_type = request.args.get('type')
+        if doc_type:
+            if doc_type not in allowed_types:
+                return jsonify({'error': '不支持的搜索类型'}), 400
+            allowed_types = [doc_type]
+        
+        total, hits = app.extensions['search_index'].search(
+            keyword, doc_types=allowed_types, limit=per_page, offset=(page - 1) * per_page
+        )
+        
+        # 每种类型一次查询取回整页对象，并保持相关度顺序
+        resource_ids = [doc_id for kind, doc_id, _ in hits if kind == 'resource']
+        post_ids = [doc_id for kind, doc_id, _ in hits if kind == 'post']
+        objects = {}
+        if resource_ids:
+            for resource in CulturalResource.query.options(db.joinedload(CulturalResource.author)) \
+                    .filter(CulturalResource.id.in_(resource_ids)).all():
+                objects[('resource', resource.id)] = resource.to_dict()
+        if post_ids:
+            found_posts = Post.query.options(db.joinedload(Post.author)).filter(Post.id.in_(post_ids)).all()
+            for post_data in posts_to_dicts(found_posts):
+                objects[('post', post_data['id'])] = post_data
+        
+        results = [
+            {'type': kind, 'score': round(score, 4), 'item': objects[(kind, doc_id)]}
+            for kind, doc_id, score in hits
+            if (kind, doc_id) in objects
+        ]
+        
+        app.logger.info('搜索: %s，类型: %s，命中 %s 条', keyword, allowed_types, total, extra=SAMPLED)
+        
+        return jsonify({
+            'success': True,
+            'query': keyword,
+            'results': results,
+            'total': total,
+            'pages': (total + per_page - 1) // per_page,
+            'current_page': page
+        })
+    
+    # API路由 - 知识图谱
+    # 节点以字符串 id 索引：root、category:<分类>、resource:<id>、tag:<标签>、author:<用户id>
+    @app.route('/api/graph', methods=['GET'])
+    def graph_overview():
+        # 概览：根节点及其直接相连的分类，客户端按需逐层展开
+        graph = app.extensions['knowledge_graph'].get()
+        return jsonify({'success': True, 'graph': graph.neighborhood('root', depth=1)})
+    
+    @app.route('/api/graph/neighbors', methods=['GET'])
+    def graph_neighbors():
+        node_id = request.args.get('node', 'root')
+        depth = min(max(request.args.get('depth', 1, type=int), 1), 3)
+        limit = min(max(request.args.get('limit', 200, type=int), 1), 1000)
+        
+        graph = app.extensions['knowledge_graph'].get()
+        if node_id not in graph:
+            return jsonify({'error': '节点不存在'}), 404
+        
+        return jsonify({'success': True, 'graph': graph.neighborhood(node_id, depth=depth, max_nodes=limit)})
+    
+    @app.route('/api/graph/category/<category>', methods=['GET'])
+    def graph_category(category):
+        graph = app.extensions['knowledge_graph'].get()
+        if f'category:{category}' not in graph:
+            return jsonify({'error': '分类不存在'}), 404
+        
+        return jsonify({'success': True, 'graph': graph.category_subgraph(category)})
+    
+    @app.route('/api/graph/path', methods=['GET'])
+    def graph_path():
+        source = request.args.get('source')
+        target = request.args.get('target')
+        if not source or not target:
+            return jsonify({'error': '缺少必要参数'}), 400
+        max_depth = min(max(request.args.get('max_depth', 6, type=int), 1), 10)
+        
+        graph = app.extensions['knowledge_graph'].get()
+        if source not in graph or target not in graph:
+            return jsonify({'error': '节点不存在'}), 404
+        
+        path = graph.shortest_path(source, target, max_depth=max_depth)
+        if path is None:
+            return jsonify({'success': True, 'path': [], 'graph': None})
+        
+        return jsonify({'success': True, 'path': path, 'graph': graph.subgraph(path)})
+    
     # API路由 - 社区功能
     @app.route('/api/posts', methods=['GET', 'POST'])
     @jwt_required()
     def posts():
         if request.method == 'GET':
             try:
+                # 稀疏字段：?view=summary 或 ?fields=id,title,snippet，只查询需要的列
+                try:
+                    list_fields = parse_list_fields('post', request.args)
+                except InvalidFields as e:
+                    return jsonify({'success': False, 'error': str(e)}), 400
+                
+                # 排序：latest（默认，按发布时间）、hot（按热度分）、top（按点赞数，可用 window=7d 限定发布时间范围）
+                sort = request.args.get('sort', 'latest')
+                if sort not in POST_SORT_COLUMNS:
+                    return jsonify({'success': False, 'error': 'sort 参数只能为 latest、hot 或 top'}), 400
+                sort_column = POST_SORT_COLUMNS[sort]
+                
+                if list_fields:
+                    fieldset, field_names = list_fields
+                    query = Post.query.options(*fieldset.query_options(field_names, extra=(sort_column.key,)))
+                    serialize = lambda items: [fieldset.serialize(post, field_names) for post in items]
+                else:
+                    query = Post.query.options(db.joinedload(Post.author))
+                    serialize = posts_to_dicts
+                
+                if sort == 'top':
+                    try:
+                        window = parse_window(request.args.get('window'))
+                    except InvalidWindow:
+                        return jsonify({'success': False, 'error': 'window 参数格式应为 24h、7d 或 all'}), 400
+                    if window:
+                        query = query.filter(Post.created_at >= datetime.utcnow() - window)
+                        # 限定时间窗口时按 created_at 索引范围扫描窗口内的帖子再排序：
+                        # 排序表达式 likes_count + 0 使数据库不沿点赞数索引逐行过滤窗口外的旧帖，
+                        # 扫描量以窗口内帖子数为上限，与全表大小无关
+                        sort_column = Post.likes_count + 0
+                
+                # 游标分页模式：?cursor=<游标>&limit=N，默认不统计总数
+                keyset_args = parse_keyset_args(request.args)
+                if keyset_args:
+                    cursor, limit, with_total = keyset_args
+                    try:
+                        page_result = keyset_paginate(
+                            query, sort_column, Post.id, cursor=cursor, limit=limit, key=POST_SORT_COLUMNS[sort].key
+                        )
+                    except InvalidCursor:
+                        return jsonify({'success': False, 'error': '无效的游标'}), 400
+                    
+                    app.logger.info('用户请求帖子列表，游标分页，排序: %s，每页数量: %s', sort, limit, extra=SAMPLED)
+                    
+                    response = {
+                        'success': True,
+                        'posts': serialize(page_result.items),
+                        'next_cursor': page_result.next_cursor,
+                        'has_more': page_result.has_more
+                    }
+                    if with_total:
+                        response['total'] = query.order_by(None).count()
+                    return jsonify(response)
+                
                 page = request.args.get('page', 1, type=int)
                 per_page = request.args.get('per_page', 10, type=int)
                 
-                posts_pagination = Post.query.order_by(Post.created_at.desc()).paginate(
+                posts_pagination = query.order_by(sort_column.desc(), Post.id.desc()).paginate(
                     page=page, per_page=per_page, error_out=False
                 )
                 
-                app.logger.info(f'用户请求帖子列表，页码: {page}, 每页数量: {per_page}')
+                app.logger.info('用户请求帖子列表，排序: %s，页码: %s, 每页数量: %s', sort, page, per_page, extra=SAMPLED)
                 
                 return jsonify({
                     'success': True,
-                    'posts': [post.to_dict() for post in posts_pagination.items],
+                    'posts': serialize(posts_pagination.items),
                     'total': posts_pagination.total,
                     'pages': posts_pagination.pages,
                     'current_page': page
                 })
             except Exception as e:
-                app.logger.error(f'获取帖子列表时发生错误: {str(e)}')
+                app.logger.error('获取帖子列表时发生错误: %s', e)
                 return jsonify({
                     'success': False,
                     'error': '获取帖子列表失败',
@@ -575,11 +1961,13 @@ def create_app(config_name=None):
                     author_id=current_user_id,
                     category=category
                 )
+                post.refresh_hot_score()
                 
                 db.session.add(post)
                 db.session.commit()
+                index_document(post)
                 
-                app.logger.info(f'用户 {current_user_id} 发布了新帖子: {post.title}')
+                app.logger.info('用户 %s 发布了新帖子: %s', current_user_id, post.title)
                 
                 return jsonify({
                     'success': True,
@@ -588,7 +1976,7 @@ def create_app(config_name=None):
                 }), 201
             except Exception as e:
                 db.session.rollback()  # 确保在出错时回滚事务
-                app.logger.error(f'创建帖子时发生错误: {str(e)}')
+                app.logger.error('创建帖子时发生错误: %s', e)
                 return jsonify({'error': '创建帖子失败', 'details': str(e)}), 500
 
 
@@ -597,35 +1985,26 @@ def create_app(config_name=None):
     def post_detail(post_id):
         try:
             # 首先尝试查询帖子
-            post = db.session.query(Post).filter(Post.id == post_id).first()
+            post = db.session.query(Post).options(db.joinedload(Post.author)).filter(Post.id == post_id).first()
             if not post:
-                app.logger.warning(f'请求的帖子不存在: {post_id}')
+                app.logger.warning('请求的帖子不存在: %s', post_id)
                 return jsonify({'error': '帖子不存在', 'code': 404}), 404
             
-            current_user_id = get_jwt_identity()
-            current_user_obj = User.query.get(current_user_id)
-            if not current_user_obj:
-                app.logger.warning(f'认证用户不存在: {current_user_id}')
-                return jsonify({'error': '用户不存在', 'code': 404}), 404
+            current_user = get_current_user()
+            current_user_id = current_user.id
         
             if request.method == 'GET':
-                app.logger.info(f'用户 {current_user_id} 访问了帖子: {post_id}')
+                app.logger.info('用户 %s 访问了帖子: %s', current_user_id, post_id, extra=SAMPLED)
                 
                 # 检查帖子是否有有效的author_id
                 post_author_id = getattr(post, 'author_id', None)
                 if post_author_id is None:
-                    app.logger.error(f'帖子 {post_id} 缺少author_id字段')
+                    app.logger.error('帖子 %s 缺少author_id字段', post_id)
                     return jsonify({'error': '帖子信息不完整', 'code': 500}), 500
                 
-                # 增加浏览量（排除作者自己和管理员）
-                if post_author_id != current_user_id and not current_user_obj.is_admin:
-                    try:
-                        post.views = post.views + 1
-                        db.session.commit()
-                        app.logger.info(f'帖子 {post_id} 浏览量增加到: {post.views}')
-                    except Exception as e:
-                        db.session.rollback()
-                        app.logger.error(f'更新帖子浏览量时出错: {str(e)}')
+                # 增加浏览量（排除作者自己和管理员），增量先缓冲在内存中，由后台线程批量写回
+                if post_author_id != current_user_id and not current_user.is_admin:
+                    app.extensions['view_counter'].increment(post_id)
 
                 # 对于GET请求，返回success和post数据，包含author_id等关键字段
                 post_data = post.to_dict()
@@ -636,17 +2015,11 @@ def create_app(config_name=None):
             # 这里只针对PUT和DELETE请求进行权限检查
             post_author_id = getattr(post, 'author_id', None)
             if post_author_id is None:
-                app.logger.error(f'帖子 {post_id} 缺少author_id字段，无法验证权限')
+                app.logger.error('帖子 %s 缺少author_id字段，无法验证权限', post_id)
                 return jsonify({'error': '帖子信息不完整', 'code': 500}), 500
-                
-            # 获取当前用户对象以检查权限
-            current_user_obj = User.query.get(current_user_id)
-            if not current_user_obj:
-                app.logger.warning(f'认证用户不存在: {current_user_id}')
-                return jsonify({'error': '用户不存在', 'code': 404}), 404
-
-            if post_author_id != current_user_id and not current_user_obj.is_admin:
-                app.logger.warning(f'用户 {current_user_id} 尝试访问无权限的帖子: {post_id}')
+
+            if post_author_id != current_user_id and not current_user.is_admin:
+                app.logger.warning('用户 %s 尝试访问无权限的帖子: %s', current_user_id, post_id)
                 return jsonify({'error': '无权访问此资源', 'code': 403}), 403
             
             if request.method == 'PUT':
@@ -672,7 +2045,8 @@ def create_app(config_name=None):
                         post.category = data['category']
                         
                     db.session.commit()
-                    app.logger.info(f'用户 {current_user_id} 更新了帖子: {post_id}')
+                    index_document(post)
+                    app.logger.info('用户 %s 更新了帖子: %s', current_user_id, post_id)
                         
                     post_data = post.to_dict()
                     post_data['author_id'] = post.author_id  # 确保author_id字段存在
@@ -683,18 +2057,20 @@ def create_app(config_name=None):
                     })
                 except Exception as e:
                     db.session.rollback()
-                    app.logger.error(f'更新帖子时发生错误: {str(e)}')
+                    app.logger.error('更新帖子时发生错误: %s', e)
                     return jsonify({'error': '更新帖子失败', 'message': str(e), 'code': 500}), 500
                 
             elif request.method == 'DELETE':
                 try:
-                    # 先删除相关的评论
+                    # 先删除相关的通知与评论（帖子行随后一并删除，评论数无需单独维护）
+                    db.session.execute(db.delete(Notification).where(Notification.post_id == post_id))
                     db.session.execute(db.delete(Comment).where(Comment.post_id == post_id))
                     
                     # 然后删除帖子
                     db.session.delete(post)
                     db.session.commit()
-                    app.logger.info(f'用户 {current_user_id} 删除了帖子: {post_id}')
+                    remove_from_index('post', post_id)
+                    app.logger.info('用户 %s 删除了帖子: %s', current_user_id, post_id)
                         
                     return jsonify({
                         'success': True,
@@ -702,60 +2078,102 @@ def create_app(config_name=None):
                     })
                 except Exception as e:
                     db.session.rollback()
-                    app.logger.error(f'删除帖子时发生错误: {str(e)}')
+                    app.logger.error('删除帖子时发生错误: %s', e)
                     return jsonify({'error': '删除帖子失败', 'message': str(e), 'code': 500}), 500
             
             # 如果请求方法不是GET、PUT或DELETE
             return jsonify({'error': '不支持的请求方法', 'code': 405}), 405
             
         except Exception as e:
-            app.logger.error(f'处理帖子详情请求时发生错误: {str(e)}')
+            app.logger.error('处理帖子详情请求时发生错误: %s', e)
             return jsonify({'error': '服务器内部错误', 'code': 500}), 500
 
 
-    # 帖子点赞功能
+    # 帖子点赞功能：切换点赞状态，由语句影响行数决定计数增减，避免并发点击重复计数
     @app.route('/api/posts/<int:post_id>/like', methods=['POST'])
     @jwt_required()
     def like_post(post_id):
         try:
             current_user_id = get_jwt_identity()
-            current_user = User.query.get(current_user_id)
+            likes_table = Like.__table__
             
-            if not current_user:
-                return jsonify({'error': '用户不存在'}), 404
-            
-            post = Post.query.get(post_id)
-            if not post:
-                return jsonify({'error': '帖子不存在'}), 404
-            
-            # 检查用户是否已经点赞
-            existing_like = Like.query.filter_by(user_id=current_user_id, post_id=post_id).first()
+            # 先尝试取消点赞：删除命中说明之前已点赞
+            deleted = db.session.execute(
+                likes_table.delete().where(
+                    likes_table.c.user_id == current_user_id,
+                    likes_table.c.post_id == post_id
+                )
+            ).rowcount
             
-            if existing_like:
-                # 用户已点赞，取消点赞
-                db.session.delete(existing_like)
-                post.likes_count = max(0, post.likes_count - 1)  # 确保点赞数不会变成负数
+            if deleted:
                 action = 'unliked'
+                delta = -1
             else:
-                # 用户未点赞，添加点赞
-                new_like = Like(user_id=current_user_id, post_id=post_id)
-                db.session.add(new_like)
-                post.likes_count += 1
+                # INSERT ... SELECT 只在帖子存在时插入，唯一约束冲突（并发重复点赞）时忽略
+                inserted = execute_insert_ignore(
+                    insert_ignore(likes_table).from_select(
+                        ['user_id', 'post_id', 'created_at'],
+                        db.select(db.literal(current_user_id), Post.id, db.literal(datetime.utcnow()))
+                        .where(Post.id == post_id)
+                    )
+                )
                 action = 'liked'
+                delta = 1 if inserted else 0
+                if not inserted and not db.session.query(Post.id).filter(Post.id == post_id).first():
+                    db.session.rollback()
+                    return jsonify({'error': '帖子不存在'}), 404
             
+            likes_count = update_likes_count(post_id, delta)
+            if delta:
+                refresh_hot_scores([post_id])
+            # 新的点赞通知帖子作者，与点赞记录一起提交
+            new_notifications = []
+            if delta > 0:
+                post_author_id = db.session.query(Post.author_id).filter(Post.id == post_id).scalar()
+                # 同一用户对同一帖子只通知一次，反复取消再点赞不会刷屏作者的收件箱和实时推送
+                already_notified = db.session.query(Notification.id).filter(
+                    Notification.actor_id == current_user_id,
+                    Notification.post_id == post_id,
+                    Notification.type == 'like'
+                ).first()
+                if not already_notified:
+                    add_notification(post_author_id, current_user_id, 'like', post_id, pending=new_notifications)
             db.session.commit()
+            publish_notifications(new_notifications)
             
-            app.logger.info(f'用户 {current_user_id} {action} 帖子 {post_id}')
+            app.logger.info('用户 %s %s 帖子 %s', current_user_id, action, post_id)
             
             return jsonify({
                 'success': True,
                 'message': f'帖子{("取消点赞" if action == "unliked" else "点赞")}成功',
-                'likes': post.likes_count  # 确保返回的是实际的点赞数字段
+                'likes': likes_count  # 确保返回的是实际的点赞数字段
             })
         except Exception as e:
             db.session.rollback()
-            app.logger.error(f'处理点赞时发生错误: {str(e)}')
+            app.logger.error('处理点赞时发生错误: %s', e)
             return jsonify({'error': '处理点赞失败', 'message': str(e)}), 500
+    
+    # 批量查询当前用户对一页帖子的点赞状态：?post_ids=1,2,3，单次查询
+    @app.route('/api/posts/liked', methods=['GET'])
+    @jwt_required()
+    def liked_posts():
+        try:
+            post_ids = [int(value) for value in request.args.get('post_ids', '').split(',') if value.strip()][:100]
+        except ValueError:
+            return jsonify({'error': '帖子ID格式不正确'}), 400
+        
+        liked_ids = set()
+        if post_ids:
+            liked_ids = {
+                row[0] for row in db.session.query(Like.post_id)
+                .filter(Like.user_id == get_jwt_identity(), Like.post_id.in_(post_ids))
+                .all()
+            }
+        
+        return jsonify({
+            'success': True,
+            'liked': {str(post_id): post_id in liked_ids for post_id in post_ids}
+        })
 
     # API路由 - 评论功能
     @app.route('/api/comments', methods=['GET', 'POST'])
@@ -767,14 +2185,26 @@ def create_app(config_name=None):
             if request.method == 'GET':
                 post_id = request.args.get('post_id', type=int)
                 
-                query = Comment.query
+                query = Comment.query.options(db.joinedload(Comment.author))
                 
                 if post_id:
                     query = query.filter(Comment.post_id == post_id)
                 
-                comments = query.all()
+                # 始终按时间正序游标分页（?cursor=<游标>&limit=N，未指定时每页 DEFAULT_LIMIT 条，最多 MAX_LIMIT 条），
+                # 评论很多的帖子也不会一次返回全部评论
+                cursor, limit, with_total = parse_keyset_args(request.args) or (
+                    None, DEFAULT_LIMIT, request.args.get('with_total', '').lower() in ('1', 'true', 'yes')
+                )
+                try:
+                    page_result = keyset_paginate(
+                        query, Comment.created_at, Comment.id,
+                        cursor=cursor, limit=limit, descending=False
+                    )
+                except InvalidCursor:
+                    return jsonify({'error': '无效的游标'}), 400
+                comments = page_result.items
                 
-                app.logger.info(f'用户 {current_user_id} 请求评论列表，帖子ID: {post_id}')
+                app.logger.info('用户 %s 请求评论列表，帖子ID: %s', current_user_id, post_id, extra=SAMPLED)
                 
                 # 确保评论数据包含必要的author_id字段
                 comments_data = []
@@ -783,9 +2213,14 @@ def create_app(config_name=None):
                     comment_dict['author_id'] = comment.author_id  # 确保author_id字段存在
                     comments_data.append(comment_dict)
                 
-                return jsonify({
-                    'comments': comments_data
-                })
+                response = {
+                    'comments': comments_data,
+                    'next_cursor': page_result.next_cursor,
+                    'has_more': page_result.has_more
+                }
+                if with_total:
+                    response['total'] = query.order_by(None).count()
+                return jsonify(response)
             
             elif request.method == 'POST':
                 data = request.get_json()
@@ -793,16 +2228,69 @@ def create_app(config_name=None):
                 if not data or not data.get('content') or not data.get('post_id'):
                     return jsonify({'error': '缺少必要参数'}), 400
                 
+                # post_id / parent_id 允许以数字或数字字符串提交，统一转换为整数后再比较和查询
+                try:
+                    post_id = parse_id(data['post_id'])
+                    parent_id = parse_id(data['parent_id']) if data.get('parent_id') else None
+                except ValueError:
+                    return jsonify({'error': '帖子ID或评论ID格式不正确'}), 400
+                
+                # 回复：被回复的评论必须属于同一帖子，且层数不超过 MAX_COMMENT_DEPTH
+                parent = None
+                if parent_id:
+                    parent = db.session.query(Comment.id, Comment.post_id, Comment.path, Comment.depth, Comment.author_id) \
+                        .filter(Comment.id == parent_id).first()
+                    if not parent or parent.post_id != post_id:
+                        return jsonify({'error': '回复的评论不存在'}), 404
+                    if (parent.depth or 0) + 1 > MAX_COMMENT_DEPTH:
+                        return jsonify({'error': f'回复层数不能超过{MAX_COMMENT_DEPTH}层'}), 400
+                
+                # 评论数与评论在同一事务内更新；更新行数为0说明帖子不存在
+                result = db.session.execute(
+                    db.update(Post)
+                    .where(Post.id == post_id)
+                    .values(comments_count=db.func.coalesce(Post.comments_count, 0) + 1)
+                    .execution_options(synchronize_session=False)
+                )
+                if result.rowcount == 0:
+                    db.session.rollback()
+                    return jsonify({'error': '帖子不存在'}), 404
+                
+                refresh_hot_scores([post_id])
+                
                 comment = Comment(
                     content=data['content'],
                     author_id=current_user_id,
-                    post_id=data['post_id']
+                    post_id=post_id,
+                    parent_id=parent.id if parent else None,
+                    depth=(parent.depth or 0) + 1 if parent else 0,
+                    replies_count=0
                 )
+                if parent:
+                    db.session.execute(
+                        db.update(Comment)
+                        .where(Comment.id == parent.id)
+                        .values(replies_count=db.func.coalesce(Comment.replies_count, 0) + 1)
+                        .execution_options(synchronize_session=False)
+                    )
                 
+                # 路径包含自身 id，插入后才能确定
                 db.session.add(comment)
+                db.session.flush()
+                parent_path = (parent.path or comment_path_segment(parent.id)) if parent else ''
+                comment.path = parent_path + comment_path_segment(comment.id)
+                
+                # 通知帖子作者有新评论；回复另外通知被回复评论的作者（与帖子作者相同时只通知一次）
+                new_notifications = []
+                post_author_id = db.session.query(Post.author_id).filter(Post.id == comment.post_id).scalar()
+                if parent:
+                    add_notification(parent.author_id, current_user_id, 'reply', comment.post_id, comment.id, new_notifications)
+                if not parent or parent.author_id != post_author_id:
+                    add_notification(post_author_id, current_user_id, 'comment', comment.post_id, comment.id, new_notifications)
                 db.session.commit()
+                publish_notifications(new_notifications)
                 
-                app.logger.info(f'用户 {current_user_id} 对帖子 {data["post_id"]} 发表了评论')
+                app.logger.info('用户 %s 对帖子 %s 发表了评论', current_user_id, post_id)
                 
                 comment_dict = comment.to_dict()
                 comment_dict['author_id'] = comment.author_id  # 确保author_id字段存在
@@ -813,9 +2301,49 @@ def create_app(config_name=None):
                     'comment': comment_dict
                 }), 201
         except Exception as e:
-            app.logger.error(f'评论操作时发生错误: {str(e)}')
+            db.session.rollback()
+            app.logger.error('评论操作时发生错误: %s', e)
             return jsonify({'error': '服务器内部错误', 'message': str(e)}), 500
     
+    # 楼层树：按时间正序分页加载帖子的顶层评论，并逐层展开回复（每层一次查询）
+    @app.route('/api/posts/<int:post_id>/comments', methods=['GET'])
+    @jwt_required()
+    def post_comment_thread(post_id):
+        if not db.session.query(Post.id).filter(Post.id == post_id).first():
+            return jsonify({'error': '帖子不存在'}), 404
+        cursor, limit, depth, replies = parse_thread_args(request.args)
+        try:
+            comments, page_result = load_comment_thread(post_id, None, cursor, limit, depth, replies)
+        except InvalidCursor:
+            return jsonify({'error': '无效的游标'}), 400
+        
+        app.logger.info('用户 %s 请求帖子 %s 的评论楼层', get_jwt_identity(), post_id, extra=SAMPLED)
+        
+        return jsonify({
+            'comments': comments,
+            'next_cursor': page_result.next_cursor,
+            'has_more': page_result.has_more
+        })
+    
+    # 加载更多回复：?cursor= 取自上一次返回的 replies_cursor，同样可逐层展开
+    @app.route('/api/comments/<int:comment_id>/replies', methods=['GET'])
+    @jwt_required()
+    def comment_replies(comment_id):
+        parent = db.session.query(Comment.id, Comment.post_id).filter(Comment.id == comment_id).first()
+        if not parent:
+            return jsonify({'error': '评论不存在'}), 404
+        cursor, limit, depth, replies = parse_thread_args(request.args)
+        try:
+            comments, page_result = load_comment_thread(parent.post_id, comment_id, cursor, limit, depth, replies)
+        except InvalidCursor:
+            return jsonify({'error': '无效的游标'}), 400
+        
+        return jsonify({
+            'replies': comments,
+            'next_cursor': page_result.next_cursor,
+            'has_more': page_result.has_more
+        })
+    
     # 删除评论的API
     @app.route('/api/comments/<int:comment_id>', methods=['DELETE'])
     @jwt_required()
@@ -825,81 +2353,369 @@ def create_app(config_name=None):
             
             comment = Comment.query.get(comment_id)
             if not comment:
-                app.logger.warning(f'请求的评论不存在: {comment_id}')
+                app.logger.warning('请求的评论不存在: %s', comment_id)
                 return jsonify({'error': '评论不存在', 'code': 404}), 404
             
             # 检查权限：只能删除自己创建的评论，或管理员可以删除任意评论
             if comment.author_id != current_user_id:
-                current_user = User.query.get(current_user_id)
-                if not current_user or not current_user.is_admin:
-                    app.logger.warning(f'用户 {current_user_id} 尝试删除不属于他的评论: {comment_id}')
+                if not get_current_user().is_admin:
+                    app.logger.warning('用户 %s 尝试删除不属于他的评论: %s', current_user_id, comment_id)
                     return jsonify({'error': '无权删除此评论', 'code': 403}), 403
             
-            db.session.delete(comment)
+            # 评论连同其所有回复一起删除：按物化路径前缀一次选中整棵子树
+            subtree = db.and_(
+                Comment.post_id == comment.post_id,
+                db.or_(Comment.id == comment.id, Comment.path.startswith(comment.path or comment_path_segment(comment.id)))
+            )
+            removed = db.session.query(db.func.count(Comment.id)).filter(subtree).scalar()
+            post_id, parent_id = comment.post_id, comment.parent_id
+            
+            db.session.execute(
+                db.update(Post)
+                .where(Post.id == post_id)
+                .values(comments_count=db.case(
+                    (Post.comments_count > removed, Post.comments_count - removed), else_=0
+                ))
+                .execution_options(synchronize_session=False)
+            )
+            if parent_id:
+                db.session.execute(
+                    db.update(Comment)
+                    .where(Comment.id == parent_id, Comment.replies_count > 0)
+                    .values(replies_count=Comment.replies_count - 1)
+                    .execution_options(synchronize_session=False)
+                )
+            db.session.execute(
+                db.delete(Notification)
+                .where(Notification.comment_id.in_(db.select(Comment.id).where(subtree)))
+                .execution_options(synchronize_session=False)
+            )
+            db.session.execute(db.delete(Comment).where(subtree).execution_options(synchronize_session=False))
+            refresh_hot_scores([post_id])
             db.session.commit()
             
-            app.logger.info(f'用户 {current_user_id} 删除了评论: {comment_id}')
+            app.logger.info('用户 %s 删除了评论 %s 及其 %s 条回复', current_user_id, comment_id, removed - 1)
             
             return jsonify({
                 'success': True,
-                'message': '评论删除成功'
+                'message': '评论删除成功',
+                'removed': removed
             })
         except Exception as e:
-            app.logger.error(f'删除评论时发生错误: {str(e)}')
+            db.session.rollback()
+            app.logger.error('删除评论时发生错误: %s', e)
             return jsonify({'error': '服务器内部错误', 'message': str(e)}), 500
 
 
+    # 通知收件箱：默认按 id 倒序分页（cursor 为上一页最后一条的 id）；
+    # ?after=<id> 按 id 正序返回之后的新通知，用于断线后补齐；?unread=1 只返回未读
+    @app.route('/api/notifications', methods=['GET'])
+    @jwt_required()
+    def list_notifications():
+        current_user_id = get_jwt_identity()
+        limit = max(1, min(request.args.get('limit', DEFAULT_LIMIT, type=int) or DEFAULT_LIMIT, MAX_LIMIT))
+        query = notification_query(current_user_id)
+        if request.args.get('unread', '').lower() in ('1', 'true', 'yes'):
+            query = query.filter(Notification.read_at.is_(None))
+        
+        after = request.args.get('after', type=int)
+        if after is not None:
+            query = query.filter(Notification.id > after).order_by(Notification.id.asc())
+        else:
+            cursor = request.args.get('cursor', type=int)
+            if cursor:
+                query = query.filter(Notification.id < cursor)
+            query = query.order_by(Notification.id.desc())
+        
+        items = query.limit(limit + 1).all()
+        has_more = len(items) > limit
+        items = items[:limit]
+        unread_count = db.session.query(db.func.count(Notification.id)) \
+            .filter(Notification.user_id == current_user_id, Notification.read_at.is_(None)).scalar()
+        
+        return jsonify({
+            'notifications': [notification.to_dict() for notification in items],
+            'next_cursor': items[-1].id if has_more else None,
+            'has_more': has_more,
+            'unread_count': unread_count
+        })
+    
+    # 标记已读：{"ids": [1, 2]} 标记指定通知，{"up_to": id} 标记该 id 及之前的全部通知
+    @app.route('/api/notifications/read', methods=['POST'])
+    @jwt_required()
+    def mark_notifications_read():
+        current_user_id = get_jwt_identity()
+        data = request.get_json(silent=True) or {}
+        condition = None
+        try:
+            if data.get('ids'):
+                condition = Notification.id.in_([int(value) for value in data['ids']][:MAX_LIMIT])
+            elif data.get('up_to'):
+                condition = Notification.id <= int(data['up_to'])
+        except (TypeError, ValueError):
+            return jsonify({'error': '通知ID格式不正确'}), 400
+        if condition is None:
+            return jsonify({'error': '缺少必要参数'}), 400
+        
+        try:
+            updated = db.session.execute(
+                db.update(Notification)
+                .where(Notification.user_id == current_user_id, Notification.read_at.is_(None), condition)
+                .values(read_at=datetime.utcnow())
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error('标记通知已读时发生错误: %s', e)
+            return jsonify({'error': '标记已读失败', 'message': str(e)}), 500
+        
+        unread_count = db.session.query(db.func.count(Notification.id)) \
+            .filter(Notification.user_id == current_user_id, Notification.read_at.is_(None)).scalar()
+        return jsonify({'success': True, 'updated': updated, 'unread_count': unread_count})
+    
+    # 实时通知（Server-Sent Events）。EventSource 无法设置请求头，允许通过 ?jwt=<令牌> 认证。
+    # 断线重连时浏览器携带 Last-Event-ID，先补发之后的通知再推送新通知；
+    # 连接最长保持 NOTIFICATION_STREAM_MAX_SECONDS 秒后由服务端关闭，浏览器自动重连，避免长期占用 worker 线程
+    @app.route('/api/notifications/stream', methods=['GET'])
+    @jwt_required(locations=['headers', 'query_string'])
+    def notification_stream():
+        current_user_id = get_jwt_identity()
+        last_id = request.headers.get('Last-Event-ID', type=int) or request.args.get('last_event_id', 0, type=int)
+        heartbeat = app.config['NOTIFICATION_STREAM_HEARTBEAT']
+        max_seconds = app.config['NOTIFICATION_STREAM_MAX_SECONDS']
+        
+        # 先订阅再查询补发，两步之间发布的通知不会丢失（按 id 去重）
+        subscription = notification_broker.subscribe(current_user_id)
+        try:
+            backlog = []
+            if last_id:
+                backlog = [
+                    notification.to_dict() for notification in notification_query(current_user_id)
+                    .filter(Notification.id > last_id).order_by(Notification.id).limit(MAX_LIMIT + 1)
+                ]
+        except Exception:
+            notification_broker.unsubscribe(subscription)
+            raise
+        finally:
+            # 等待推送期间不占用数据库连接
+            db.session.remove()
+        
+        def sse(event_type, data, event_id=None):
+            lines = [f'id: {event_id}'] if event_id is not None else []
+            lines.append(f'event: {event_type}')
+            lines.append(f'data: {app.json.dumps(data)}')
+            return '\n'.join(lines) + '\n\n'
+        
+        def generate():
+            sent_id = last_id
+            deadline = time.monotonic() + max_seconds
+            try:
+                yield 'retry: 3000\n\n'
+                if len(backlog) > MAX_LIMIT:
+                    # 积压过多时通知客户端重新加载收件箱
+                    yield sse('resync', {})
+                    sent_id = backlog[-1]['id']
+                else:
+                    for event in backlog:
+                        yield sse('notification', event, event['id'])
+                        sent_id = event['id']
+                while time.monotonic() < deadline and not subscription.overflowed:
+                    event = subscription.get(timeout=heartbeat)
+                    if event is None:
+                        yield ': keepalive\n\n'
+                    elif event['id'] > sent_id:
+                        sent_id = event['id']
+                        yield sse('notification', event, event['id'])
+            finally:
+                notification_broker.unsubscribe(subscription)
+        
+        return Response(generate(), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+    
+    # 上传图片：multipart 的 file 字段或原始请求体，边读取边写入磁盘；相同内容的图片只保存一份
+    @app.route('/api/media/images', methods=['POST'])
+    @jwt_required()
+    def upload_image():
+        current_user_id = get_jwt_identity()
+        # 按声明的请求体大小提前拒绝，不读取请求体；multipart 的边界和字段头另留少量余量
+        if request.content_length is not None and request.content_length > media_store.max_bytes + MEDIA_MULTIPART_OVERHEAD:
+            return jsonify({'error': f'文件大小超过 {app.config["MEDIA_MAX_UPLOAD_MB"]}MB 限制'}), 413
+        
+        # multipart 上传增量解析 file 字段，不经过 request.files（会先把整个请求体暂存到磁盘）
+        if request.mimetype == 'multipart/form-data':
+            boundary = request.mimetype_params.get('boundary')
+            if not boundary:
+                return jsonify({'error': '缺少 multipart 边界'}), 400
+            stream = MultipartFileStream(request.stream, boundary)
+        else:
+            stream = request.stream
+        
+        try:
+            name, created = media_store.save_stream(stream)
+        except MediaTooLarge as e:
+            return jsonify({'error': str(e)}), 413
+        except MediaError as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            app.logger.error('保存上传图片时发生错误: %s', e)
+            return jsonify({'error': '上传图片失败', 'message': str(e)}), 500
+        
+        app.logger.info('用户 %s 上传了图片: %s', current_user_id, name)
+        
+        return jsonify({
+            'success': True,
+            'name': name,
+            'url': f'/api/media/{name}',
+            'thumbnails': {str(size): f'/api/media/thumbs/{size}/{name}' for size in media_store.thumbnail_sizes}
+        }), 201 if created else 200
+    
+    # 图片文件名即内容摘要，内容永不变化，使用长期缓存；文件通过 wsgi.file_wrapper 零拷贝发送
+    def send_media(path, final=True):
+        response = send_file(path, max_age=app.config['MEDIA_CACHE_MAX_AGE'] if final else 60, conditional=True)
+        if final:
+            response.cache_control.immutable = True
+        return response
+    
+    @app.route('/api/media/<name>', methods=['GET'])
+    def get_image(name):
+        if not MEDIA_NAME_RE.match(name):
+            abort(404)
+        path, final = media_store.resolve(name)
+        if path is None:
+            abort(404)
+        return send_media(path, final)
+    
+    @app.route('/api/media/thumbs/<int:size>/<name>', methods=['GET'])
+    def get_thumbnail(size, name):
+        if size not in media_store.thumbnail_sizes or not MEDIA_NAME_RE.match(name):
+            abort(404)
+        path, final = media_store.resolve(name, size)
+        if path is None:
+            abort(404)
+        return send_media(path, final)
+    
+    # 默认头像：按种子确定性生成的 SVG，不依赖外部图片服务
+    @app.route('/api/media/avatars/<seed>.svg', methods=['GET'])
+    def get_avatar(seed):
+        if len(seed) > 64:
+            abort(404)
+        response = Response(avatar_svg(seed), mimetype='image/svg+xml')
+        response.add_etag()
+        response.cache_control.public = True
+        response.cache_control.max_age = app.config['MEDIA_CACHE_MAX_AGE']
+        response.cache_control.immutable = True
+        return response.make_conditional(request)
+
     # 管理员API路由
     @app.route('/api/admin/users', methods=['GET'])
-    @jwt_required()
+    @admin_required
     def get_users():
         current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
-        
-        if not current_user or not current_user.is_admin:
-            app.logger.warning(f'用户 {current_user_id} 尝试访问管理员功能')
-            return jsonify({'error': '需要管理员权限'}), 403
         
         try:
-            users = User.query.all()
-            user_list = []
-            for user in users:
-                user_data = user.to_dict()
-                # 仅在管理员视图中添加敏感信息
-                user_data['registration_date'] = user.created_at.isoformat() if user.created_at else None
-                user_list.append(user_data)
+            try:
+                query = filter_users_query(User.query, request.args)
+            except ValueError:
+                return jsonify({'success': False, 'error': '筛选参数无效'}), 400
             
-            app.logger.info(f'管理员 {current_user_id} 请求了用户列表，返回 {len(user_list)} 个用户')
+            # 游标分页模式：?cursor=<游标>&limit=N，默认不统计总数
+            keyset_args = parse_keyset_args(request.args)
+            if keyset_args:
+                cursor, limit, with_total = keyset_args
+                try:
+                    page_result = keyset_paginate(query, User.created_at, User.id, cursor=cursor, limit=limit)
+                except InvalidCursor:
+                    return jsonify({'success': False, 'error': '无效的游标'}), 400
+                
+                app.logger.info('管理员 %s 请求了用户列表，游标分页，返回 %s 个用户', current_user_id, len(page_result.items))
+                
+                response = {
+                    'success': True,
+                    'users': [user_admin_dict(user) for user in page_result.items],
+                    'next_cursor': page_result.next_cursor,
+                    'has_more': page_result.has_more
+                }
+                if with_total:
+                    response['total'] = query.count()
+                return jsonify(response)
+            
+            page = request.args.get('page', 1, type=int)
+            per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)
+            
+            users_pagination = query.order_by(User.created_at.desc(), User.id.desc()).paginate(
+                page=page, per_page=per_page, error_out=False
+            )
+            
+            app.logger.info('管理员 %s 请求了用户列表，页码: %s，返回 %s 个用户', current_user_id, page, len(users_pagination.items))
             
             return jsonify({
                 'success': True,
-                'users': user_list,
-                'total': len(user_list)
+                'users': [user_admin_dict(user) for user in users_pagination.items],
+                'total': users_pagination.total,
+                'pages': users_pagination.pages,
+                'current_page': page
             })
         except Exception as e:
-            app.logger.error(f'获取用户列表时发生错误: {str(e)}')
+            app.logger.error('获取用户列表时发生错误: %s', e)
             return jsonify({'error': '获取用户列表失败', 'message': str(e)}), 500
 
+    # 内部监控：本 worker 进程的连接池状态与各端点的SQL语句数、数据库耗时
+    @app.route('/api/admin/internal/db-metrics', methods=['GET'])
+    @admin_required
+    def db_metrics():
+        return jsonify({
+            'success': True,
+            'pid': os.getpid(),
+            'pool': pool_metrics.snapshot(),
+            'endpoints': query_stats.snapshot()
+        })
+
+    # 管理员流式导出用户：?format=ndjson|csv，支持与用户列表相同的筛选参数
+    @app.route('/api/admin/users/export', methods=['GET'])
+    @admin_required
+    def export_users():
+        fmt = request.args.get('format', 'ndjson')
+        if fmt not in ('ndjson', 'csv'):
+            return jsonify({'error': '不支持的文件格式'}), 400
+        try:
+            filter_users_query(User.query, request.args)
+        except ValueError:
+            return jsonify({'error': '筛选参数无效'}), 400
+        
+        rows = iter_user_export_rows(request.args.copy())
+        if fmt == 'csv':
+            body = resource_io.export_csv(rows, fields=USER_EXPORT_FIELDS)
+            mimetype = 'text/csv'
+        else:
+            body = resource_io.export_jsonl(rows)
+            mimetype = 'application/x-ndjson'
+        
+        app.logger.info('管理员 %s 导出了用户列表，格式: %s', get_jwt_identity(), fmt)
+        
+        return Response(stream_with_context(body), mimetype=mimetype, headers={
+            'Content-Disposition': f'attachment; filename=users.{fmt}'
+        })
+
     @app.route('/api/admin/resources/<int:resource_id>', methods=['DELETE'])
-    @jwt_required()
+    @admin_required
     def delete_resource(resource_id):
         current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
-        
-        if not current_user.is_admin:
-            app.logger.warning(f'用户 {current_user_id} 尝试访问管理员功能')
-            return jsonify({'error': '需要管理员权限'}), 403
         
         resource = CulturalResource.query.get(resource_id)
         if not resource:
-            app.logger.warning(f'尝试删除不存在的文化资源: {resource_id}')
+            app.logger.warning('尝试删除不存在的文化资源: %s', resource_id)
             return jsonify({'error': '文化资源不存在'}), 404
         
         try:
             db.session.delete(resource)
             db.session.commit()
+            invalidate_resource_cache(resource_id)
+            remove_from_index('resource', resource_id)
             
-            app.logger.info(f'管理员 {current_user_id} 删除了文化资源: {resource_id}')
+            app.logger.info('管理员 %s 删除了文化资源: %s', current_user_id, resource_id)
             
             return jsonify({
                 'success': True,
@@ -907,81 +2723,194 @@ def create_app(config_name=None):
             })
         except Exception as e:
             db.session.rollback()
-            app.logger.error(f'删除文化资源时发生错误: {str(e)}')
+            app.logger.error('删除文化资源时发生错误: %s', e)
             return jsonify({'error': '删除文化资源失败', 'message': str(e)}), 500
 
-    # 活动API路由
+    # 管理员批量导入文化资源：上传 JSONL/CSV 文件（multipart 的 file 字段或原始请求体），
+    # 可通过 ?skip=<已处理数> 从上次中断处继续
+    @app.route('/api/admin/resources/import', methods=['POST'])
+    @admin_required
+    def import_resources_endpoint():
+        current_user_id = get_jwt_identity()
+        upload = request.files.get('file')
+        if upload:
+            stream = upload.stream
+            fmt = request.args.get('format') or resource_io.detect_format(upload.filename)
+        else:
+            stream = request.stream
+            fmt = request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'jsonl')
+        if fmt not in ('jsonl', 'csv'):
+            return jsonify({'error': '不支持的文件格式'}), 400
+        
+        skip = max(request.args.get('skip', 0, type=int), 0)
+        batch_size = min(max(request.args.get('batch_size', 1000, type=int), 1), 5000)
+        
+        # 记录已提交的进度，失败时告知客户端可从何处继续
+        progress = {'processed': skip}
+        
+        def on_batch(stats):
+            progress['processed'] = stats.processed
+            app.logger.info('管理员 %s 批量导入进度: %s', current_user_id, stats.to_dict())
+        
+        try:
+            stats = import_resources(
+                resource_io.iter_records(resource_io.open_text_stream(stream), fmt), current_user_id,
+                batch_size=batch_size, skip=skip, on_batch=on_batch
+            )
+        except Exception as e:
+            app.logger.error('批量导入文化资源时发生错误: %s', e)
+            return jsonify({'error': '批量导入失败', 'message': str(e), 'processed': progress['processed']}), 500
+        
+        app.logger.info('管理员 %s 批量导入了 %s 个文化资源', current_user_id, stats.imported)
+        
+        return jsonify({'success': True, 'message': '批量导入完成', **stats.to_dict()})
+    
+    # 管理员流式导出文化资源：?format=jsonl|csv
+    @app.route('/api/admin/resources/export', methods=['GET'])
+    @admin_required
+    def export_resources_endpoint():
+        fmt = request.args.get('format', 'jsonl')
+        if fmt == 'csv':
+            body = resource_io.export_csv(iter_resource_export_rows())
+            mimetype = 'text/csv'
+        elif fmt == 'jsonl':
+            body = resource_io.export_jsonl(iter_resource_export_rows())
+            mimetype = 'application/x-ndjson'
+        else:
+            return jsonify({'error': '不支持的文件格式'}), 400
+        
+        app.logger.info('管理员 %s 导出了文化资源，格式: %s', get_jwt_identity(), fmt)
+        
+        return Response(stream_with_context(body), mimetype=mimetype, headers={
+            'Content-Disposition': f'attachment; filename=cultural_resources.{fmt}'
+        })
+    
+    # 活动API路由：按开始时间正序返回活动，支持 from/to（开始日期范围，YYYY-MM-DD，含首尾两天）与 location（地点）筛选
     @app.route('/api/activities', methods=['GET'])
     @jwt_required()
     def activities():
+        current_user_id = get_jwt_identity()
         try:
-            # 模拟活动数据，实际应用中可以从数据库获取
-            activities_list = [
-                {
-                    'id': '1',
-                    'title': '湖湘文化艺术节',
-                    'description': '一场集音乐、舞蹈、戏剧、美术于一体的综合性文化艺术盛宴，展示湖湘文化的独特魅力。',
-                    'imageUrl': 'https://picsum.photos/seed/artfestival/400/300',
-                    'startDate': '2024-06-15',
-                    'endDate': '2024-06-17',
-                    'location': '长沙市湖南大剧院',
-                    'participants': 500,
-                    'isJoined': False
-                },
-                {
-                    'id': '2',
-                    'title': '岳麓书院文化讲堂',
-                    'description': '邀请知名学者讲解湖湘文化的历史渊源和当代价值，欢迎广大文化爱好者参与。',
-                    'imageUrl': 'https://picsum.photos/seed/culturelecture/400/300',
-                    'startDate': '2024-07-22',
-                    'endDate': '2024-07-22',
-                    'location': '长沙市岳麓书院',
-                    'participants': 189,
-                    'isJoined': False
-                },
-                {
-                    'id': '3',
-                    'title': '湘绣技艺体验工作坊',
-                    'description': '由资深湘绣艺人亲自指导，让参与者亲身体验湘绣的制作过程，感受传统工艺的魅力。',
-                    'imageUrl': 'https://picsum.photos/seed/xiangxiu/400/300',
-                    'startDate': '2024-08-05',
-                    'endDate': '2024-08-05',
-                    'location': '湖南省博物馆',
-                    'participants': 120,
-                    'isJoined': False
+            start_from = parse_activity_date(request.args.get('from'))
+            start_to = parse_activity_date(request.args.get('to'))
+        except ValueError:
+            return jsonify({'success': False, 'error': '日期格式应为 YYYY-MM-DD'}), 400
+        
+        try:
+            query = Activity.query
+            if start_from:
+                query = query.filter(Activity.start_date >= start_from)
+            if start_to:
+                query = query.filter(Activity.start_date < start_to + timedelta(days=1))
+            location = request.args.get('location', '').strip()
+            if location:
+                query = query.filter(Activity.location == location)
+            
+            # 游标分页模式：?cursor=<游标>&limit=N，否则按 page/per_page 分页
+            keyset_args = parse_keyset_args(request.args)
+            if keyset_args:
+                cursor, limit, with_total = keyset_args
+                try:
+                    page_result = keyset_paginate(
+                        query, Activity.start_date, Activity.id, cursor=cursor, limit=limit, descending=False
+                    )
+                except InvalidCursor:
+                    return jsonify({'success': False, 'error': '无效的游标'}), 400
+                items = page_result.items
+                response = {'next_cursor': page_result.next_cursor, 'has_more': page_result.has_more}
+                if with_total:
+                    response['total'] = query.order_by(None).count()
+            else:
+                page = request.args.get('page', 1, type=int)
+                per_page = max(1, min(request.args.get('per_page', DEFAULT_LIMIT, type=int) or DEFAULT_LIMIT, MAX_LIMIT))
+                activities_pagination = query.order_by(Activity.start_date.asc(), Activity.id.asc()).paginate(
+                    page=page, per_page=per_page, error_out=False
+                )
+                items = activities_pagination.items
+                response = {
+                    'total': activities_pagination.total,
+                    'pages': activities_pagination.pages,
+                    'current_page': page
                 }
-            ]
             
-            app.logger.info(f'用户 {get_jwt_identity()} 请求了活动列表')
+            # 当前用户的报名状态对整页活动只查询一次
+            joined_ids = joined_activity_ids(current_user_id, [activity.id for activity in items])
+            
+            app.logger.info('用户 %s 请求了活动列表', current_user_id, extra=SAMPLED)
             
             return jsonify({
                 'success': True,
-                'activities': activities_list,
-                'total': len(activities_list)
+                'activities': [activity.to_dict(is_joined=activity.id in joined_ids) for activity in items],
+                **response
             })
         except Exception as e:
-            app.logger.error(f'获取活动列表时发生错误: {str(e)}')
+            app.logger.error('获取活动列表时发生错误: %s', e)
             return jsonify({'error': '获取活动列表失败', 'message': str(e)}), 500
+    
+    # 报名活动（POST）/ 取消报名（DELETE）；重复报名或重复取消不会重复计数
+    @app.route('/api/activities/<int:activity_id>/join', methods=['POST', 'DELETE'])
+    @jwt_required()
+    def join_activity(activity_id):
+        current_user_id = get_jwt_identity()
+        registrations = ActivityRegistration.__table__
+        
+        try:
+            if request.method == 'POST':
+                # 名额检查与计数在同一条条件 UPDATE 中完成，并发报名也不会超出名额；更新成功同时证明活动存在
+                participants = update_participants_count(activity_id, 1)
+                if participants is None:
+                    db.session.rollback()
+                    if not db.session.get(Activity, activity_id):
+                        return jsonify({'error': '活动不存在'}), 404
+                    if ActivityRegistration.query.filter_by(user_id=current_user_id, activity_id=activity_id).first():
+                        return jsonify({'success': True, 'isJoined': True, 'participants': participants_of(activity_id)})
+                    return jsonify({'error': '活动名额已满'}), 409
+                
+                # 再写报名记录：唯一约束保证同一用户只计一次，重复报名时撤销上面的计数
+                inserted = execute_insert_ignore(insert_ignore(registrations).values(
+                    user_id=current_user_id, activity_id=activity_id, created_at=datetime.utcnow()
+                ))
+                if not inserted:
+                    db.session.rollback()
+                    return jsonify({'success': True, 'isJoined': True, 'participants': participants_of(activity_id)})
+                db.session.commit()
+                app.logger.info('用户 %s 报名了活动 %s', current_user_id, activity_id)
+                return jsonify({'success': True, 'isJoined': True, 'participants': participants})
+            
+            deleted = db.session.execute(registrations.delete().where(
+                registrations.c.user_id == current_user_id,
+                registrations.c.activity_id == activity_id
+            )).rowcount
+            if deleted:
+                participants = update_participants_count(activity_id, -1)
+            else:
+                participants = participants_of(activity_id)
+            if participants is None and not db.session.get(Activity, activity_id):
+                db.session.rollback()
+                return jsonify({'error': '活动不存在'}), 404
+            db.session.commit()
+            if deleted:
+                app.logger.info('用户 %s 取消报名活动 %s', current_user_id, activity_id)
+            return jsonify({'success': True, 'isJoined': False, 'participants': participants or 0})
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error('活动 %s 报名操作时发生错误: %s', activity_id, e)
+            return jsonify({'error': '报名操作失败', 'message': str(e)}), 500
 
     # 管理员修改用户角色的API
     @app.route('/api/admin/users/<int:user_id>/role', methods=['PUT'])
-    @jwt_required()
+    @admin_required
     def update_user_role(user_id):
         current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
-        
-        if not current_user or not current_user.is_admin:
-            app.logger.warning(f'用户 {current_user_id} 尝试访问管理员功能')
-            return jsonify({'error': '需要管理员权限'}), 403
         
         target_user = User.query.get(user_id)
         if not target_user:
-            app.logger.warning(f'尝试修改不存在的用户角色: {user_id}')
+            app.logger.warning('尝试修改不存在的用户角色: %s', user_id)
             return jsonify({'error': '用户不存在'}), 404
         
         # 防止管理员修改自己的角色
         if current_user_id == user_id:
-            app.logger.warning(f'管理员 {current_user_id} 尝试修改自己的角色')
+            app.logger.warning('管理员 %s 尝试修改自己的角色', current_user_id)
             return jsonify({'error': '不能修改自己的角色'}), 403
         
         try:
@@ -999,10 +2928,15 @@ def create_app(config_name=None):
                 if admin_count == 1 and target_user.is_admin:
                     return jsonify({'error': '不能移除唯一的管理员角色'}), 400
             
+            role_changed = target_user.is_admin != is_admin
             target_user.is_admin = is_admin
             db.session.commit()
             
-            app.logger.info(f'管理员 {current_user_id} 更新了用户 {user_id} 的角色为: {"管理员" if is_admin else "普通用户"}')
+            # 资源缓存内嵌的作者信息包含 is_admin
+            if role_changed:
+                invalidate_author_cache()
+            
+            app.logger.info('管理员 %s 更新了用户 %s 的角色为: %s', current_user_id, user_id, '管理员' if is_admin else '普通用户')
             
             return jsonify({
                 'success': True,
@@ -1011,14 +2945,14 @@ def create_app(config_name=None):
             })
         except Exception as e:
             db.session.rollback()
-            app.logger.error(f'更新用户角色时发生错误: {str(e)}')
+            app.logger.error('更新用户角色时发生错误: %s', e)
             return jsonify({'error': '更新用户角色失败', 'message': str(e)}), 500
 
     # 全局错误处理，捕获所有未处理的异常
     @app.errorhandler(Exception)
     def handle_exception(e):
         # 记录异常
-        app.logger.error(f'未处理的异常: {str(e)}', exc_info=True)
+        app.logger.error('未处理的异常: %s', e, exc_info=True)
         
         # 如果是HTTPException，交给默认处理程序
         if hasattr(e, 'code') and e.code is not None:
@@ -1030,43 +2964,9 @@ def create_app(config_name=None):
     return app
 
 
-# 添加日志
-def setup_logging(app):
-    """
-    设置应用的日志配置
-    """
-    if app is None:
-        print("警告：应用实例为空，无法设置日志")
-        return
-        
-    # 确保logs目录存在
-    if not os.path.exists('logs'):
-        os.mkdir('logs')
-    
-    # 设置日志格式
-    formatter = logging.Formatter(
-        '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-    )
-    
-    # 创建一个轮转文件处理器，最大10MB，保留3个备份
-    file_handler = RotatingFileHandler(
-        'logs/huxiang.log',
-        maxBytes=10240000,
-        backupCount=3
-    )
-    file_handler.setFormatter(formatter)
-    file_handler.setLevel(logging.INFO)
-    
-    # 添加处理器到应用日志
-    app.logger.addHandler(file_handler)
-    app.logger.setLevel(logging.INFO)
-    app.logger.info('胡湘文化平台启动')
-
-
 # 创建应用实例
 if __name__ == '__main__':
     app = create_app()
     with app.app_context():
         db.create_all()
-    setup_logging(app)
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,101 @@
+"""
+JSON 编码与响应压缩基准测试：用中文内容的帖子列表，对比
+Flask 默认编码（中文转义为 \\uXXXX）、标准库 UTF-8 输出与 orjson（已安装时）的编码耗时和字节数，
+以及各压缩方式下实际传输的字节数。
+
+用法（在 backend_setup 目录下）：
+    python bench_json.py
+    python bench_json.py --items 100 --rounds 200
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+SAMPLE_TEXT = (
+    '湖湘文化是湖南地域文化的总称，源远流长。岳麓书院作为千年学府，'
+    '见证了湖湘学派“经世致用”的学术传统；湘绣、花鼓戏、长沙窑等非物质文化遗产，'
+    '至今仍在民间生生不息。'
+)
+
+
+def time_encode(encode, payload, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        data = encode(payload)
+    return (time.perf_counter() - started) / rounds * 1000, len(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='JSON 编码与响应压缩基准测试')
+    parser.add_argument('--items', type=int, default=50, help='列表中的帖子数')
+    parser.add_argument('--rounds', type=int, default=100, help='每种编码的重复次数')
+    args = parser.parse_args()
+
+    # 使用临时数据库和日志目录，不影响开发数据
+    workdir = tempfile.mkdtemp(prefix='bench_json_')
+    os.environ['DEV_DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ['SEARCH_INDEX_PATH'] = os.path.join(workdir, 'search_index.db')
+    os.environ['KNOWLEDGE_GRAPH_PATH'] = os.path.join(workdir, 'knowledge_graph.json')
+    os.environ['LOG_DIR'] = os.path.join(workdir, 'logs')
+    os.environ['MEDIA_ROOT'] = os.path.join(workdir, 'media')
+    os.environ['SQL_PROFILING_ENABLED'] = 'false'
+
+    from flask.json.provider import DefaultJSONProvider
+    from flask_jwt_extended import create_access_token
+    from app import create_app, db, Post, User, posts_to_dicts
+    from compression import brotli
+    from json_provider import FastJSONProvider, orjson
+
+    app = create_app('development')
+    app.logger.disabled = True
+    # 与生产环境一致输出紧凑 JSON（开发环境默认缩进）
+    app.json.compact = True
+    with app.app_context():
+        db.create_all()
+        user = User(username='湘江', email='bench@example.com', password_hash='')
+        db.session.add(user)
+        db.session.flush()
+        for i in range(args.items):
+            db.session.add(Post(title=f'湖湘文化漫谈第{i}期', content=SAMPLE_TEXT * 6, author_id=user.id))
+        db.session.commit()
+        payload = {'success': True, 'posts': posts_to_dicts(Post.query.options(db.joinedload(Post.author)).all())}
+
+    encoders = [('Flask 默认（转义中文）', lambda obj: json.dumps(
+        obj, default=DefaultJSONProvider.default, ensure_ascii=True, sort_keys=True, separators=(',', ':')
+    ).encode('ascii'))]
+    stdlib = FastJSONProvider(app, backend='stdlib')
+    encoders.append(('标准库 UTF-8', lambda obj: stdlib.dumps_bytes(obj)))
+    if orjson is not None:
+        fast = FastJSONProvider(app, backend='orjson')
+        encoders.append(('orjson', lambda obj: fast.dumps_bytes(obj)))
+
+    print(f'{args.items} 个帖子，每种编码重复 {args.rounds} 次')
+    print(f'{"编码方式":<20}{"耗时(ms)":>10}{"字节数":>10}')
+    for name, encode in encoders:
+        elapsed_ms, size = time_encode(encode, payload, args.rounds)
+        print(f'{name:<20}{elapsed_ms:>12.3f}{size:>12}')
+
+    # 通过测试客户端请求实际接口，比较传输字节数
+    client = app.test_client()
+    with app.app_context():
+        token = create_access_token(identity=1)
+    headers = {'Authorization': f'Bearer {token}'}
+    url = f'/api/posts?per_page={args.items}'
+    print()
+    print(f'{"传输编码":<20}{"字节数":>10}{"耗时(ms)":>12}')
+    for encoding in ['identity', 'gzip'] + (['br'] if brotli is not None else []):
+        started = time.perf_counter()
+        for _ in range(args.rounds):
+            response = client.get(url, headers={**headers, 'Accept-Encoding': encoding})
+        elapsed_ms = (time.perf_counter() - started) / args.rounds * 1000
+        assert response.status_code == 200, response.status_code
+        print(f'{encoding:<20}{len(response.data):>12}{elapsed_ms:>12.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+登录吞吐量基准测试：对每种密码哈希参数，用多个线程并发调用 /api/login，
+输出每秒登录数和延迟分位数，用于为各环境选择 PASSWORD_HASH_METHOD 与 PASSWORD_HASH_WORKERS。
+
+用法（在 backend_setup 目录下）：
+    python bench_login.py
+    python bench_login.py --methods pbkdf2:sha256:600000 scrypt:32768:8:1 --requests 200 --concurrency 8 --workers 2
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_METHODS = ['pbkdf2:sha256:60000', 'pbkdf2:sha256:260000', 'pbkdf2:sha256:600000', 'scrypt:32768:8:1']
+
+
+def run(method, app, requests_count, concurrency, workers, executor):
+    from app import db, User
+    from passwords import PasswordHasher
+
+    hasher = PasswordHasher(method=method, workers=workers, max_pending=requests_count, executor=executor)
+    app.extensions['password_hasher'] = hasher
+    with app.app_context():
+        user = User.query.filter_by(username='bench').first()
+        user.set_password('bench-password')
+        db.session.commit()
+
+    client = app.test_client()
+
+    def login(_):
+        start = time.perf_counter()
+        response = client.post('/api/login', json={'username': 'bench', 'password': 'bench-password'})
+        assert response.status_code == 200, response.get_json()
+        return time.perf_counter() - start
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = sorted(pool.map(login, range(requests_count)))
+    elapsed = time.perf_counter() - started
+    hasher.shutdown()
+
+    return {
+        'method': method,
+        'logins_per_sec': requests_count / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1] * 1000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='登录吞吐量基准测试')
+    parser.add_argument('--methods', nargs='+', default=DEFAULT_METHODS, help='要测试的哈希参数')
+    parser.add_argument('--requests', type=int, default=100, help='每种参数的登录次数')
+    parser.add_argument('--concurrency', type=int, default=8, help='并发请求线程数')
+    parser.add_argument('--workers', type=int, default=2, help='哈希线程/进程池大小，0 表示在请求线程中计算')
+    parser.add_argument('--executor', choices=['thread', 'process'], default='thread', help='哈希执行器类型')
+    args = parser.parse_args()
+
+    # 使用临时数据库和日志目录，不影响开发数据
+    workdir = tempfile.mkdtemp(prefix='bench_login_')
+    os.environ['DEV_DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ['SEARCH_INDEX_PATH'] = os.path.join(workdir, 'search_index.db')
+    os.environ['KNOWLEDGE_GRAPH_PATH'] = os.path.join(workdir, 'knowledge_graph.json')
+    os.environ['LOG_DIR'] = os.path.join(workdir, 'logs')
+    os.environ['SQL_PROFILING_ENABLED'] = 'false'
+
+    from app import create_app, db, User
+
+    app = create_app('development')
+    app.logger.disabled = True
+    with app.app_context():
+        db.create_all()
+        user = User(username='bench', email='bench@example.com')
+        user.password_hash = ''
+        db.session.add(user)
+        db.session.commit()
+
+    print(f'{"哈希参数":<26}{"登录/秒":>10}{"p50(ms)":>10}{"p95(ms)":>10}')
+    for method in args.methods:
+        result = run(method, app, args.requests, args.concurrency, args.workers, args.executor)
+        print(f'{result["method"]:<30}{result["logins_per_sec"]:>10.1f}{result["p50_ms"]:>10.1f}{result["p95_ms"]:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+import gzip
+import threading
+from collections import OrderedDict
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖，未安装时只使用 gzip
+    brotli = None
+
+
+class ResponseCompressor:
+    """
+    按客户端的 Accept-Encoding 压缩较大的文本响应（brotli 优先，其次 gzip）。
+    只压缩状态码200、类型在白名单内且不小于 min_size 字节的完整响应；
+    文件下载和流式响应（导出、事件流）保持原样。
+    带 ETag 的响应（如响应缓存命中）按 (ETag, 编码) 缓存压缩结果，相同内容不重复压缩。
+    """
+
+    def __init__(self, mimetypes, min_size=1024, gzip_level=6, brotli_quality=4, cache_entries=256):
+        self.mimetypes = set(mimetypes)
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.cache_entries = cache_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.after_request(self.compress_response)
+        app.extensions['response_compressor'] = self
+
+    def choose_encoding(self, accept_encodings):
+        if brotli is not None and accept_encodings.quality('br') > 0:
+            return 'br'
+        if accept_encodings.quality('gzip') > 0:
+            return 'gzip'
+        return None
+
+    def compress(self, data, encoding):
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.brotli_quality)
+        return gzip.compress(data, compresslevel=self.gzip_level, mtime=0)
+
+    def _compress_cached(self, etag, data, encoding):
+        if not etag or not self.cache_entries:
+            return self.compress(data, encoding)
+        key = (etag, encoding)
+        with self._lock:
+            body = self._cache.get(key)
+            if body is not None:
+                self._cache.move_to_end(key)
+                return body
+        body = self.compress(data, encoding)
+        with self._lock:
+            self._cache[key] = body
+            if len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+        return body
+
+    def compress_response(self, response):
+        if (
+            response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in self.mimetypes
+        ):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = self.choose_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+
+        etag, weak = response.get_etag()
+        response.set_data(self._compress_cached(etag, data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        # 压缩后的字节与原内容不同，强 ETag 改为弱 ETag，If-None-Match 仍按弱比较命中
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+
+def create_compressor(config):
+    """根据配置创建响应压缩器，COMPRESS_ENABLED 为 False 时返回 None"""
+    if not config.get('COMPRESS_ENABLED', True):
+        return None
+    return ResponseCompressor(
+        mimetypes=config['COMPRESS_MIMETYPES'],
+        min_size=config['COMPRESS_MIN_SIZE'],
+        gzip_level=config['COMPRESS_GZIP_LEVEL'],
+        brotli_quality=config['COMPRESS_BROTLI_QUALITY']
+    )
@@ -0,0 +1,281 @@
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    记录连接获取耗时的 QueuePool。
+    连接池事件中没有“开始等待”的时机，因此在 connect() 外层计时，
+    得到的是从请求连接到拿到可用连接的总耗时（包括排队等待、新建连接和 pre-ping）。
+    """
+
+    metrics = None
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            if self.metrics:
+                self.metrics.record_timeout(time.perf_counter() - start)
+            raise
+        if self.metrics:
+            self.metrics.record_wait(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        # engine.dispose() 或连接失效后会重建连接池，保留统计对象
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+class PoolMetrics:
+    """
+    连接池指标（每个 worker 进程独立统计）。
+    当前占用数、溢出数等瞬时值直接读取连接池；新建连接、失效次数等累计值通过连接池事件计数。
+    """
+
+    def __init__(self):
+        self.engine = None
+        self._lock = threading.Lock()
+        self._counters = {
+            'connects': 0,
+            'checkouts': 0,
+            'checkins': 0,
+            'invalidations': 0,
+            'soft_invalidations': 0,
+            'closes': 0,
+            'timeouts': 0
+        }
+        self._wait_count = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def attach(self, engine):
+        self.engine = engine
+        if isinstance(engine.pool, InstrumentedQueuePool):
+            engine.pool.metrics = self
+        for name, counter in (
+            ('connect', 'connects'),
+            ('checkout', 'checkouts'),
+            ('checkin', 'checkins'),
+            ('invalidate', 'invalidations'),
+            ('soft_invalidate', 'soft_invalidations'),
+            ('close', 'closes')
+        ):
+            event.listen(engine, name, self._counter_listener(counter))
+
+    def _counter_listener(self, counter):
+        def listener(*args):
+            with self._lock:
+                self._counters[counter] += 1
+        return listener
+
+    def record_wait(self, seconds):
+        with self._lock:
+            self._wait_count += 1
+            self._wait_total += seconds
+            self._wait_max = max(self._wait_max, seconds)
+
+    def record_timeout(self, seconds):
+        with self._lock:
+            self._counters['timeouts'] += 1
+            self._wait_max = max(self._wait_max, seconds)
+
+    def snapshot(self):
+        pool = self.engine.pool if self.engine is not None else None
+        data = {'pool_class': type(pool).__name__ if pool is not None else None}
+        if isinstance(pool, QueuePool):
+            data.update({
+                'size': pool.size(),
+                'checked_in': pool.checkedin(),
+                'checked_out': pool.checkedout(),
+                'overflow': max(pool.overflow(), 0),
+                'max_overflow': pool._max_overflow,
+                'timeout': pool.timeout()
+            })
+        with self._lock:
+            data.update(self._counters)
+            if self._wait_count:
+                data['wait'] = {
+                    'count': self._wait_count,
+                    'avg_ms': round(self._wait_total / self._wait_count * 1000, 3),
+                    'max_ms': round(self._wait_max * 1000, 3)
+                }
+        return data
+
+
+# 展开后的 IN 参数列表，如 (?, ?, ?)、(%s, %s)、(%(id_1)s, %(id_2)s)
+_PARAM_LIST_RE = re.compile(r'\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))+\s*\)')
+_NUMBER_RE = re.compile(r'\b\d+\b')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def statement_shape(statement):
+    """语句形状：去掉参数个数和数字字面量的差异，用于识别同一语句被反复执行（N+1 查询）"""
+    shape = _SPACE_RE.sub(' ', statement).strip()
+    shape = _PARAM_LIST_RE.sub('(?)', shape)
+    return _NUMBER_RE.sub('?', shape)
+
+
+class RequestQueryStats:
+    """
+    每个请求的 SQL 语句数与数据库耗时：通过游标执行事件计时并累加到 flask.g，
+    请求结束时按端点汇总（请求数、语句总数、单请求最大语句数、数据库总耗时和最大耗时）。
+    开启 SQL_PROFILING_ENABLED 后额外按语句形状计数，响应附带 Server-Timing 头，
+    语句数、数据库耗时超过阈值或同一形状的语句重复执行时记录警告。
+    """
+
+    def __init__(self, logger=None):
+        self.logger = logger
+        self.profiling = False
+        self.query_threshold = 20
+        self.time_threshold = 0.2
+        self.repeat_threshold = 5
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def attach(self, engine):
+        event.listen(engine, 'before_cursor_execute', self._before_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_execute)
+
+    def init_app(self, app):
+        self.profiling = app.config.get('SQL_PROFILING_ENABLED', False)
+        self.query_threshold = app.config.get('SQL_PROFILING_QUERY_THRESHOLD', 20)
+        self.time_threshold = app.config.get('SQL_PROFILING_TIME_THRESHOLD_MS', 200) / 1000
+        self.repeat_threshold = app.config.get('SQL_PROFILING_REPEAT_THRESHOLD', 5)
+        if self.profiling:
+            app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    @staticmethod
+    def _before_request():
+        g.request_start_time = time.perf_counter()
+
+    @staticmethod
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        # 开始时间记在本次执行的上下文上：语句出错时随上下文一起丢弃，不会在连接池中的连接上累积
+        if context is not None:
+            context._query_start_time = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_query_start_time', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        if has_request_context():
+            g.db_query_count = g.get('db_query_count', 0) + 1
+            g.db_time = g.get('db_time', 0.0) + elapsed
+            if self.profiling:
+                shapes = g.setdefault('db_statement_shapes', {})
+                shape = statement_shape(statement)
+                shapes[shape] = shapes.get(shape, 0) + 1
+
+    @staticmethod
+    def current():
+        """当前请求到目前为止的 (语句数, 数据库耗时秒数)"""
+        return g.get('db_query_count', 0), g.get('db_time', 0.0)
+
+    def _after_request(self, response):
+        count, db_time = self.current()
+        endpoint = request.endpoint or 'unknown'
+        with self._lock:
+            stats = self._endpoints.setdefault(endpoint, {
+                'requests': 0, 'queries': 0, 'max_queries': 0, 'db_time': 0.0, 'max_db_time': 0.0
+            })
+            stats['requests'] += 1
+            stats['queries'] += count
+            stats['max_queries'] = max(stats['max_queries'], count)
+            stats['db_time'] += db_time
+            stats['max_db_time'] = max(stats['max_db_time'], db_time)
+        if self.logger and count:
+            self.logger.debug('%s %s 执行了 %d 条SQL，数据库耗时 %.1fms', request.method, request.path, count, db_time * 1000)
+        if self.profiling:
+            self._profile(response, endpoint, count, db_time)
+        return response
+
+    def _profile(self, response, endpoint, count, db_time):
+        timings = [f'db;dur={db_time * 1000:.2f};desc="{count} queries"']
+        if 'request_start_time' in g:
+            timings.append(f'app;dur={(time.perf_counter() - g.request_start_time) * 1000:.2f}')
+        response.headers.add('Server-Timing', ', '.join(timings))
+        
+        logger = self.logger or current_app.logger
+        if count > self.query_threshold or db_time > self.time_threshold:
+            logger.warning(
+                '%s %s（%s）执行了 %d 条SQL，数据库耗时 %.1fms，超过阈值',
+                request.method, request.path, endpoint, count, db_time * 1000
+            )
+        for shape, repeats in g.get('db_statement_shapes', {}).items():
+            if repeats >= self.repeat_threshold:
+                logger.warning(
+                    '%s %s（%s）中同一语句执行了 %d 次，可能存在 N+1 查询: %s',
+                    request.method, request.path, endpoint, repeats, shape[:300]
+                )
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                endpoint: {
+                    'requests': stats['requests'],
+                    'avg_queries': round(stats['queries'] / stats['requests'], 2),
+                    'max_queries': stats['max_queries'],
+                    'avg_db_time_ms': round(stats['db_time'] / stats['requests'] * 1000, 3),
+                    'max_db_time_ms': round(stats['max_db_time'] * 1000, 3)
+                }
+                for endpoint, stats in self._endpoints.items()
+            }
+
+
+class QueryBudgetExceeded(AssertionError):
+    """代码块执行的SQL语句数超过预算"""
+
+
+@contextmanager
+def assert_query_budget(engine, max_queries):
+    """
+    测试辅助：断言代码块内执行的SQL语句不超过 max_queries 条，超出时列出所有语句。
+    例如：
+        with app.app_context(), assert_query_budget(db.engine, 3):
+            client.get('/api/posts', headers=headers)
+    """
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'after_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'after_cursor_execute', record)
+    if len(statements) > max_queries:
+        details = '\n'.join(f'  {index + 1}. {_SPACE_RE.sub(" ", sql).strip()}' for index, sql in enumerate(statements))
+        raise QueryBudgetExceeded(f'执行了 {len(statements)} 条SQL，超过预算 {max_queries} 条:\n{details}')
+
+
+def configure_pool_options(config):
+    """
+    根据 DB_POOL_* 配置补全 SQLALCHEMY_ENGINE_OPTIONS。
+    SQLite 内存数据库使用 StaticPool，不支持连接池大小等参数，此时保持原样。
+    """
+    from sqlalchemy.engine import make_url
+
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return options
+    options.setdefault('poolclass', InstrumentedQueuePool)
+    options.setdefault('pool_size', config['DB_POOL_SIZE'])
+    options.setdefault('max_overflow', config['DB_MAX_OVERFLOW'])
+    options.setdefault('pool_timeout', config['DB_POOL_TIMEOUT'])
+    options.setdefault('pool_recycle', config['DB_POOL_RECYCLE'])
+    options.setdefault('pool_pre_ping', config['DB_POOL_PRE_PING'])
+    return options
@@ -0,0 +1,63 @@
+from sqlalchemy.orm import joinedload, load_only, with_expression
+
+
+class InvalidFields(ValueError):
+    """fields 参数包含不支持的字段"""
+
+
+class Field:
+    """
+    可输出的字段：getter 从模型对象取值；
+    columns 为需要从数据库加载的列名，expression 为 (query_expression 属性, SQL 表达式)，
+    relationship 为需要预加载的关系及其要加载的列。
+    """
+
+    def __init__(self, getter, columns=(), expression=None, relationship=None):
+        self.getter = getter
+        self.columns = columns
+        self.expression = expression
+        self.relationship = relationship
+
+
+class Fieldset:
+    """
+    列表接口的稀疏字段集：根据请求的字段只加载需要的列（load_only），
+    大文本列不在列表中输出时不会被查询，序列化时也只访问这些字段。
+    always 为分页等逻辑必需的列（如主键、排序时间列），总是加载但不一定输出。
+    """
+
+    def __init__(self, model, fields, always=('id',)):
+        self.model = model
+        self.fields = fields
+        self.always = always
+
+    def parse(self, value):
+        """解析逗号分隔的 fields 参数，未提供时返回全部字段"""
+        if not value:
+            return list(self.fields)
+        names = list(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+        unknown = [name for name in names if name not in self.fields]
+        if unknown or not names:
+            raise InvalidFields(f'不支持的字段: {",".join(unknown)}，可选字段: {",".join(self.fields)}')
+        return names
+
+    def query_options(self, names, extra=()):
+        """extra 为本次查询额外需要的列（如排序列），只加载不输出"""
+        columns = dict.fromkeys(self.always + tuple(extra))
+        options = []
+        for name in names:
+            field = self.fields[name]
+            columns.update(dict.fromkeys(field.columns))
+            if field.expression is not None:
+                options.append(with_expression(*field.expression))
+            if field.relationship is not None:
+                relationship, related_columns = field.relationship
+                loader = joinedload(relationship)
+                if related_columns:
+                    loader = loader.load_only(*related_columns)
+                options.append(loader)
+        options.insert(0, load_only(*(getattr(self.model, column) for column in columns)))
+        return options
+
+    def serialize(self, obj, names):
+        return {name: self.fields[name].getter(obj) for name in names}
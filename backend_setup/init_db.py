@@ -2,7 +2,9 @@ import os
 import sys
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from app import db, User, CulturalResource, Post, Comment, create_app
+from datetime import datetime
+
+from app import db, User, CulturalResource, Post, Comment, Activity, create_app
 from werkzeug.security import generate_password_hash
 
 def init_database():
@@ -80,9 +82,9 @@ def init_database():
                     title=resource_data['title'],
                     description=resource_data['description'],
                     category=resource_data['category'],
-                    tags=','.join(resource_data['tags']),
                     author_id=admin_user.id if idx % 2 == 0 else sample_user.id
                 )
+                resource.set_tags(resource_data['tags'])
                 db.session.add(resource)
         
         db.session.commit()
@@ -107,10 +109,49 @@ def init_database():
                     content=post_data['content'],
                     author_id=sample_user.id
                 )
+                post.refresh_hot_score()
                 db.session.add(post)
         
         db.session.commit()
         
+        # 创建一些示例文化活动（capacity 为空表示不限名额）
+        sample_activities = [
+            {
+                'title': '湖湘文化艺术节',
+                'description': '一场集音乐、舞蹈、戏剧、美术于一体的综合性文化艺术盛宴，展示湖湘文化的独特魅力。',
+                'image_url': 'https://picsum.photos/seed/artfestival/400/300',
+                'start_date': datetime(2024, 6, 15),
+                'end_date': datetime(2024, 6, 17),
+                'location': '长沙市湖南大剧院',
+                'capacity': None
+            },
+            {
+                'title': '岳麓书院文化讲堂',
+                'description': '邀请知名学者讲解湖湘文化的历史渊源和当代价值，欢迎广大文化爱好者参与。',
+                'image_url': 'https://picsum.photos/seed/culturelecture/400/300',
+                'start_date': datetime(2024, 7, 22),
+                'end_date': datetime(2024, 7, 22),
+                'location': '长沙市岳麓书院',
+                'capacity': 200
+            },
+            {
+                'title': '湘绣技艺体验工作坊',
+                'description': '由资深湘绣艺人亲自指导，让参与者亲身体验湘绣的制作过程，感受传统工艺的魅力。',
+                'image_url': 'https://picsum.photos/seed/xiangxiu/400/300',
+                'start_date': datetime(2024, 8, 5),
+                'end_date': datetime(2024, 8, 5),
+                'location': '湖南省博物馆',
+                'capacity': 30
+            }
+        ]
+        
+        for activity_data in sample_activities:
+            existing_activity = Activity.query.filter_by(title=activity_data['title']).first()
+            if not existing_activity:
+                db.session.add(Activity(**activity_data))
+        
+        db.session.commit()
+        
         print("示例数据已添加到数据库")
 
 if __name__ == '__main__':
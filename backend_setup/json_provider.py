@@ -0,0 +1,84 @@
+import json
+from datetime import date, datetime
+
+from flask.json.provider import DefaultJSONProvider, _default
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，未安装时使用标准库 json
+    orjson = None
+
+
+def _json_default(o):
+    # 日期时间输出为 ISO 8601，与 to_dict 中的 isoformat() 一致（Flask 默认输出 HTTP 日期格式）
+    if isinstance(o, (datetime, date)):
+        return o.isoformat()
+    return _default(o)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    API 响应的 JSON 编码：
+    中文直接输出为 UTF-8 而不转义为 \\uXXXX，日期时间直接序列化为 ISO 8601 字符串；
+    安装了 orjson 时用它编码（直接生成字节，不经过 str），否则使用标准库 json。
+    orjson 无法处理的参数或对象（如超过64位的整数）自动回退到标准库。
+    """
+
+    ensure_ascii = False
+
+    def __init__(self, app, backend='auto'):
+        super().__init__(app)
+        if backend == 'orjson' and orjson is None:
+            raise RuntimeError('使用 orjson 编码需要安装 orjson 包: pip install orjson')
+        if backend not in ('auto', 'orjson', 'stdlib'):
+            raise ValueError(f'未知的 JSON 编码后端: {backend}')
+        self.use_orjson = orjson is not None and backend != 'stdlib'
+
+    @property
+    def backend(self):
+        return 'orjson' if self.use_orjson else 'stdlib'
+
+    def _orjson_options(self, indent):
+        options = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps_bytes(self, obj, indent=None):
+        """编码为 UTF-8 字节"""
+        if self.use_orjson:
+            try:
+                return orjson.dumps(obj, default=_json_default, option=self._orjson_options(indent))
+            except TypeError:
+                pass
+        separators = None if indent else (',', ':')
+        return self._stdlib_dumps(obj, indent=indent, separators=separators).encode('utf-8')
+
+    def _stdlib_dumps(self, obj, **kwargs):
+        kwargs.setdefault('default', _json_default)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        return json.dumps(obj, **kwargs)
+
+    def dumps(self, obj, **kwargs):
+        # 只有缩进/分隔符参数时可以用 orjson，其他参数（如自定义 cls）交给标准库
+        if self.use_orjson and set(kwargs) <= {'indent', 'separators'}:
+            try:
+                return orjson.dumps(
+                    obj, default=_json_default, option=self._orjson_options(kwargs.get('indent'))
+                ).decode('utf-8')
+            except TypeError:
+                pass
+        return self._stdlib_dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = 2 if (self.compact is None and self._app.debug) or self.compact is False else None
+        return self._app.response_class(self.dumps_bytes(obj, indent=indent) + b'\n', mimetype=self.mimetype)
+
+
+def create_json_provider(app):
+    """根据 JSON_BACKEND 配置（auto / orjson / stdlib）创建 JSON 编码器"""
+    return FastJSONProvider(app, backend=app.config.get('JSON_BACKEND', 'auto'))
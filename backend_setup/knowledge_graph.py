@@ -0,0 +1,264 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+ROOT_ID = 'root'
+
+
+class KnowledgeGraph:
+    """
+    湖湘文化知识图谱：以文化资源为中心，连接其分类、标签和作者。
+    节点以字符串 id 索引（如 resource:1、category:历史文化、tag:湖南、author:2），
+    根节点 root 连接所有分类，邻接表预先计算并持久化，查询时无需扫描节点或边列表。
+    """
+
+    def __init__(self, nodes, adjacency):
+        self.nodes = nodes
+        self.adjacency = adjacency
+
+    @classmethod
+    def build(cls, resources, resource_tags, authors, root_name='湖湘文化'):
+        """
+        resources 为 (id, 标题, 分类, 作者id) 序列，resource_tags 为 (资源id, 标签名) 序列，
+        authors 为 {作者id: 用户名}。
+        """
+        nodes = {ROOT_ID: {'id': ROOT_ID, 'name': root_name, 'type': 'root'}}
+        adjacency = {ROOT_ID: set()}
+
+        def add_node(node_id, name, node_type):
+            if node_id not in nodes:
+                nodes[node_id] = {'id': node_id, 'name': name, 'type': node_type}
+                adjacency[node_id] = set()
+
+        def add_edge(a, b):
+            adjacency[a].add(b)
+            adjacency[b].add(a)
+
+        for resource_id, title, category, author_id in resources:
+            resource_node = f'resource:{resource_id}'
+            add_node(resource_node, title, 'resource')
+            if category:
+                category_node = f'category:{category}'
+                add_node(category_node, category, 'category')
+                add_edge(ROOT_ID, category_node)
+                add_edge(category_node, resource_node)
+            if author_id is not None:
+                author_node = f'author:{author_id}'
+                add_node(author_node, authors.get(author_id, '未知用户'), 'author')
+                add_edge(author_node, resource_node)
+
+        for resource_id, tag_name in resource_tags:
+            resource_node = f'resource:{resource_id}'
+            if resource_node not in nodes:
+                continue
+            tag_node = f'tag:{tag_name}'
+            add_node(tag_node, tag_name, 'tag')
+            add_edge(tag_node, resource_node)
+
+        # 邻接表排序后固定下来，保证输出稳定
+        return cls(nodes, {node_id: sorted(neighbors) for node_id, neighbors in adjacency.items()})
+
+    def save(self, path):
+        """原子写入：先写临时文件再替换，避免其他进程读到半个文件"""
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'nodes': self.nodes, 'adjacency': self.adjacency}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['nodes'], data['adjacency'])
+
+    def __contains__(self, node_id):
+        return node_id in self.nodes
+
+    def subgraph(self, node_ids, truncated=False):
+        """
+        生成以 id 索引的子图：nodes 为 {id: 节点}，links 为子图内的无向边 [a, b]。
+        每个节点附带 degree（全图度数），客户端可据此判断是否还能继续展开。
+        """
+        node_ids = set(node_ids)
+        nodes = {}
+        links = []
+        for node_id in node_ids:
+            node = dict(self.nodes[node_id])
+            node['degree'] = len(self.adjacency[node_id])
+            nodes[node_id] = node
+            for neighbor in self.adjacency[node_id]:
+                if neighbor in node_ids and node_id < neighbor:
+                    links.append([node_id, neighbor])
+        links.sort()
+        return {'nodes': nodes, 'links': links, 'truncated': truncated}
+
+    def neighborhood(self, node_id, depth=1, max_nodes=500):
+        """k 跳邻域（广度优先），节点数超过 max_nodes 时截断"""
+        visited = {node_id}
+        frontier = [node_id]
+        truncated = False
+        for _ in range(depth):
+            next_frontier = []
+            for current in frontier:
+                for neighbor in self.adjacency[current]:
+                    if neighbor in visited:
+                        continue
+                    if len(visited) >= max_nodes:
+                        truncated = True
+                        break
+                    visited.add(neighbor)
+                    next_frontier.append(neighbor)
+            if truncated or not next_frontier:
+                break
+            frontier = next_frontier
+        return self.subgraph(visited, truncated)
+
+    def category_subgraph(self, category, max_nodes=1000):
+        """分类子图：分类节点、其下的资源，以及这些资源关联的标签和作者"""
+        category_node = f'category:{category}'
+        node_ids = {category_node}
+        truncated = False
+        for resource_node in self.adjacency[category_node]:
+            if not resource_node.startswith('resource:'):
+                continue
+            related = [resource_node] + [n for n in self.adjacency[resource_node] if not n.startswith('category:')]
+            if len(node_ids) + len(related) > max_nodes:
+                truncated = True
+                break
+            node_ids.update(related)
+        return self.subgraph(node_ids, truncated)
+
+    def shortest_path(self, source, target, max_depth=6):
+        """无权最短路径（双向广度优先），不可达或超过 max_depth 时返回 None"""
+        if source == target:
+            return [source]
+        parents = {source: None}
+        children = {target: None}
+        forward, backward = [source], [target]
+        for _ in range(max_depth):
+            # 每轮扩展较小的一侧
+            if len(forward) <= len(backward):
+                forward, meeting = self._expand(forward, parents, children)
+            else:
+                backward, meeting = self._expand(backward, children, parents)
+            if meeting is not None:
+                path = []
+                node = meeting
+                while node is not None:
+                    path.append(node)
+                    node = parents[node]
+                path.reverse()
+                node = children[meeting]
+                while node is not None:
+                    path.append(node)
+                    node = children[node]
+                return path
+            if not forward or not backward:
+                return None
+        return None
+
+    def _expand(self, frontier, seen, other_seen):
+        next_frontier = []
+        for current in frontier:
+            for neighbor in self.adjacency[current]:
+                if neighbor in seen:
+                    continue
+                seen[neighbor] = current
+                if neighbor in other_seen:
+                    return next_frontier, neighbor
+                next_frontier.append(neighbor)
+        return next_frontier, None
+
+
+class GraphStore:
+    """
+    知识图谱的持久化与进程内缓存。
+    图谱保存为 JSON 文件，所有 worker 共享；文件变化（mtime/大小）时重新加载，
+    invalidate() 删除文件，任意 worker 下次访问时通过 builder 重建并写回。
+    invalidate() 同时更新旁路的代数文件；构建前后代数不一致说明构建期间数据已变更，
+    此时不写回（已写回则删除）构建结果，避免进行中的旧构建覆盖刚失效的图谱。
+    """
+
+    def __init__(self, path, builder):
+        self.path = path
+        self.generation_path = f'{path}.generation'
+        self.builder = builder
+        self._graph = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _file_version(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def _generation(self):
+        try:
+            with open(self.generation_path, encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _build(self):
+        """构建并写回图谱，构建期间被失效时返回 (图谱, None)，结果只用于本次请求"""
+        generation = self._generation()
+        graph = self.builder()
+        if self._generation() != generation:
+            return graph, None
+        graph.save(self.path)
+        # 写回与失效之间仍可能交错：写回后再次检查，已失效则删除刚写入的文件，由下次访问重建
+        if self._generation() != generation:
+            self._remove_file()
+            return graph, None
+        return graph, self._file_version()
+
+    def _remove_file(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def get(self):
+        version = self._file_version()
+        if self._graph is not None and version == self._version:
+            return self._graph
+        with self._lock:
+            version = self._file_version()
+            if self._graph is not None and version == self._version:
+                return self._graph
+            if version is None:
+                graph, version = self._build()
+                if version is None:
+                    return graph
+            else:
+                graph = KnowledgeGraph.load(self.path)
+            self._graph, self._version = graph, version
+            return graph
+
+    def rebuild(self):
+        with self._lock:
+            graph, version = self._build()
+            self._graph, self._version = (graph, version) if version is not None else (None, None)
+            return graph
+
+    def invalidate(self):
+        with self._lock:
+            self._graph = None
+            self._version = None
+            # 先更新代数再删除文件，进行中的构建在写回前后都能发现
+            directory = os.path.dirname(self.generation_path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            tmp_path = f'{self.generation_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(f'{os.getpid()}:{time.time_ns()}')
+            os.replace(tmp_path, self.generation_path)
+            self._remove_file()
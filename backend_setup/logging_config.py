@@ -1,26 +1,160 @@
+import atexit
+import copy
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 import os
+import queue
+import random
+import threading
+from datetime import datetime, timezone
+
+from flask import has_request_context, request
+from flask.logging import default_handler
+
+
+# 高频日志（如列表请求）通过 extra=SAMPLED 标记，按 LOG_SAMPLE_RATE 采样记录
+SAMPLED = {'sampled': True}
+
+
+class JsonFormatter(logging.Formatter):
+    """把日志记录格式化为单行 JSON，便于日志系统检索"""
+
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'line': record.lineno,
+            'process': record.process,
+            'thread': record.threadName
+        }
+        for key in ('method', 'path', 'remote_addr', 'sample_rate'):
+            value = getattr(record, key, None)
+            if value is not None:
+                data[key] = value
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data['exception'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False)
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    在调用方线程中附加请求信息并执行采样：
+    后台写线程拿不到请求上下文，被采样丢弃的记录也不必进入队列。
+    """
+
+    def __init__(self, sample_rate=1.0):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        if getattr(record, 'sampled', False) and record.levelno < logging.WARNING:
+            if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+                return False
+            record.sample_rate = self.sample_rate
+        if has_request_context():
+            record.method = request.method
+            record.path = request.path
+            record.remote_addr = request.remote_addr
+        return True
+
+
+class AsyncQueueHandler(QueueHandler):
+    """
+    非阻塞的队列日志处理器：请求线程只把记录放入有界队列，由每个进程一个的后台线程写入文件。
+    队列已满时丢弃记录而不是阻塞请求；gunicorn fork 出的 worker 不继承线程，按进程号懒启动写线程。
+    """
+
+    def __init__(self, log_queue, handlers):
+        super().__init__(log_queue)
+        self.listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        self.dropped = 0
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def prepare(self, record):
+        # 在调用方线程中完成消息插值和异常格式化，之后的记录不再引用请求相关对象
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def emit(self, record):
+        if self._pid != os.getpid():
+            with self._start_lock:
+                if self._pid != os.getpid():
+                    self.start()
+        super().emit(record)
+
+    def start(self):
+        self._pid = os.getpid()
+        # fork 后继承的监听器线程对象已失效，重新创建
+        self.listener._thread = None
+        self.listener.start()
+
+    def stop(self):
+        if self._pid == os.getpid() and self.listener._thread is not None:
+            self.listener.stop()
+        self._pid = None
 
 
 def setup_logging(app):
-    """配置应用日志"""
-    if not app.debug and not app.testing:
-        # 创建logs目录
-        if not os.path.exists('logs'):
-            os.mkdir('logs')
-            
+    """
+    配置应用日志：请求线程中的日志经队列交给后台线程写入轮转文件（JSON 格式），
+    调试模式下同时输出到控制台。重复调用时不会重复添加处理器。
+    """
+    if app.extensions.get('log_handler'):
+        return app.extensions['log_handler']
+
+    level = getattr(logging, str(app.config.get('LOG_LEVEL', 'INFO')).upper(), logging.INFO)
+    handlers = []
+
+    if not app.testing:
+        log_dir = app.config.get('LOG_DIR', 'logs')
+        if not os.path.exists(log_dir):
+            os.makedirs(log_dir)
+
         # 配置文件日志处理器
         file_handler = RotatingFileHandler(
-            'logs/huxiang_culture.log', 
+            os.path.join(log_dir, app.config.get('LOG_FILE', 'huxiang_culture.log')),
             maxBytes=10240000,  # 10MB
-            backupCount=10
+            backupCount=10,
+            encoding='utf-8'
         )
-        file_handler.setFormatter(logging.Formatter(
-            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-        ))
-        file_handler.setLevel(logging.INFO)
-        app.logger.addHandler(file_handler)
-
-        app.logger.setLevel(logging.INFO)
-        app.logger.info('湖湘文化平台启动')
\ No newline at end of file
+        file_handler.setFormatter(JsonFormatter())
+        file_handler.setLevel(level)
+        handlers.append(file_handler)
+
+    if app.debug or app.testing:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter('[%(asctime)s] %(levelname)s in %(module)s: %(message)s'))
+        handlers.append(console_handler)
+
+    handler = AsyncQueueHandler(queue.Queue(app.config.get('LOG_QUEUE_SIZE', 10000)), handlers)
+    handler.addFilter(RequestContextFilter(app.config.get('LOG_SAMPLE_RATE', 1.0)))
+    handler.start()
+    atexit.register(handler.stop)
+
+    # Flask 默认的控制台处理器是同步写入的，改由后台线程输出
+    app.logger.removeHandler(default_handler)
+    app.logger.addHandler(handler)
+    app.logger.setLevel(logging.DEBUG if app.debug else level)
+    app.extensions['log_handler'] = handler
+
+    app.logger.info('湖湘文化平台启动')
+    return handler
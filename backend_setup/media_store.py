@@ -0,0 +1,251 @@
+import hashlib
+import html
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.sansio.multipart import NEED_DATA, Data, Epilogue, Field, File, MultipartDecoder
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow 为可选依赖，未安装时不生成缩略图，直接使用原图
+    Image = None
+
+
+CHUNK_SIZE = 64 * 1024
+
+# 允许上传的图片类型：按文件头识别，不信任客户端提供的文件名和 Content-Type
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+
+MEDIA_NAME_RE = re.compile(r'^[0-9a-f]{64}\.(jpg|png|gif|webp)$')
+
+
+class MediaError(ValueError):
+    """上传的文件无法保存"""
+
+
+class MediaTooLarge(MediaError):
+    """上传的文件超过大小限制"""
+
+
+class UnsupportedMedia(MediaError):
+    """不支持的文件类型"""
+
+
+def detect_image_type(head):
+    for signature, ext in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+class MultipartFileStream:
+    """
+    从 multipart/form-data 请求体中增量解析指定文件字段，提供 read(size) 接口。
+    与 request.files 不同，不会先把整个请求体解析并暂存到临时文件，读取多少就解析多少；
+    找不到该字段时读到空内容。
+    """
+
+    def __init__(self, stream, boundary, field_name='file'):
+        self._stream = stream
+        self._decoder = MultipartDecoder(boundary.encode('latin-1'))
+        self._field_name = field_name
+        self._buffer = bytearray()
+        self._in_file = False
+        self._done = False
+
+    def _pump(self):
+        event = self._decoder.next_event()
+        if event is NEED_DATA:
+            chunk = self._stream.read(CHUNK_SIZE)
+            if not chunk:
+                # 请求体已结束（可能不完整），不再等待后续数据
+                self._done = True
+                return
+            self._decoder.receive_data(chunk)
+        elif isinstance(event, File):
+            self._in_file = event.name == self._field_name
+        elif isinstance(event, Field):
+            self._in_file = False
+        elif isinstance(event, Data):
+            if self._in_file:
+                self._buffer += event.data
+                if not event.more_data:
+                    # 只取第一个匹配的文件字段，剩余部分不再解析
+                    self._done = True
+        elif isinstance(event, Epilogue):
+            self._done = True
+
+    def read(self, size=CHUNK_SIZE):
+        while not self._done and len(self._buffer) < size:
+            self._pump()
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+
+class MediaStore:
+    """
+    本地图片存储。
+    文件以内容的 SHA-256 命名（originals/ab/<摘要>.<扩展名>），相同图片只保存一份，
+    文件名即内容指纹，因此可以用长期缓存头提供下载。
+    上传时边读取边计算摘要并写入临时文件，不把整个文件读入内存；
+    缩略图由后台线程按配置的尺寸生成（需要 Pillow），生成前请求缩略图时返回原图。
+    """
+
+    def __init__(self, root, thumbnail_sizes=(160, 480), max_bytes=10 * 1024 * 1024, workers=1, logger=None):
+        self.root = root
+        self.thumbnail_sizes = tuple(thumbnail_sizes)
+        self.max_bytes = max_bytes
+        self.logger = logger
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='thumbnail')
+        self._pending = set()
+        self._lock = threading.Lock()
+        for directory in ('originals', 'thumbs', 'tmp'):
+            os.makedirs(os.path.join(root, directory), exist_ok=True)
+        if Image is None and self.thumbnail_sizes and logger:
+            logger.error('未安装 Pillow，上传的图片不会生成缩略图（%s），请执行 pip install Pillow',
+                         ','.join(str(size) for size in self.thumbnail_sizes))
+
+    def original_path(self, name):
+        return os.path.join(self.root, 'originals', name[:2], name)
+
+    def thumbnail_path(self, name, size):
+        return os.path.join(self.root, 'thumbs', str(size), name[:2], name)
+
+    def save_stream(self, stream):
+        """
+        保存上传的图片流，返回 (文件名, 是否新文件)。
+        超过大小限制抛出 MediaTooLarge，不是图片抛出 UnsupportedMedia。
+        """
+        digest = hashlib.sha256()
+        size = 0
+        ext = None
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.root, 'tmp'))
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    if ext is None:
+                        ext = detect_image_type(chunk[:16])
+                        if ext is None:
+                            raise UnsupportedMedia('仅支持 JPEG、PNG、GIF、WEBP 图片')
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise MediaTooLarge(f'文件大小超过 {self.max_bytes // (1024 * 1024)}MB 限制')
+                    digest.update(chunk)
+                    tmp.write(chunk)
+            if ext is None:
+                raise UnsupportedMedia('上传的文件为空')
+
+            name = f'{digest.hexdigest()}.{ext}'
+            path = self.original_path(name)
+            if os.path.exists(path):
+                return name, False
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+            tmp_path = None
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        self.schedule_thumbnails(name)
+        return name, True
+
+    def schedule_thumbnails(self, name):
+        """在后台生成缺失的缩略图；同一图片不会重复排队"""
+        if Image is None:
+            return
+        with self._lock:
+            if name in self._pending:
+                return
+            self._pending.add(name)
+        self._executor.submit(self._generate_thumbnails, name)
+
+    def _generate_thumbnails(self, name):
+        try:
+            source = self.original_path(name)
+            with Image.open(source) as original:
+                image_format = original.format
+                # 按 EXIF 方向信息旋转，缩略图不再携带方向标记
+                image = ImageOps.exif_transpose(original)
+                for size in self.thumbnail_sizes:
+                    target = self.thumbnail_path(name, size)
+                    if os.path.exists(target):
+                        continue
+                    thumbnail = image.copy()
+                    thumbnail.thumbnail((size, size))
+                    if image_format == 'JPEG' and thumbnail.mode not in ('RGB', 'L'):
+                        thumbnail = thumbnail.convert('RGB')
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    tmp_path = f'{target}.{os.getpid()}.tmp'
+                    thumbnail.save(tmp_path, format=image_format)
+                    os.replace(tmp_path, target)
+        except Exception as e:
+            if self.logger:
+                self.logger.error('生成缩略图 %s 时出错: %s', name, e)
+        finally:
+            with self._lock:
+                self._pending.discard(name)
+
+    def resolve(self, name, size=None):
+        """
+        返回 (文件路径, 是否为请求的最终版本)，文件不存在时返回 (None, False)。
+        请求的缩略图尚未生成时返回原图并安排生成，调用方此时不应设置长期缓存。
+        """
+        original = self.original_path(name)
+        if not os.path.exists(original):
+            return None, False
+        if size is None:
+            return original, True
+        thumbnail = self.thumbnail_path(name, size)
+        if os.path.exists(thumbnail):
+            return thumbnail, True
+        self.schedule_thumbnails(name)
+        return original, False
+
+
+# 头像配色（饱和度适中，白色文字可读）
+AVATAR_COLORS = (
+    '#c0392b', '#d35400', '#b9770e', '#27ae60', '#16a085',
+    '#2980b9', '#8e44ad', '#2c3e50', '#a93226', '#1e8449'
+)
+
+
+def avatar_svg(seed, size=100):
+    """
+    根据种子确定性地生成头像：5×5 左右对称的色块图案，中间叠加种子的首字符。
+    相同种子总是得到相同的图片，无需存储，也不依赖外部服务。
+    """
+    digest = hashlib.sha256(seed.encode('utf-8')).digest()
+    color = AVATAR_COLORS[digest[0] % len(AVATAR_COLORS)]
+    cell = size / 5
+    cells = []
+    for row in range(5):
+        for col in range(3):
+            if digest[1 + row * 3 + col] % 2:
+                for x in ((col,) if col == 2 else (col, 4 - col)):
+                    cells.append(
+                        f'<rect x="{x * cell:g}" y="{row * cell:g}" width="{cell:g}" height="{cell:g}" '
+                        f'fill="#ffffff" fill-opacity="0.18"/>'
+                    )
+    initial = html.escape(seed[:1].upper() or '?')
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{size}" height="{size}" viewBox="0 0 {size} {size}">'
+        f'<rect width="{size}" height="{size}" fill="{color}"/>'
+        f'{"".join(cells)}'
+        f'<text x="50%" y="50%" dy=".35em" text-anchor="middle" font-family="sans-serif" '
+        f'font-size="{size * 0.45:g}" fill="#ffffff">{initial}</text>'
+        f'</svg>'
+    )
@@ -0,0 +1,147 @@
+import json
+import os
+import queue
+import threading
+
+
+class Subscription:
+    """
+    一个实时连接的事件队列。
+    队列有界：客户端消费过慢导致队列已满时丢弃新事件并标记 overflowed，
+    由连接方断开，客户端重连后从持久化的收件箱补齐，不会丢失通知。
+    """
+
+    def __init__(self, user_id, max_queue=100):
+        self.user_id = user_id
+        self.overflowed = False
+        self._queue = queue.Queue(maxsize=max_queue)
+
+    def put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        """等待下一个事件，超时返回 None"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class LocalBroker:
+    """
+    进程内发布/订阅：按用户ID把事件投递给本进程中该用户的所有实时连接。
+    仅适用于单进程部署；多个 worker 时应使用 RedisBroker，否则只有连接在同一进程的客户端能实时收到。
+    """
+
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id, self.max_queue)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscribers[subscription.user_id]
+
+    def connection_count(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscribers.values())
+
+    def deliver(self, user_id, event):
+        with self._lock:
+            subscriptions = list(self._subscribers.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.put(event)
+
+    def publish(self, user_id, event):
+        self.deliver(user_id, event)
+
+    def close(self):
+        pass
+
+
+class RedisBroker(LocalBroker):
+    """
+    通过 Redis 发布/订阅在多个 worker 之间转发事件：
+    publish 发送到 Redis 频道，每个进程有一个后台线程订阅所有通知频道，收到后投递给本进程的连接。
+    """
+
+    def __init__(self, url, max_queue=100, prefix='notifications:', logger=None):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('使用 Redis 通知代理需要安装 redis 包: pip install redis')
+        super().__init__(max_queue)
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.logger = logger
+        self._pubsub = None
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_listening(self):
+        # fork 之后后台线程不会被继承，按进程号判断是否需要重新订阅
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            self._pubsub.psubscribe(f'{self.prefix}*')
+            self._thread = threading.Thread(target=self._listen, args=(self._pubsub,), name='notification-broker', daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def _listen(self, pubsub):
+        try:
+            for message in pubsub.listen():
+                if message.get('type') != 'pmessage':
+                    continue
+                channel = message['channel'].decode('utf-8')
+                try:
+                    user_id = int(channel[len(self.prefix):])
+                    self.deliver(user_id, json.loads(message['data']))
+                except ValueError:
+                    continue
+        except Exception as e:
+            if self.logger:
+                self.logger.error('通知订阅连接中断: %s', e)
+
+    def subscribe(self, user_id):
+        self._ensure_listening()
+        return super().subscribe(user_id)
+
+    def publish(self, user_id, event):
+        self.client.publish(f'{self.prefix}{user_id}', json.dumps(event, ensure_ascii=False, default=str))
+
+    def close(self):
+        if self._pubsub is not None:
+            self._pubsub.close()
+            self._pubsub = None
+
+
+def create_notification_broker(config, logger=None):
+    """
+    根据配置创建通知代理：
+    NOTIFICATION_BROKER 可选 memory（进程内）/ redis（多 worker 共享，需配置 NOTIFICATION_REDIS_URL）。
+    """
+    backend_name = config.get('NOTIFICATION_BROKER', 'memory')
+    max_queue = config.get('NOTIFICATION_QUEUE_SIZE', 100)
+    if backend_name == 'memory':
+        return LocalBroker(max_queue=max_queue)
+    if backend_name == 'redis':
+        return RedisBroker(config['NOTIFICATION_REDIS_URL'], max_queue=max_queue, logger=logger)
+    raise ValueError(f'未知的通知代理: {backend_name}')
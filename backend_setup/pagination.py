@@ -0,0 +1,98 @@
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+
+# 游标分页默认与最大每页数量
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+class InvalidCursor(ValueError):
+    """游标无法解析"""
+
+
+class KeysetPage:
+    """游标分页结果"""
+
+    def __init__(self, items, next_cursor, has_more):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.has_more = has_more
+
+
+def encode_cursor(timestamp, row_id):
+    """把 (时间, id) 编码为不透明的URL安全游标；排序列也可以是数值（如热度分）"""
+    value = timestamp.isoformat() if isinstance(timestamp, datetime) else timestamp
+    payload = json.dumps([value, row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """解析游标，返回 (datetime 或数值, id)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp)
+        elif isinstance(timestamp, bool) or not isinstance(timestamp, (int, float)):
+            raise TypeError(timestamp)
+        return timestamp, int(row_id)
+    except (ValueError, TypeError, UnicodeError):
+        raise InvalidCursor(cursor)
+
+
+def parse_keyset_args(args):
+    """
+    解析游标分页参数。
+    仅当请求携带 cursor 或 limit 参数时启用游标模式，否则返回 None 以保持原有页码分页行为。
+    返回 (cursor, limit, with_total)
+    """
+    if 'cursor' not in args and 'limit' not in args:
+        return None
+    cursor = args.get('cursor') or None
+    limit = args.get('limit', DEFAULT_LIMIT, type=int) or DEFAULT_LIMIT
+    limit = max(1, min(limit, MAX_LIMIT))
+    with_total = args.get('with_total', '').lower() in ('1', 'true', 'yes')
+    return cursor, limit, with_total
+
+
+def keyset_paginate(query, time_column, id_column, cursor=None, limit=DEFAULT_LIMIT, descending=True, key=None):
+    """
+    基于 (时间, id) 的游标分页，time_column 也可以是其他排序列（如热度分、点赞数）。
+    time_column 为列表达式（如 likes_count + 0）时，用 key 指定从结果对象上读取排序值的属性名。
+    使用复合条件代替 OFFSET，每页只扫描 limit+1 行，不执行 COUNT(*)，需要 (排序列, id) 上的复合索引支撑。
+    """
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        # 游标必须来自同一排序方式，时间游标不能用于数值排序列，反之亦然
+        if isinstance(timestamp, datetime) != issubclass(time_column.type.python_type, datetime):
+            raise InvalidCursor(cursor)
+        if descending:
+            query = query.filter(or_(
+                time_column < timestamp,
+                and_(time_column == timestamp, id_column < row_id)
+            ))
+        else:
+            query = query.filter(or_(
+                time_column > timestamp,
+                and_(time_column == timestamp, id_column > row_id)
+            ))
+
+    if descending:
+        query = query.order_by(time_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(time_column.asc(), id_column.asc())
+
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    items = rows[:limit]
+
+    next_cursor = None
+    if has_more and items:
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, key or time_column.key), getattr(last, id_column.key))
+
+    return KeysetPage(items, next_cursor, has_more)
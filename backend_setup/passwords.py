@@ -0,0 +1,100 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HasherBusy(RuntimeError):
+    """等待中的密码校验任务过多，请稍后重试"""
+
+
+class PasswordHasher:
+    """
+    可配置强度的密码哈希。
+    method 使用 werkzeug 的格式，例如 pbkdf2:sha256:600000 或 scrypt:32768:8:1。
+    workers 大于0时，哈希计算交给有界的线程池（hashlib 计算期间释放 GIL）或进程池执行，
+    同时执行的哈希数不超过 workers，等待中的任务超过 max_pending 时抛出 HasherBusy，
+    避免登录高峰占满 worker 的所有请求线程；workers 为0时在请求线程中直接计算。
+    """
+
+    def __init__(self, method='pbkdf2:sha256:600000', workers=0, max_pending=64, executor='thread'):
+        self.method = method
+        # 按当前参数生成的哈希前缀（如 pbkdf2:sha256:600000），用于判断旧哈希是否需要升级；
+        # 参数不完整时（如只写 pbkdf2）由 werkzeug 补全默认值，需要实际计算一次哈希
+        name = method.split(':', 1)[0]
+        if method.count(':') == {'pbkdf2': 2, 'scrypt': 3}.get(name):
+            self.prefix = method
+        else:
+            self.prefix = generate_password_hash('', method=method).split('$', 1)[0]
+        self.workers = workers
+        self.max_pending = max_pending
+        self.executor_type = executor
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(workers + max_pending) if workers > 0 else None
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    if self.executor_type == 'process':
+                        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                    else:
+                        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+        return self._executor
+
+    def _run(self, fn, *args):
+        if self._slots is None:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            return self._get_executor().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        if not pwhash:
+            return False
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """哈希参数与当前配置不同（算法或迭代次数变化）时返回 True"""
+        return bool(pwhash) and pwhash.split('$', 1)[0] != self.prefix
+
+    def rehash_async(self, password, on_done):
+        """
+        在后台按当前参数重新计算哈希，完成后调用 on_done(新哈希)。
+        不占用请求线程；等待队列已满时放弃本次升级，下次登录再尝试。
+        """
+        if self._slots is None:
+            on_done(generate_password_hash(password, method=self.method))
+            return
+        if not self._slots.acquire(blocking=False):
+            return
+        future = self._get_executor().submit(generate_password_hash, password, self.method)
+
+        def callback(done):
+            self._slots.release()
+            if done.exception() is None:
+                on_done(done.result())
+
+        future.add_done_callback(callback)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+def create_password_hasher(config):
+    """根据配置创建密码哈希器"""
+    return PasswordHasher(
+        method=config['PASSWORD_HASH_METHOD'],
+        workers=config['PASSWORD_HASH_WORKERS'],
+        max_pending=config['PASSWORD_HASH_MAX_PENDING'],
+        executor=config['PASSWORD_HASH_EXECUTOR']
+    )
@@ -0,0 +1,45 @@
+import math
+import re
+from datetime import datetime, timedelta
+
+
+# 热度分的时间基准与衰减：发布时间每晚 DECAY_SECONDS 秒，分数加1，相当于互动量乘以10
+EPOCH = datetime(2024, 1, 1)
+DECAY_SECONDS = 45000
+
+# 各类互动的权重：评论比点赞更能说明讨论热度，浏览量只作少量加成
+LIKE_WEIGHT = 2.0
+COMMENT_WEIGHT = 3.0
+VIEW_WEIGHT = 0.1
+
+WINDOW_RE = re.compile(r'^(\d{1,4})([hd])$')
+
+
+class InvalidWindow(ValueError):
+    """时间窗口参数无法解析"""
+
+
+def engagement(likes, comments, views):
+    return (likes or 0) * LIKE_WEIGHT + (comments or 0) * COMMENT_WEIGHT + (views or 0) * VIEW_WEIGHT
+
+
+def hot_score(likes, comments, views, created_at):
+    """
+    热度分：log10(互动量) + 发布时间 / DECAY_SECONDS。
+    时间项只取决于发布时间，因此分数只需在互动数变化时重算，不必定期全表刷新；
+    新帖天然排在同等互动量的旧帖之前，旧帖需要多出数量级的互动才能保持靠前。
+    """
+    order = math.log10(max(engagement(likes, comments, views), 1))
+    seconds = (created_at - EPOCH).total_seconds()
+    return round(order + seconds / DECAY_SECONDS, 7)
+
+
+def parse_window(value):
+    """解析 top 排序的时间窗口（如 24h、7d），all 或未提供时返回 None 表示不限时间"""
+    if not value or value == 'all':
+        return None
+    match = WINDOW_RE.match(value)
+    if not match or int(match.group(1)) == 0:
+        raise InvalidWindow(value)
+    amount = int(match.group(1))
+    return timedelta(hours=amount) if match.group(2) == 'h' else timedelta(days=amount)
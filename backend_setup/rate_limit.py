@@ -0,0 +1,161 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+def parse_limit(value):
+    """解析限流规则 "次数/秒数"，例如 "20/60" 表示每60秒最多20次"""
+    count, seconds = str(value).split('/', 1)
+    return int(count), int(seconds)
+
+
+def _estimate(prev, curr, elapsed, window):
+    # 滑动窗口近似：上一固定窗口的计数按未过去的比例折算，加上当前窗口的计数
+    return prev * (1 - elapsed / window) + curr
+
+
+def _retry_after(prev, curr, elapsed, window, limit):
+    """再发起一次请求不超限需要等待的秒数"""
+    if curr + 1 <= limit:
+        # 当前窗口内等待上一窗口的权重衰减
+        wait = window * (1 - (limit - curr - 1) / prev) - elapsed if prev else 0
+    else:
+        # 需要等到下一窗口，届时当前窗口的计数成为“上一窗口”
+        wait = (window - elapsed) + window * (1 - (limit - 1) / curr)
+    return max(1, math.ceil(wait))
+
+
+class MemoryRateLimitStore:
+    """
+    进程内滑动窗口计数，每个键只保存 (窗口序号, 当前窗口计数, 上一窗口计数)。
+    键数量超过 max_keys 时淘汰最久未访问的键；仅适用于单进程部署，多个 worker 时各进程分别计数。
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _counts(self, key, index):
+        entry = self._windows.get(key)
+        if entry is None:
+            return 0, 0
+        if entry[0] == index:
+            return entry[1], entry[2]
+        if entry[0] == index - 1:
+            return 0, entry[1]
+        return 0, 0
+
+    def hit(self, key, limit, window, now):
+        index, elapsed = divmod(now, window)
+        with self._lock:
+            curr, prev = self._counts(key, index)
+            if _estimate(prev, curr, elapsed, window) + 1 > limit:
+                return False, _retry_after(prev, curr, elapsed, window, limit)
+            self._windows[key] = (index, curr + 1, prev)
+            self._windows.move_to_end(key)
+            if len(self._windows) > self.max_keys:
+                self._windows.popitem(last=False)
+        return True, 0
+
+    def peek(self, key, limit, window, now):
+        index, elapsed = divmod(now, window)
+        with self._lock:
+            curr, prev = self._counts(key, index)
+        if _estimate(prev, curr, elapsed, window) + 1 > limit:
+            return False, _retry_after(prev, curr, elapsed, window, limit)
+        return True, 0
+
+    def reset(self, key, window, now):
+        with self._lock:
+            self._windows.pop(key, None)
+
+
+class RedisRateLimitStore:
+    """
+    Redis 协议的滑动窗口计数，所有 worker 共享。
+    每个固定窗口一个计数键，过期时间为两个窗口长度；超限的请求不计入次数。
+    """
+
+    def __init__(self, url, prefix='rate_limit:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('使用 Redis 限流存储需要安装 redis 包: pip install redis')
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def _keys(self, key, index):
+        return f'{self.prefix}{key}:{int(index)}', f'{self.prefix}{key}:{int(index) - 1}'
+
+    def hit(self, key, limit, window, now):
+        index, elapsed = divmod(now, window)
+        curr_key, prev_key = self._keys(key, index)
+        pipe = self.client.pipeline()
+        pipe.incr(curr_key)
+        pipe.expire(curr_key, window * 2)
+        pipe.get(prev_key)
+        curr, _, prev = pipe.execute()
+        prev = int(prev or 0)
+        if _estimate(prev, curr, elapsed, window) > limit:
+            self.client.decr(curr_key)
+            return False, _retry_after(prev, curr - 1, elapsed, window, limit)
+        return True, 0
+
+    def peek(self, key, limit, window, now):
+        index, elapsed = divmod(now, window)
+        curr, prev = (int(value or 0) for value in self.client.mget(self._keys(key, index)))
+        if _estimate(prev, curr, elapsed, window) + 1 > limit:
+            return False, _retry_after(prev, curr, elapsed, window, limit)
+        return True, 0
+
+    def reset(self, key, window, now):
+        # 只需清除参与估算的当前与上一窗口
+        self.client.delete(*self._keys(key, now // window))
+
+
+class RateLimiter:
+    """
+    限流器：按 (键, 次数, 窗口秒数) 计数。
+    hit() 计入一次并判断是否超限；peek() 只判断再来一次是否会超限，不计数，
+    用于“只统计失败次数”的规则（如按用户名统计登录失败）。
+    返回 (是否允许, 需等待的秒数)。
+    """
+
+    def __init__(self, store, enabled=True):
+        self.store = store
+        self.enabled = enabled
+
+    @staticmethod
+    def _key(key, window):
+        return f'{key}:{window}'
+
+    def hit(self, key, limit, window):
+        if not self.enabled:
+            return True, 0
+        return self.store.hit(self._key(key, window), limit, window, time.time())
+
+    def peek(self, key, limit, window):
+        if not self.enabled:
+            return True, 0
+        return self.store.peek(self._key(key, window), limit, window, time.time())
+
+    def reset(self, key, window):
+        if self.enabled:
+            self.store.reset(self._key(key, window), window, time.time())
+
+
+def create_rate_limiter(config):
+    """
+    根据配置创建限流器：
+    RATE_LIMIT_BACKEND 可选 memory / redis，RATE_LIMIT_ENABLED 为 False 时不限流。
+    """
+    backend_name = config.get('RATE_LIMIT_BACKEND', 'memory')
+    if backend_name == 'memory':
+        store = MemoryRateLimitStore(max_keys=config.get('RATE_LIMIT_MAX_KEYS', 100000))
+    elif backend_name == 'redis':
+        store = RedisRateLimitStore(config['RATE_LIMIT_REDIS_URL'])
+    else:
+        raise ValueError(f'未知的限流存储: {backend_name}')
+    return RateLimiter(store, enabled=config.get('RATE_LIMIT_ENABLED', True))
@@ -0,0 +1,157 @@
+import csv
+import hashlib
+import io
+import json
+import os
+import time
+
+
+# 导入导出的字段
+EXPORT_FIELDS = ['title', 'description', 'category', 'image_url', 'tags', 'created_date', 'author']
+
+
+def content_hash(title, description):
+    """资源内容指纹：标题与描述规范化空白后计算 SHA-256，用于导入去重"""
+    normalized = ' '.join((title or '').split()) + '\x00' + ' '.join((description or '').split())
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def detect_format(filename, default='jsonl'):
+    """按文件扩展名判断格式：.csv 为 CSV，.jsonl/.ndjson/.json 为 JSON Lines"""
+    ext = os.path.splitext(filename or '')[1].lower()
+    if ext == '.csv':
+        return 'csv'
+    if ext in ('.jsonl', '.ndjson', '.json'):
+        return 'jsonl'
+    return default
+
+
+def iter_records(stream, fmt):
+    """
+    逐条读取文本流中的记录，不把整个文件读入内存。
+    JSON Lines 中无法解析的行以 None 占位，保证记录序号与断点续传计数一致。
+    """
+    if fmt == 'csv':
+        for row in csv.DictReader(stream):
+            yield row
+        return
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield record if isinstance(record, dict) else None
+
+
+def open_text_stream(binary_stream):
+    """把二进制流包装为 UTF-8 文本流（兼容带 BOM 的文件）"""
+    return io.TextIOWrapper(binary_stream, encoding='utf-8-sig', newline='')
+
+
+class Checkpoint:
+    """
+    导入断点：记录已处理（已提交）的记录数，重新执行时跳过这些记录。
+    断点与源文件的大小和修改时间绑定，文件变化后断点自动失效。
+    """
+
+    def __init__(self, path, source_path):
+        self.path = path
+        stat = os.stat(source_path)
+        self.source = {'path': os.path.abspath(source_path), 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+    def load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return 0
+        if data.get('source') != self.source:
+            return 0
+        return int(data.get('processed', 0))
+
+    def save(self, processed):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'source': self.source, 'processed': processed}, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class ImportStats:
+    """导入进度统计"""
+
+    def __init__(self, skipped_before=0):
+        self.processed = skipped_before
+        self.imported = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.started = time.time()
+
+    @property
+    def rate(self):
+        elapsed = time.time() - self.started
+        return self.imported / elapsed if elapsed > 0 else 0.0
+
+    def to_dict(self):
+        return {
+            'processed': self.processed,
+            'imported': self.imported,
+            'duplicates': self.duplicates,
+            'invalid': self.invalid,
+            'rate': round(self.rate, 1)
+        }
+
+
+def run_import(records, write_batch, batch_size=1000, skip=0, on_batch=None):
+    """
+    分批导入流程：跳过前 skip 条记录，其余按 batch_size 分块交给 write_batch。
+    write_batch(records, stats) 负责校验、去重并在一个事务内写入该批记录；
+    每批提交后调用 on_batch(stats)，可用于输出进度和保存断点。
+    """
+    stats = ImportStats(skipped_before=skip)
+    batch = []
+    for index, record in enumerate(records):
+        if index < skip:
+            continue
+        batch.append(record)
+        if len(batch) >= batch_size:
+            write_batch(batch, stats)
+            stats.processed += len(batch)
+            batch = []
+            if on_batch:
+                on_batch(stats)
+    if batch:
+        write_batch(batch, stats)
+        stats.processed += len(batch)
+        if on_batch:
+            on_batch(stats)
+    return stats
+
+
+def export_jsonl(rows):
+    """把 (字段字典) 序列逐行编码为 JSON Lines"""
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def export_csv(rows, fields=EXPORT_FIELDS):
+    """把 (字段字典) 序列逐行编码为 CSV，首行为表头"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields)
+    writer.writeheader()
+    yield buffer.getvalue()
+    for row in rows:
+        buffer.seek(0)
+        buffer.truncate(0)
+        if isinstance(row.get('tags'), list):
+            row = dict(row, tags=','.join(row['tags']))
+        writer.writerow(row)
+        yield buffer.getvalue()
@@ -0,0 +1,169 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import request, make_response
+
+
+class RedisCacheTier:
+    """
+    可选的共享缓存层（Redis 协议），多个 worker 共享缓存内容与标签版本号。
+    标签版本号参与缓存键的计算，失效时只需递增版本号，旧键自然不再命中并随 TTL 过期。
+    """
+
+    def __init__(self, url, prefix='resp:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('使用共享响应缓存需要安装 redis 包: pip install redis')
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        data = self.client.get(self.prefix + key)
+        if data is None:
+            return None
+        header, body = data.split(b'\n', 1)
+        return json.loads(header), body
+
+    def set(self, key, meta, body, ttl):
+        self.client.set(self.prefix + key, json.dumps(meta).encode('utf-8') + b'\n' + body, ex=ttl)
+
+    def get_versions(self, tags):
+        values = self.client.mget([self.prefix + 'tag:' + tag for tag in tags])
+        return [int(value or 0) for value in values]
+
+    def bump_versions(self, tags):
+        pipe = self.client.pipeline()
+        for tag in tags:
+            pipe.incr(self.prefix + 'tag:' + tag)
+        pipe.execute()
+
+
+class ResponseCache:
+    """
+    公共读接口的响应缓存。
+    缓存键由请求路径、规范化后的查询参数以及各标签的版本号组成；
+    进程内为有界 LRU，可选共享层；写操作按标签精确失效。
+    命中与未命中的响应都带 ETag，客户端携带 If-None-Match 时返回 304。
+    """
+
+    def __init__(self, max_entries=512, default_ttl=60, redis_url=None, enabled=True):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.enabled = enabled
+        self.shared = RedisCacheTier(redis_url) if redis_url else None
+        self._entries = OrderedDict()
+        self._tag_keys = {}
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def _tag_versions(self, tags):
+        if self.shared:
+            return self.shared.get_versions(tags)
+        return [self._versions.get(tag, 0) for tag in tags]
+
+    def _make_key(self, tags):
+        args = urlencode(sorted(request.args.items(multi=True)))
+        versions = ','.join(f'{tag}={version}' for tag, version in zip(tags, self._tag_versions(tags)))
+        return f'{request.path}?{args}#{versions}'
+
+    def _get_local(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[0], entry[1]
+
+    def _set_local(self, key, meta, body, ttl, tags):
+        with self._lock:
+            self._entries[key] = (meta, body, time.time() + ttl, tags)
+            self._entries.move_to_end(key)
+            for tag in tags:
+                self._tag_keys.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        # 调用方需持有锁
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[3]:
+            keys = self._tag_keys.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tag_keys[tag]
+
+    def invalidate(self, *tags):
+        """按标签失效：递增标签版本号并删除本进程中带该标签的缓存项"""
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+                for key in list(self._tag_keys.get(tag, ())):
+                    self._remove(key)
+        if self.shared:
+            self.shared.bump_versions(tags)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tag_keys.clear()
+
+    @staticmethod
+    def _respond(meta, body, cache_status):
+        response = make_response(body, meta['status'])
+        response.mimetype = meta['mimetype']
+        response.set_etag(meta['etag'])
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Cache'] = cache_status
+        return response.make_conditional(request)
+
+    def cached(self, ttl=None, tags=None):
+        """
+        缓存 GET 请求的响应，其他方法直接透传。
+        tags 为标签列表，或接收视图参数并返回标签列表的函数。
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.enabled or request.method != 'GET':
+                    return view(*args, **kwargs)
+
+                view_tags = tags(**kwargs) if callable(tags) else list(tags or [])
+                key = self._make_key(view_tags)
+
+                cached = self._get_local(key)
+                if cached is None and self.shared:
+                    cached = self.shared.get(key)
+                    if cached is not None:
+                        self._set_local(key, cached[0], cached[1], ttl or self.default_ttl, view_tags)
+                if cached is not None:
+                    return self._respond(cached[0], cached[1], 'HIT')
+
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.direct_passthrough:
+                    return response
+
+                body = response.get_data()
+                meta = {
+                    'status': response.status_code,
+                    'mimetype': response.mimetype,
+                    'etag': hashlib.sha1(body).hexdigest()
+                }
+                entry_ttl = ttl or self.default_ttl
+                self._set_local(key, meta, body, entry_ttl, view_tags)
+                if self.shared:
+                    self.shared.set(key, meta, body, entry_ttl)
+                return self._respond(meta, body, 'MISS')
+            return wrapper
+        return decorator
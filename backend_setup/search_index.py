@@ -0,0 +1,171 @@
+import os
+import re
+import sqlite3
+from contextlib import closing
+
+
+# 文档类型编码，用于把 (类型, id) 映射为 FTS5 的 rowid，使增量更新可以按主键定位
+DOC_TYPES = {'resource': 0, 'post': 1}
+DOC_TYPE_NAMES = {code: name for name, code in DOC_TYPES.items()}
+
+# 字段权重：标题 > 标签 > 正文（FTS5 的 bm25 分值越小越相关）
+BM25_WEIGHTS = (10.0, 1.0, 5.0)
+
+# 中日韩统一表意文字（含扩展A区与兼容区）
+_CJK_RUN = r'[㐀-䶿一-鿿豈-﫿]+'
+_TOKEN_RE = re.compile(rf'({_CJK_RUN})|([0-9A-Za-z]+)')
+
+
+def tokenize(text, for_index=False):
+    """
+    分词：连续的汉字切分为二元组（单字成词时保留单字），字母数字按词切分并转为小写。
+    例如 "湖南花鼓戏" -> ["湖南", "南花", "花鼓", "鼓戏"]
+    for_index 为 True 时（写入索引）额外保留每段汉字的末字，例如 "湖南花鼓戏" 还会产生 "戏"，
+    使单字查询的前缀匹配能命中位于段尾的汉字（其余位置的汉字都是某个二元组的首字）。
+    """
+    tokens = []
+    for cjk, word in _TOKEN_RE.findall(text or ''):
+        if cjk:
+            if len(cjk) == 1:
+                tokens.append(cjk)
+            else:
+                tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+                if for_index:
+                    tokens.append(cjk[-1])
+        else:
+            tokens.append(word.lower())
+    return tokens
+
+
+def _build_match_query(query):
+    """
+    把用户输入转换为 FTS5 MATCH 表达式，所有词元需同时命中。
+    单个汉字使用前缀匹配：命中以该字开头的二元组，或索引中保留的段尾单字。
+    """
+    terms = []
+    for token in dict.fromkeys(tokenize(query)):
+        if len(token) == 1 and re.match(_CJK_RUN, token):
+            terms.append(f'"{token}"*')
+        else:
+            terms.append(f'"{token}"')
+    return ' '.join(terms)
+
+
+def _rowid(doc_type, doc_id):
+    return int(doc_id) * len(DOC_TYPES) + DOC_TYPES[doc_type]
+
+
+class SearchIndex:
+    """
+    基于 SQLite FTS5 的本地全文索引。
+    索引存放在独立的 SQLite 文件中，多个 worker 进程共享同一份索引，无需外部搜索服务。
+    文本在写入前预先切分为二元组，再由 FTS5 的 unicode61 分词器按空白切分并计算 BM25。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with closing(self._connect()) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE VIRTUAL TABLE IF NOT EXISTS documents USING fts5('
+                'title, body, tags, tokenize="unicode61")'
+            )
+            conn.commit()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    @staticmethod
+    def _row(doc_type, doc_id, title, body, tags):
+        return (
+            _rowid(doc_type, doc_id),
+            ' '.join(tokenize(title, for_index=True)),
+            ' '.join(tokenize(body, for_index=True)),
+            ' '.join(tokenize(' '.join(tags or []), for_index=True)),
+        )
+
+    def upsert(self, doc_type, doc_id, title, body, tags=None):
+        """新增或更新单个文档"""
+        with closing(self._connect()) as conn:
+            rowid = _rowid(doc_type, doc_id)
+            conn.execute('DELETE FROM documents WHERE rowid = ?', (rowid,))
+            conn.execute(
+                'INSERT INTO documents (rowid, title, body, tags) VALUES (?, ?, ?, ?)',
+                self._row(doc_type, doc_id, title, body, tags)
+            )
+            conn.commit()
+
+    def upsert_many(self, documents):
+        """在一个事务内新增或更新多个文档，documents 为 (类型, id, 标题, 正文, 标签列表) 序列"""
+        rows = [self._row(*document) for document in documents]
+        if not rows:
+            return
+        with closing(self._connect()) as conn:
+            conn.executemany('DELETE FROM documents WHERE rowid = ?', [(row[0],) for row in rows])
+            conn.executemany('INSERT INTO documents (rowid, title, body, tags) VALUES (?, ?, ?, ?)', rows)
+            conn.commit()
+
+    def delete(self, doc_type, doc_id):
+        """删除单个文档"""
+        with closing(self._connect()) as conn:
+            conn.execute('DELETE FROM documents WHERE rowid = ?', (_rowid(doc_type, doc_id),))
+            conn.commit()
+
+    def rebuild(self, documents, batch_size=1000):
+        """
+        全量重建索引。documents 为 (类型, id, 标题, 正文, 标签列表) 的可迭代对象，按批写入。
+        重建在单个事务内完成，WAL 模式下读请求在提交前仍看到旧索引。
+        """
+        count = 0
+        with closing(self._connect()) as conn:
+            conn.execute('DELETE FROM documents')
+            batch = []
+            for doc_type, doc_id, title, body, tags in documents:
+                batch.append(self._row(doc_type, doc_id, title, body, tags))
+                if len(batch) >= batch_size:
+                    conn.executemany('INSERT INTO documents (rowid, title, body, tags) VALUES (?, ?, ?, ?)', batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                conn.executemany('INSERT INTO documents (rowid, title, body, tags) VALUES (?, ?, ?, ?)', batch)
+                count += len(batch)
+            conn.execute("INSERT INTO documents (documents) VALUES ('optimize')")
+            conn.commit()
+        return count
+
+    def search(self, query, doc_types=None, limit=10, offset=0):
+        """
+        按 BM25 相关度检索，返回 (命中总数, [(类型, id, 分值), ...])，分值越大越相关。
+        doc_types 限定文档类型，例如 ['resource']。
+        """
+        match = _build_match_query(query)
+        if not match:
+            return 0, []
+
+        where = 'documents MATCH ?'
+        params = [match]
+        if doc_types:
+            codes = [DOC_TYPES[doc_type] for doc_type in doc_types]
+            where += f' AND (rowid % {len(DOC_TYPES)}) IN ({",".join("?" * len(codes))})'
+            params.extend(codes)
+
+        with closing(self._connect()) as conn:
+            try:
+                total = conn.execute(f'SELECT count(*) FROM documents WHERE {where}', params).fetchone()[0]
+                rows = conn.execute(
+                    f'SELECT rowid, bm25(documents, ?, ?, ?) AS score FROM documents '
+                    f'WHERE {where} ORDER BY score LIMIT ? OFFSET ?',
+                    [*BM25_WEIGHTS, *params, limit, offset]
+                ).fetchall()
+            except sqlite3.OperationalError:
+                # 非法的查询表达式视为无结果
+                return 0, []
+
+        results = []
+        for rowid, score in rows:
+            doc_id, code = divmod(rowid, len(DOC_TYPES))
+            results.append((DOC_TYPE_NAMES[code], doc_id, -score))
+        return total, results
@@ -0,0 +1,47 @@
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+# 配置在导入时读取环境变量，需在导入 app 之前把数据库、索引、日志和媒体目录指向临时目录
+_WORKDIR = tempfile.mkdtemp(prefix='huxiang_tests_')
+os.environ['DEV_DATABASE_URL'] = 'sqlite:///' + os.path.join(_WORKDIR, 'test.db')
+os.environ['SEARCH_INDEX_PATH'] = os.path.join(_WORKDIR, 'search_index.db')
+os.environ['KNOWLEDGE_GRAPH_PATH'] = os.path.join(_WORKDIR, 'knowledge_graph.json')
+os.environ['LOG_DIR'] = os.path.join(_WORKDIR, 'logs')
+os.environ['MEDIA_ROOT'] = os.path.join(_WORKDIR, 'media')
+os.environ['SQL_PROFILING_ENABLED'] = 'false'
+os.environ['RESPONSE_CACHE_ENABLED'] = 'false'
+os.environ['JWT_BLOCKLIST_BACKEND'] = 'memory'
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import create_app, db
+
+    app = create_app('development')
+    app.logger.disabled = True
+    with app.app_context():
+        db.create_all()
+    yield app
+    shutil.rmtree(_WORKDIR, ignore_errors=True)
+
+
+@pytest.fixture(scope='session')
+def auth_headers(app):
+    """以第一个用户身份访问的请求头；用户在首次使用时创建"""
+    from flask_jwt_extended import create_access_token
+    from app import db, User
+
+    with app.app_context():
+        user = User.query.filter_by(username='tester').first()
+        if user is None:
+            user = User(username='tester', email='tester@example.com', password_hash='')
+            db.session.add(user)
+            db.session.commit()
+        token = create_access_token(identity=user.id)
+    return {'Authorization': f'Bearer {token}'}
@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import (
+    Comment, CulturalResource, Post, User, comment_path_segment, db, iter_search_documents
+)
+from db_metrics import assert_query_budget
+
+# 各接口每个请求允许执行的SQL语句数与返回的条目数无关，出现 N+1 查询时测试失败并列出所有语句。
+# 页码分页另有一次 COUNT；令牌黑名单使用进程内存储（见 conftest），不计入预算
+ITEMS = 15
+
+
+@pytest.fixture(scope='module')
+def seeded(app, auth_headers):
+    """每条帖子、资源、评论各属于不同的作者，并带标签与多层回复，使逐条懒加载必然多出语句"""
+    with app.app_context():
+        authors = [User(username=f'author{i}', email=f'author{i}@example.com', password_hash='') for i in range(ITEMS)]
+        db.session.add_all(authors)
+        db.session.flush()
+        now = datetime.utcnow()
+        for i, author in enumerate(authors):
+            resource = CulturalResource(
+                title=f'湖湘资源{i}', description='岳麓书院与湘绣' * 20, category='历史文化', author_id=author.id,
+                created_date=now - timedelta(minutes=i)
+            )
+            resource.set_tags([f'标签{i}', '湖湘'])
+            db.session.add(resource)
+            db.session.add(Post(
+                title=f'湖湘帖子{i}', content='湖湘文化' * 50, author_id=author.id, created_at=now - timedelta(minutes=i)
+            ))
+        db.session.flush()
+
+        post = Post.query.order_by(Post.id).first()
+        for i, author in enumerate(authors):
+            parent = None
+            # 每条顶层评论带两层回复，回复的作者各不相同
+            for depth in range(3):
+                comment = Comment(
+                    content=f'评论{i}-{depth}', author_id=authors[(i + depth) % ITEMS].id, post_id=post.id,
+                    parent_id=parent.id if parent else None, depth=depth, replies_count=0 if depth == 2 else 1
+                )
+                db.session.add(comment)
+                db.session.flush()
+                comment.path = (parent.path if parent else '') + comment_path_segment(comment.id)
+                parent = comment
+        post.comments_count = ITEMS * 3
+        db.session.commit()
+
+        app.extensions['search_index'].rebuild(iter_search_documents())
+        return post.id
+
+
+@pytest.mark.parametrize('url, budget', [
+    ('/api/posts?per_page=15', 2),
+    ('/api/posts?limit=15', 1),
+    ('/api/posts?limit=15&view=summary', 1),
+    ('/api/posts?limit=15&sort=hot', 1),
+])
+def test_post_list_budget(app, client_get, url, budget):
+    response, statements = client_get(url, budget)
+    assert response.status_code == 200
+    assert len(response.json['posts']) == ITEMS
+
+
+@pytest.mark.parametrize('url, budget', [
+    ('/api/resources?per_page=15', 2),
+    ('/api/resources?limit=15', 1),
+    ('/api/resources?limit=15&view=summary', 1),
+])
+def test_resource_list_budget(app, client_get, url, budget):
+    response, statements = client_get(url, budget)
+    assert response.status_code == 200
+    assert len(response.json['resources']) == ITEMS
+
+
+def test_comment_thread_budget(app, client_get, seeded):
+    # 帖子存在性检查 + 顶层评论一页 + 每展开一层回复一次查询
+    response, statements = client_get(f'/api/posts/{seeded}/comments?limit=15&depth=2', 4)
+    assert response.status_code == 200
+    comments = response.json['comments']
+    assert len(comments) == ITEMS
+    assert all(comment['replies'][0]['replies'] for comment in comments)
+
+
+def test_search_budget(app, client_get):
+    # 命中的资源与帖子各一次批量查询（含作者）
+    response, statements = client_get('/api/search?q=湖湘&per_page=20', 2)
+    assert response.status_code == 200
+    assert len(response.json['results']) == 20
+
+
+@pytest.fixture
+def client_get(app, auth_headers, seeded):
+    client = app.test_client()
+
+    def get(url, budget):
+        with app.app_context(), assert_query_budget(db.engine, budget) as statements:
+            response = client.get(url, headers=auth_headers)
+        return response, statements
+
+    return get
@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_index import SearchIndex
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = SearchIndex(str(tmp_path / 'search_index.db'))
+    index.upsert('post', 1, '访问湖湘', '介绍长沙')
+    return index
+
+
+# 单字查询需命中汉字段的段首、段中与段尾
+@pytest.mark.parametrize('query', ['访', '问', '湖', '湘', '介', '长', '沙'])
+def test_single_cjk_character_matches_any_position(index, query):
+    total, results = index.search(query)
+    assert total == 1
+    assert results[0][:2] == ('post', 1)
+
+
+def test_single_cjk_character_without_match(index):
+    assert index.search('岳') == (0, [])
+
+
+def test_multi_character_query_still_uses_bigrams(index):
+    assert index.search('湖湘')[0] == 1
+    assert index.search('湘湖')[0] == 0
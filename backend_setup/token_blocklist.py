@@ -0,0 +1,140 @@
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+
+class MemoryBlocklist:
+    """
+    进程内黑名单，条目在令牌过期后自动清除。
+    仅适用于单进程部署；多个 worker 时各进程互不可见。
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._expiry_heap = []
+        self._lock = threading.Lock()
+
+    def _purge(self, now):
+        # 按过期时间小顶堆清理，均摊 O(log n)
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            expires_at, jti = heapq.heappop(self._expiry_heap)
+            if self._entries.get(jti) == expires_at:
+                del self._entries[jti]
+
+    def add(self, jti, expires_at):
+        with self._lock:
+            self._purge(time.time())
+            self._entries[jti] = expires_at
+            heapq.heappush(self._expiry_heap, (expires_at, jti))
+
+    def contains(self, jti, expires_at=None):
+        revoked_until = self._entries.get(jti)
+        return revoked_until is not None and revoked_until > time.time()
+
+
+class DatabaseBlocklist:
+    """
+    数据库表黑名单，所有 worker 共享。
+    model 需包含 jti（主键）与 expires_at 两列；每次吊销时顺带删除已过期的记录。
+    """
+
+    def __init__(self, db, model):
+        self.db = db
+        self.model = model
+
+    def add(self, jti, expires_at):
+        model = self.model
+        expires = datetime.fromtimestamp(expires_at, timezone.utc).replace(tzinfo=None)
+        self.db.session.execute(self.db.delete(model).where(model.expires_at <= datetime.utcnow()))
+        self.db.session.merge(model(jti=jti, expires_at=expires))
+        self.db.session.commit()
+
+    def contains(self, jti, expires_at=None):
+        model = self.model
+        row = self.db.session.execute(
+            self.db.select(model.jti).where(model.jti == jti, model.expires_at > datetime.utcnow())
+        ).first()
+        return row is not None
+
+
+class RedisBlocklist:
+    """Redis 协议黑名单，键的 TTL 等于令牌剩余有效期，由 Redis 自动过期"""
+
+    def __init__(self, url, prefix='jwt_blocklist:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('使用 Redis 黑名单需要安装 redis 包: pip install redis')
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def add(self, jti, expires_at):
+        ttl = int(expires_at - time.time())
+        if ttl > 0:
+            self.client.set(self.prefix + jti, 1, ex=ttl)
+
+    def contains(self, jti, expires_at=None):
+        return bool(self.client.exists(self.prefix + jti))
+
+
+class CachedBlocklist:
+    """
+    在共享存储前加一层进程内缓存，使热路径检查不必每次访问共享存储。
+    已吊销的结果缓存到令牌过期为止；未吊销的结果只缓存 ttl 秒，
+    因此其他 worker 上的登出最多延迟 ttl 秒生效。
+    """
+
+    def __init__(self, backend, ttl=5, max_size=10000):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_size = max_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, jti, revoked, valid_until):
+        with self._lock:
+            self._cache[jti] = (revoked, valid_until)
+            self._cache.move_to_end(jti)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+
+    def add(self, jti, expires_at):
+        self.backend.add(jti, expires_at)
+        self._remember(jti, True, expires_at)
+
+    def contains(self, jti, expires_at=None):
+        now = time.time()
+        cached = self._cache.get(jti)
+        if cached is not None and cached[1] > now:
+            return cached[0]
+        revoked = self.backend.contains(jti)
+        if revoked:
+            self._remember(jti, True, expires_at or now + self.ttl)
+        else:
+            self._remember(jti, False, now + self.ttl)
+        return revoked
+
+
+def create_blocklist(config, db, model):
+    """
+    根据配置创建黑名单存储：
+    JWT_BLOCKLIST_BACKEND 可选 memory / database / redis，
+    JWT_BLOCKLIST_CACHE_TTL 大于0时在共享存储前启用进程内缓存。
+    """
+    backend_name = config.get('JWT_BLOCKLIST_BACKEND', 'memory')
+    if backend_name == 'memory':
+        # 进程内存储本身就是 O(1) 查找，无需再加缓存
+        return MemoryBlocklist()
+    if backend_name == 'database':
+        backend = DatabaseBlocklist(db, model)
+    elif backend_name == 'redis':
+        backend = RedisBlocklist(config['JWT_BLOCKLIST_REDIS_URL'])
+    else:
+        raise ValueError(f'未知的令牌黑名单存储: {backend_name}')
+
+    cache_ttl = config.get('JWT_BLOCKLIST_CACHE_TTL', 5)
+    if cache_ttl and cache_ttl > 0:
+        return CachedBlocklist(backend, ttl=cache_ttl, max_size=config.get('JWT_BLOCKLIST_CACHE_SIZE', 10000))
+    return backend
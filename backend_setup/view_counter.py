@@ -0,0 +1,79 @@
+import atexit
+import os
+import threading
+
+
+class ViewCounter:
+    """
+    浏览量缓冲计数器（每个 worker 进程一个实例）。
+    浏览请求只在内存中累加增量，由后台线程按固定间隔把增量批量写回数据库，
+    避免在最热的读接口上开启写事务，也避免读-改-写造成的计数丢失。
+    flush_fn 接收 {post_id: 增量} 字典并负责落库；interval 不大于0时每次累加后立即写回。
+    """
+
+    def __init__(self, flush_fn, interval=5.0, logger=None):
+        self.flush_fn = flush_fn
+        self.interval = interval
+        self.logger = logger
+        self._pending = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._pid = None
+        atexit.register(self.stop)
+
+    def increment(self, post_id, count=1):
+        with self._lock:
+            self._pending[post_id] = self._pending.get(post_id, 0) + count
+        if self.interval <= 0:
+            self.flush()
+        else:
+            self._ensure_started()
+
+    def pending(self, post_id):
+        """尚未写回数据库的增量（包括正在写回的部分），读取时与持久化值相加"""
+        return self._pending.get(post_id, 0) + self._inflight.get(post_id, 0)
+
+    def flush(self):
+        """把当前缓冲的增量写回数据库，返回写回的帖子数；失败时增量合并回缓冲区等待下次重试"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                self._inflight, self._pending = self._pending, {}
+            deltas = self._inflight
+            try:
+                self.flush_fn(deltas)
+            except Exception as e:
+                with self._lock:
+                    for post_id, count in deltas.items():
+                        self._pending[post_id] = self._pending.get(post_id, 0) + count
+                if self.logger:
+                    self.logger.error('写回浏览量时出错: %s', e)
+                return 0
+            finally:
+                self._inflight = {}
+            return len(deltas)
+
+    def _ensure_started(self):
+        # gunicorn 预加载应用后 fork 出的 worker 不会继承线程，按进程号懒启动
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name='view-counter-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.flush()
+
+    def stop(self):
+        """停止后台线程并写回剩余增量（进程退出时自动调用）"""
+        self._stop_event.set()
+        self.flush()